@@ -0,0 +1,193 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"encoding/json"
+	"fmt"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	"github.com/lib/pq"
+)
+
+// auditEvent is one audit_log row waiting to be written.
+type auditEvent struct {
+	RestaurantID int
+	Email        string
+	Action       string
+	Payload      []byte
+	IP           string
+	CreatedAt    time.Time
+}
+
+// auditWriter takes audit logging off the request path: handlers enqueue
+// events on a bounded buffer and a background writer COPYs them to
+// audit_log every maxBatch events or maxDelay, whichever comes first.
+// When the buffer is full Log waits up to maxWait for room (counted as
+// delayed) and then drops the event (counted as dropped) rather than
+// holding up the request.
+type auditWriter struct {
+	db       *sql.DB
+	queue    chan auditEvent
+	maxBatch int
+	maxDelay time.Duration
+	maxWait  time.Duration
+
+	mu     sync.RWMutex
+	closed bool
+	wg     sync.WaitGroup
+
+	written atomic.Int64
+	delayed atomic.Int64
+	dropped atomic.Int64
+}
+
+// newAuditWriterFromEnv reads AUDIT_QUEUE_SIZE (default 4096),
+// AUDIT_BATCH_SIZE (default 200), AUDIT_BATCH_DELAY (default 10ms) and
+// AUDIT_ENQUEUE_WAIT (default 5ms).
+func newAuditWriterFromEnv(db *sql.DB) *auditWriter {
+	return &auditWriter{
+		db:       db,
+		queue:    make(chan auditEvent, envInt("AUDIT_QUEUE_SIZE", 4096)),
+		maxBatch: envInt("AUDIT_BATCH_SIZE", 200),
+		maxDelay: envDuration("AUDIT_BATCH_DELAY", 10*time.Millisecond),
+		maxWait:  envDuration("AUDIT_ENQUEUE_WAIT", 5*time.Millisecond),
+	}
+}
+
+func (a *auditWriter) Start() {
+	a.wg.Add(1)
+	go a.run()
+}
+
+// Log records an admin action. It never blocks for longer than maxWait
+// and never fails the caller; lost events show up in Stats.
+func (a *auditWriter) Log(restaurantID int, adminEmail, action string, payload any, ip string) {
+	plb, _ := json.Marshal(payload)
+	ev := auditEvent{RestaurantID: restaurantID, Email: adminEmail, Action: action, Payload: plb, IP: ip, CreatedAt: time.Now()}
+
+	a.mu.RLock()
+	defer a.mu.RUnlock()
+	if a.closed {
+		a.dropped.Add(1)
+		return
+	}
+	select {
+	case a.queue <- ev:
+		return
+	default:
+	}
+	a.delayed.Add(1)
+	timer := time.NewTimer(a.maxWait)
+	defer timer.Stop()
+	select {
+	case a.queue <- ev:
+	case <-timer.C:
+		a.dropped.Add(1)
+	}
+}
+
+// Close stops accepting events and waits for queued ones to be written.
+func (a *auditWriter) Close() {
+	a.mu.Lock()
+	if !a.closed {
+		a.closed = true
+		close(a.queue)
+	}
+	a.mu.Unlock()
+	a.wg.Wait()
+}
+
+type auditStats struct {
+	Queued  int   `json:"queued"`
+	Written int64 `json:"written"`
+	Delayed int64 `json:"delayed"`
+	Dropped int64 `json:"dropped"`
+}
+
+func (a *auditWriter) Stats() auditStats {
+	return auditStats{
+		Queued:  len(a.queue),
+		Written: a.written.Load(),
+		Delayed: a.delayed.Load(),
+		Dropped: a.dropped.Load(),
+	}
+}
+
+func (a *auditWriter) run() {
+	defer a.wg.Done()
+	batch := make([]auditEvent, 0, a.maxBatch)
+	for first := range a.queue {
+		batch = append(batch[:0], first)
+		timer := time.NewTimer(a.maxDelay)
+	fill:
+		for len(batch) < a.maxBatch {
+			select {
+			case ev, ok := <-a.queue:
+				if !ok {
+					break fill
+				}
+				batch = append(batch, ev)
+			case <-timer.C:
+				break fill
+			}
+		}
+		timer.Stop()
+		a.flush(batch)
+	}
+}
+
+// flush writes a batch. If the COPY fails as a whole (an event for a
+// deleted restaurant, say) each event is retried alone so one bad row
+// does not lose its neighbours.
+func (a *auditWriter) flush(batch []auditEvent) {
+	ctx, cancel := context.WithTimeout(context.Background(), 15*time.Second)
+	defer cancel()
+	err := a.copyBatch(ctx, batch)
+	if err == nil {
+		a.written.Add(int64(len(batch)))
+		return
+	}
+	if len(batch) == 1 {
+		a.dropped.Add(1)
+		fmt.Printf("audit log write failed: %v\n", err)
+		return
+	}
+	for i := range batch {
+		if err := a.copyBatch(ctx, batch[i:i+1]); err != nil {
+			a.dropped.Add(1)
+			fmt.Printf("audit log write failed (%s): %v\n", batch[i].Action, err)
+			continue
+		}
+		a.written.Add(1)
+	}
+}
+
+func (a *auditWriter) copyBatch(ctx context.Context, batch []auditEvent) error {
+	tx, err := a.db.BeginTx(ctx, nil)
+	if err != nil {
+		return err
+	}
+	defer tx.Rollback()
+
+	stmt, err := tx.PrepareContext(ctx, pq.CopyIn("audit_log", "restaurant_id", "admin_email", "action", "payload", "ip", "created_at"))
+	if err != nil {
+		return err
+	}
+	for _, ev := range batch {
+		if _, err := stmt.ExecContext(ctx, ev.RestaurantID, ev.Email, ev.Action, string(ev.Payload), ev.IP, ev.CreatedAt); err != nil {
+			stmt.Close()
+			return err
+		}
+	}
+	if _, err := stmt.ExecContext(ctx); err != nil {
+		stmt.Close()
+		return err
+	}
+	if err := stmt.Close(); err != nil {
+		return err
+	}
+	return tx.Commit()
+}
@@ -1,14 +1,14 @@
 package main
 
 import (
+	"context"
 	"encoding/json"
+	"fmt"
 	"net/http"
-	"os"
 	"strings"
 	"time"
 
 	"github.com/golang-jwt/jwt/v4"
-	"golang.org/x/crypto/bcrypt"
 )
 
 func (s *Server) handleLogin(w http.ResponseWriter, r *http.Request) {
@@ -17,6 +17,11 @@ func (s *Server) handleLogin(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	
+	if ok, retry := s.throttle.AllowIP(r); !ok {
+		writeThrottled(w, retry)
+		return
+	}
+	
 	var creds struct {
 		RestaurantID int    `json:"restaurantId"`
 		Email        string `json:"email"`
@@ -28,22 +33,27 @@ func (s *Server) handleLogin(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	
+	if ok, retry := s.throttle.AllowAccount(creds.RestaurantID, creds.Email); !ok {
+		writeThrottled(w, retry)
+		return
+	}
+	
 	admin, err := s.store.GetAdminByEmail(r.Context(), creds.RestaurantID, creds.Email)
 	if err != nil {
 		http.Error(w, "invalid credentials", http.StatusUnauthorized)
 		return
 	}
 	
-	if err := bcrypt.CompareHashAndPassword([]byte(admin.PasswordHash), []byte(creds.Password)); err != nil {
+	if err := s.hasher.Compare(r.Context(), admin.PasswordHash, creds.Password); err != nil {
+		if err == errHasherBusy {
+			writeThrottled(w, 0)
+			return
+		}
 		http.Error(w, "invalid credentials", http.StatusUnauthorized)
 		return
 	}
-	
-	// Create access token
-	token, err := createTokenWithTTL(admin, AccessTokenTTL)
-	if err != nil {
-		http.Error(w, "failed to create token", http.StatusInternalServerError)
-		return
+	if s.hasher.NeedsRehash(admin.PasswordHash) {
+		go s.rehashPassword(admin, creds.Password)
 	}
 	
 	// Create refresh token
@@ -53,6 +63,13 @@ func (s *Server) handleLogin(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	
+	// Create access token bound to the session
+	token, err := createTokenWithTTL(admin, sessionID, AccessTokenTTL)
+	if err != nil {
+		http.Error(w, "failed to create token", http.StatusInternalServerError)
+		return
+	}
+	
 	setRefreshCookie(w, refreshToken, time.Now().Add(RefreshTokenDuration))
 	
 	writeJSON(w, map[string]interface{}{
@@ -63,6 +80,20 @@ func (s *Server) handleLogin(w http.ResponseWriter, r *http.Request) {
 	})
 }
 
+// rehashPassword upgrades a verified password to the configured bcrypt
+// cost. It is skipped when the hasher is busy and the next login retries.
+func (s *Server) rehashPassword(admin AdminUser, password string) {
+	ctx, cancel := context.WithTimeout(context.Background(), 10*time.Second)
+	defer cancel()
+	hash, err := s.hasher.Hash(ctx, password)
+	if err != nil {
+		return
+	}
+	if err := s.store.UpdateAdminPasswordHash(ctx, admin.ID, admin.PasswordHash, hash); err != nil {
+		fmt.Println("rehash password:", err)
+	}
+}
+
 func (s *Server) handleVerify(w http.ResponseWriter, r *http.Request) {
 	authHeader := r.Header.Get("Authorization")
 	if authHeader == "" {
@@ -72,30 +103,16 @@ func (s *Server) handleVerify(w http.ResponseWriter, r *http.Request) {
 	
 	tokenStr := strings.TrimPrefix(authHeader, "Bearer ")
 	
-	secret := os.Getenv("JWT_SECRET")
-	if secret == "" {
-		secret = "dev-secret"
-	}
-	
-	token, err := jwt.Parse(tokenStr, func(token *jwt.Token) (interface{}, error) {
-		return []byte(secret), nil
-	})
-	
-	if err != nil || !token.Valid {
+	claims, _, err := s.auth.Verify(tokenStr)
+	if err != nil {
 		http.Error(w, "invalid token", http.StatusUnauthorized)
 		return
 	}
 	
-	claims, ok := token.Claims.(jwt.MapClaims)
-	if !ok {
-		http.Error(w, "invalid claims", http.StatusUnauthorized)
-		return
-	}
-	
 	writeJSON(w, map[string]interface{}{
 		"valid": true,
-		"role":  claims["role"],
-		"email": claims["email"],
+		"role":  claims.Role,
+		"email": claims.Email,
 	})
 }
 
@@ -109,26 +126,12 @@ func (s *Server) requireAuth(handler func(http.ResponseWriter, *http.Request, jw
 		
 		tokenStr := strings.TrimPrefix(authHeader, "Bearer ")
 		
-		secret := os.Getenv("JWT_SECRET")
-		if secret == "" {
-			secret = "dev-secret"
-		}
-		
-		token, err := jwt.Parse(tokenStr, func(token *jwt.Token) (interface{}, error) {
-			return []byte(secret), nil
-		})
-		
-		if err != nil || !token.Valid {
+		_, claims, err := s.auth.Verify(tokenStr)
+		if err != nil {
 			http.Error(w, "invalid token", http.StatusUnauthorized)
 			return
 		}
 		
-		claims, ok := token.Claims.(jwt.MapClaims)
-		if !ok {
-			http.Error(w, "invalid claims", http.StatusUnauthorized)
-			return
-		}
-		
 		handler(w, r, claims)
 	}
 }
@@ -0,0 +1,231 @@
+package main
+
+import (
+	"container/list"
+	"crypto/sha256"
+	"errors"
+	"fmt"
+	"os"
+	"strings"
+	"sync"
+	"time"
+
+	"github.com/golang-jwt/jwt/v4"
+)
+
+var (
+	errInvalidToken   = errors.New("invalid token")
+	errSessionRevoked = errors.New("session revoked")
+)
+
+// jwtKeyring holds the HMAC keys access tokens are signed and verified
+// with. It is read from the environment once at startup.
+type jwtKeyring struct {
+	activeKID string
+	keys      map[string][]byte
+}
+
+// jwtKeys is loaded from JWT_KEYS ("kid1:secret1,kid2:secret2"),
+// JWT_ACTIVE_KID (the key new tokens are signed with, default the first of
+// JWT_KEYS) and JWT_SECRET. JWT_SECRET is the key for tokens without a kid
+// header and the signing key when JWT_KEYS is unset.
+var jwtKeys = loadJWTKeys()
+
+func loadJWTKeys() *jwtKeyring {
+	k := &jwtKeyring{keys: map[string][]byte{}}
+	secret := os.Getenv("JWT_SECRET")
+	if secret == "" {
+		secret = "dev-secret"
+	}
+	k.keys[""] = []byte(secret)
+	for _, pair := range strings.Split(os.Getenv("JWT_KEYS"), ",") {
+		kid, key, ok := strings.Cut(strings.TrimSpace(pair), ":")
+		if !ok || kid == "" || key == "" {
+			continue
+		}
+		k.keys[kid] = []byte(key)
+		if k.activeKID == "" {
+			k.activeKID = kid
+		}
+	}
+	if kid := os.Getenv("JWT_ACTIVE_KID"); kid != "" {
+		if _, ok := k.keys[kid]; ok {
+			k.activeKID = kid
+		} else {
+			fmt.Printf("JWT_ACTIVE_KID %q not in JWT_KEYS, keeping %q\n", kid, k.activeKID)
+		}
+	}
+	return k
+}
+
+// sign signs claims with the active key, setting its kid header.
+func (k *jwtKeyring) sign(claims jwt.MapClaims) (string, error) {
+	token := jwt.NewWithClaims(jwt.SigningMethodHS256, claims)
+	if k.activeKID != "" {
+		token.Header["kid"] = k.activeKID
+	}
+	return token.SignedString(k.keys[k.activeKID])
+}
+
+func (k *jwtKeyring) keyFunc(token *jwt.Token) (interface{}, error) {
+	if _, ok := token.Method.(*jwt.SigningMethodHMAC); !ok {
+		return nil, fmt.Errorf("unexpected signing method %v", token.Header["alg"])
+	}
+	kid, _ := token.Header["kid"].(string)
+	key, ok := k.keys[kid]
+	if !ok {
+		return nil, fmt.Errorf("unknown key id %q", kid)
+	}
+	return key, nil
+}
+
+// authClaims are the access token claims the server relies on.
+type authClaims struct {
+	RestaurantID int
+	Email        string
+	Role         string
+	SessionID    int
+	ExpiresAt    time.Time
+}
+
+type verifiedToken struct {
+	digest [32]byte
+	claims authClaims
+	// raw is shared by every request presenting the token; handlers only
+	// read from it.
+	raw jwt.MapClaims
+}
+
+// tokenVerifier checks access tokens, remembering verified ones in a
+// bounded LRU keyed by the token's SHA-256 so repeat requests skip parsing
+// and signature checks. Revoked sessions are kept on a denylist until any
+// access token issued for them has expired.
+type tokenVerifier struct {
+	keys *jwtKeyring
+	max  int
+
+	mu      sync.Mutex
+	lru     *list.List
+	entries map[[32]byte]*list.Element
+	revoked map[int]time.Time
+}
+
+// newTokenVerifierFromEnv reads JWT_CACHE_SIZE (default 4096, entries).
+func newTokenVerifierFromEnv() *tokenVerifier {
+	return &tokenVerifier{
+		keys:    jwtKeys,
+		max:     envInt("JWT_CACHE_SIZE", 4096),
+		lru:     list.New(),
+		entries: map[[32]byte]*list.Element{},
+		revoked: map[int]time.Time{},
+	}
+}
+
+// Verify returns the claims of a valid, unexpired token whose session has
+// not been revoked.
+func (v *tokenVerifier) Verify(tokenStr string) (authClaims, jwt.MapClaims, error) {
+	digest := sha256.Sum256([]byte(tokenStr))
+	now := time.Now()
+
+	v.mu.Lock()
+	if el, ok := v.entries[digest]; ok {
+		entry := el.Value.(*verifiedToken)
+		switch {
+		case now.After(entry.claims.ExpiresAt):
+			v.removeLocked(el)
+		case v.revokedLocked(entry.claims.SessionID, now):
+			v.removeLocked(el)
+			v.mu.Unlock()
+			return authClaims{}, nil, errSessionRevoked
+		default:
+			v.lru.MoveToFront(el)
+			v.mu.Unlock()
+			return entry.claims, entry.raw, nil
+		}
+	}
+	v.mu.Unlock()
+
+	token, err := jwt.Parse(tokenStr, v.keys.keyFunc)
+	if err != nil || !token.Valid {
+		return authClaims{}, nil, errInvalidToken
+	}
+	raw, ok := token.Claims.(jwt.MapClaims)
+	if !ok {
+		return authClaims{}, nil, errInvalidToken
+	}
+	claims, ok := parseAuthClaims(raw)
+	if !ok {
+		return authClaims{}, nil, errInvalidToken
+	}
+
+	v.mu.Lock()
+	defer v.mu.Unlock()
+	if v.revokedLocked(claims.SessionID, now) {
+		return authClaims{}, nil, errSessionRevoked
+	}
+	if _, ok := v.entries[digest]; !ok && v.max > 0 {
+		v.entries[digest] = v.lru.PushFront(&verifiedToken{digest: digest, claims: claims, raw: raw})
+		for v.lru.Len() > v.max {
+			v.removeLocked(v.lru.Back())
+		}
+	}
+	return claims, raw, nil
+}
+
+// RevokeSessions rejects access tokens issued for the given sessions until
+// they expire and drops them from the cache.
+func (v *tokenVerifier) RevokeSessions(ids ...int) {
+	now := time.Now()
+	until := now.Add(AccessTokenTTL)
+	v.mu.Lock()
+	defer v.mu.Unlock()
+	for id, t := range v.revoked {
+		if now.After(t) {
+			delete(v.revoked, id)
+		}
+	}
+	for _, id := range ids {
+		v.revoked[id] = until
+	}
+	for el := v.lru.Front(); el != nil; {
+		next := el.Next()
+		if _, ok := v.revoked[el.Value.(*verifiedToken).claims.SessionID]; ok {
+			v.removeLocked(el)
+		}
+		el = next
+	}
+}
+
+func (v *tokenVerifier) revokedLocked(sessionID int, now time.Time) bool {
+	if sessionID == 0 {
+		return false
+	}
+	until, ok := v.revoked[sessionID]
+	if ok && now.After(until) {
+		delete(v.revoked, sessionID)
+		return false
+	}
+	return ok
+}
+
+func (v *tokenVerifier) removeLocked(el *list.Element) {
+	entry := v.lru.Remove(el).(*verifiedToken)
+	delete(v.entries, entry.digest)
+}
+
+func parseAuthClaims(raw jwt.MapClaims) (authClaims, bool) {
+	exp, ok := raw["exp"].(float64)
+	if !ok {
+		return authClaims{}, false
+	}
+	c := authClaims{ExpiresAt: time.Unix(int64(exp), 0)}
+	if v, ok := raw["restaurantId"].(float64); ok {
+		c.RestaurantID = int(v)
+	}
+	if v, ok := raw["sid"].(float64); ok {
+		c.SessionID = int(v)
+	}
+	c.Email, _ = raw["email"].(string)
+	c.Role, _ = raw["role"].(string)
+	return c, true
+}
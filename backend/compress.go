@@ -0,0 +1,269 @@
+package main
+
+import (
+	"bytes"
+	"compress/gzip"
+	"io"
+	"net/http"
+	"os"
+	"strconv"
+	"strings"
+	"sync"
+
+	"github.com/andybalholm/brotli"
+)
+
+// Responses smaller than this are sent uncompressed (COMPRESS_MIN_BYTES).
+var compressMinBytes = 1024
+
+// compressibleTypes is the Content-Type allowlist for on-the-fly
+// compression. ZIP archives and image/media bodies are never compressed.
+var compressibleTypes = []string{
+	"application/json",
+	"application/x-ndjson",
+	"application/javascript",
+	"application/xml",
+	"image/svg+xml",
+	"text/",
+}
+
+func init() {
+	if v := os.Getenv("COMPRESS_MIN_BYTES"); v != "" {
+		if n, err := strconv.Atoi(v); err == nil && n >= 0 {
+			compressMinBytes = n
+		}
+	}
+}
+
+var (
+	gzipWriterPool = sync.Pool{New: func() any {
+		w, _ := gzip.NewWriterLevel(io.Discard, gzip.DefaultCompression)
+		return w
+	}}
+	brotliWriterPool = sync.Pool{New: func() any {
+		return brotli.NewWriterLevel(io.Discard, 4)
+	}}
+)
+
+// negotiateEncoding picks "br" or "gzip" from an Accept-Encoding header,
+// preferring brotli when both are acceptable. It returns "" for identity.
+func negotiateEncoding(header string) string {
+	if header == "" {
+		return ""
+	}
+	best, bestQ := "", 0.0
+	for _, part := range strings.Split(header, ",") {
+		name, q := strings.TrimSpace(part), 1.0
+		if i := strings.Index(name, ";"); i >= 0 {
+			params := strings.TrimSpace(name[i+1:])
+			name = strings.TrimSpace(name[:i])
+			if strings.HasPrefix(params, "q=") {
+				if v, err := strconv.ParseFloat(params[2:], 64); err == nil {
+					q = v
+				}
+			}
+		}
+		name = strings.ToLower(name)
+		if (name != "br" && name != "gzip") || q <= 0 {
+			continue
+		}
+		if q > bestQ || (q == bestQ && name == "br") {
+			best, bestQ = name, q
+		}
+	}
+	return best
+}
+
+func isCompressibleType(contentType string) bool {
+	ct := strings.ToLower(contentType)
+	for _, t := range compressibleTypes {
+		if strings.HasPrefix(ct, t) {
+			return true
+		}
+	}
+	return false
+}
+
+// compressBytes encodes body once at the highest level; used in the
+// background for cached payloads whose compressed variants are kept
+// alongside the original.
+func compressBytes(encoding string, body []byte) []byte {
+	var buf bytes.Buffer
+	switch encoding {
+	case "gzip":
+		zw, _ := gzip.NewWriterLevel(&buf, gzip.BestCompression)
+		zw.Write(body)
+		zw.Close()
+	case "br":
+		bw := brotli.NewWriterLevel(&buf, brotli.BestCompression)
+		bw.Write(body)
+		bw.Close()
+	default:
+		return body
+	}
+	return buf.Bytes()
+}
+
+// compressHandler compresses eligible responses according to the request's
+// Accept-Encoding. Handlers that already set Content-Encoding (pre-compressed
+// cache variants) and Range requests pass through untouched.
+func compressHandler(next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		encoding := negotiateEncoding(r.Header.Get("Accept-Encoding"))
+		if encoding == "" || r.Method == http.MethodHead || r.Header.Get("Range") != "" {
+			next.ServeHTTP(w, r)
+			return
+		}
+		cw := &compressWriter{ResponseWriter: w, encoding: encoding, status: http.StatusOK}
+		defer cw.Close()
+		next.ServeHTTP(cw, r)
+	})
+}
+
+// compressWriter buffers the first compressMinBytes of a response to decide
+// whether compressing it is worthwhile, then streams through a pooled
+// gzip or brotli writer.
+type compressWriter struct {
+	http.ResponseWriter
+	encoding    string
+	status      int
+	buf         []byte
+	decided     bool
+	wroteHeader bool
+	enc         io.WriteCloser
+}
+
+func (cw *compressWriter) WriteHeader(code int) {
+	if cw.wroteHeader {
+		return
+	}
+	cw.status = code
+	if code < 200 || code == http.StatusNoContent || code == http.StatusNotModified {
+		cw.passThrough()
+	}
+}
+
+func (cw *compressWriter) Write(p []byte) (int, error) {
+	if cw.decided {
+		if cw.enc != nil {
+			return cw.enc.Write(p)
+		}
+		return cw.ResponseWriter.Write(p)
+	}
+	h := cw.Header()
+	if h.Get("Content-Encoding") != "" {
+		cw.passThrough()
+		return cw.ResponseWriter.Write(p)
+	}
+	if cl := h.Get("Content-Length"); cl != "" {
+		if n, err := strconv.Atoi(cl); err == nil && n < compressMinBytes {
+			cw.passThrough()
+			return cw.ResponseWriter.Write(p)
+		}
+	}
+	cw.buf = append(cw.buf, p...)
+	if len(cw.buf) >= compressMinBytes {
+		if err := cw.decide(true); err != nil {
+			return 0, err
+		}
+	}
+	return len(p), nil
+}
+
+// Flush lets streaming handlers push data early; an undecided response is
+// committed (compressed when its type allows) before flushing.
+func (cw *compressWriter) Flush() {
+	if !cw.decided {
+		cw.decide(true)
+	}
+	if f, ok := cw.enc.(interface{ Flush() error }); ok {
+		f.Flush()
+	}
+	if f, ok := cw.ResponseWriter.(http.Flusher); ok {
+		f.Flush()
+	}
+}
+
+func (cw *compressWriter) Unwrap() http.ResponseWriter {
+	return cw.ResponseWriter
+}
+
+// Close finishes the compressed stream and returns the encoder to its pool.
+func (cw *compressWriter) Close() error {
+	if !cw.decided {
+		if err := cw.decide(false); err != nil {
+			return err
+		}
+	}
+	if cw.enc == nil {
+		return nil
+	}
+	err := cw.enc.Close()
+	switch enc := cw.enc.(type) {
+	case *gzip.Writer:
+		enc.Reset(io.Discard)
+		gzipWriterPool.Put(enc)
+	case *brotli.Writer:
+		enc.Reset(io.Discard)
+		brotliWriterPool.Put(enc)
+	}
+	cw.enc = nil
+	return err
+}
+
+func (cw *compressWriter) passThrough() {
+	cw.decided = true
+	cw.writeHeader()
+}
+
+func (cw *compressWriter) writeHeader() {
+	if !cw.wroteHeader {
+		cw.wroteHeader = true
+		cw.ResponseWriter.WriteHeader(cw.status)
+	}
+}
+
+// decide commits to compressing or not and writes out anything buffered.
+// allowCompress is false when the whole body is already known to be small.
+func (cw *compressWriter) decide(allowCompress bool) error {
+	cw.decided = true
+	h := cw.Header()
+	ct := h.Get("Content-Type")
+	if ct == "" && len(cw.buf) > 0 {
+		ct = http.DetectContentType(cw.buf)
+		h.Set("Content-Type", ct)
+	}
+	if allowCompress && isCompressibleType(ct) && h.Get("Content-Encoding") == "" {
+		h.Del("Content-Length")
+		h.Set("Content-Encoding", cw.encoding)
+		if !strings.Contains(strings.Join(h.Values("Vary"), ","), "Accept-Encoding") {
+			h.Add("Vary", "Accept-Encoding")
+		}
+		if etag := h.Get("ETag"); strings.HasSuffix(etag, `"`) {
+			h.Set("ETag", strings.TrimSuffix(etag, `"`)+"-"+cw.encoding+`"`)
+		}
+		switch cw.encoding {
+		case "gzip":
+			gz := gzipWriterPool.Get().(*gzip.Writer)
+			gz.Reset(cw.ResponseWriter)
+			cw.enc = gz
+		case "br":
+			br := brotliWriterPool.Get().(*brotli.Writer)
+			br.Reset(cw.ResponseWriter)
+			cw.enc = br
+		}
+	}
+	cw.writeHeader()
+	buf := cw.buf
+	cw.buf = nil
+	if len(buf) == 0 {
+		return nil
+	}
+	var err error
+	if cw.enc != nil {
+		_, err = cw.enc.Write(buf)
+	} else {
+		_, err = cw.ResponseWriter.Write(buf)
+	}
+	return err
+}
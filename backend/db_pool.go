@@ -0,0 +1,94 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"fmt"
+	"net/http"
+	"time"
+
+	"github.com/golang-jwt/jwt/v4"
+)
+
+// configureDBPoolFromEnv sizes the connection pool. With several backend
+// replicas, Postgres max_connections must cover DB_MAX_OPEN_CONNS times the
+// replica count plus headroom for migrations and psql.
+//
+//	DB_MAX_OPEN_CONNS      default 25
+//	DB_MAX_IDLE_CONNS      default 10 (capped at DB_MAX_OPEN_CONNS)
+//	DB_CONN_MAX_LIFETIME   default 30m
+//	DB_CONN_MAX_IDLE_TIME  default 5m
+func configureDBPoolFromEnv(db *sql.DB) {
+	maxOpen := envInt("DB_MAX_OPEN_CONNS", 25)
+	maxIdle := envInt("DB_MAX_IDLE_CONNS", 10)
+	if maxIdle > maxOpen {
+		maxIdle = maxOpen
+	}
+	db.SetMaxOpenConns(maxOpen)
+	db.SetMaxIdleConns(maxIdle)
+	db.SetConnMaxLifetime(envDuration("DB_CONN_MAX_LIFETIME", 30*time.Minute))
+	db.SetConnMaxIdleTime(envDuration("DB_CONN_MAX_IDLE_TIME", 5*time.Minute))
+}
+
+type dbPoolStats struct {
+	MaxOpen           int   `json:"maxOpenConnections"`
+	Open              int   `json:"openConnections"`
+	InUse             int   `json:"inUse"`
+	Idle              int   `json:"idle"`
+	WaitCount         int64 `json:"waitCount"`
+	WaitMs            int64 `json:"waitDurationMs"`
+	MaxIdleClosed     int64 `json:"maxIdleClosed"`
+	MaxIdleTimeClosed int64 `json:"maxIdleTimeClosed"`
+	MaxLifetimeClosed int64 `json:"maxLifetimeClosed"`
+	Prepared          int   `json:"preparedStatements"`
+}
+
+func (s *Store) PoolStats() dbPoolStats {
+	st := s.DB.Stats()
+	return dbPoolStats{
+		MaxOpen:           st.MaxOpenConnections,
+		Open:              st.OpenConnections,
+		InUse:             st.InUse,
+		Idle:              st.Idle,
+		WaitCount:         st.WaitCount,
+		WaitMs:            st.WaitDuration.Milliseconds(),
+		MaxIdleClosed:     st.MaxIdleClosed,
+		MaxIdleTimeClosed: st.MaxIdleTimeClosed,
+		MaxLifetimeClosed: st.MaxLifetimeClosed,
+		Prepared:          s.PreparedCount(),
+	}
+}
+
+// logDBStats prints pool stats every interval until ctx is done. Wait
+// counts are reported as deltas so a saturated pool stands out.
+func (s *Store) logDBStats(ctx context.Context, interval time.Duration) {
+	t := time.NewTicker(interval)
+	defer t.Stop()
+	var prev dbPoolStats
+	for {
+		select {
+		case <-ctx.Done():
+			return
+		case <-t.C:
+		}
+		st := s.PoolStats()
+		fmt.Printf("db pool: open=%d/%d in_use=%d idle=%d waits=+%d wait=+%dms\n",
+			st.Open, st.MaxOpen, st.InUse, st.Idle, st.WaitCount-prev.WaitCount, st.WaitMs-prev.WaitMs)
+		prev = st
+	}
+}
+
+// handleMetrics serves GET /api/admin/metrics: process-wide pool stats
+// for owners.
+func (s *Server) handleMetrics(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
+	if r.Method != http.MethodGet {
+		http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+		return
+	}
+	role, _ := claims["role"].(string)
+	if role != "owner" {
+		http.Error(w, "forbidden - owner only", http.StatusForbidden)
+		return
+	}
+	writeJSON(w, map[string]any{"db": s.store.PoolStats(), "audit": s.audit.Stats()})
+}
@@ -2,74 +2,200 @@ package main
 
 import (
 	"crypto/tls"
+	"errors"
 	"fmt"
+	"net"
 	"net/smtp"
+	"net/textproto"
 	"os"
+	"strings"
+	"sync"
+	"time"
 )
 
-func sendEmail(to, subject, body string) error {
-	host := os.Getenv("SMTP_HOST")
-	port := os.Getenv("SMTP_PORT")
-	user := os.Getenv("SMTP_USER")
-	pass := os.Getenv("SMTP_PASS")
-	from := os.Getenv("SMTP_FROM")
-	
-	if host == "" || user == "" {
-		fmt.Println("SMTP not configured, skipping email to:", to)
-		return nil
-	}
-	
-	if from == "" {
-		from = user
+var errSMTPNotConfigured = errors.New("SMTP not configured")
+
+// headerLineBreaks folds line breaks out of a header value, so a subject
+// (or a restaurant name substituted into it) cannot add header lines.
+var headerLineBreaks = strings.NewReplacer("\r\n", " ", "\r", " ", "\n", " ")
+
+type smtpSession struct {
+	client   *smtp.Client
+	conn     net.Conn
+	sent     int
+	lastUsed time.Time
+}
+
+// deadline bounds the I/O of the session's next exchange, so a server that
+// stops responding fails the send instead of blocking its worker.
+func (s *smtpSession) deadline(d time.Duration) {
+	s.conn.SetDeadline(time.Now().Add(d))
+}
+
+// smtpPool keeps up to size authenticated SMTP sessions open and reuses
+// them across messages, resetting each with RSET between sends instead of
+// paying for a TLS handshake and AUTH per email. Sessions idle longer than
+// idleTimeout or used for maxPerSession messages are closed. Dialing and
+// each message are bounded by timeout.
+type smtpPool struct {
+	host, port, user, pass, from string
+
+	size          int
+	timeout       time.Duration
+	idleTimeout   time.Duration
+	maxPerSession int
+
+	mu     sync.Mutex
+	idle   []*smtpSession
+	closed bool
+}
+
+// newSMTPPoolFromEnv reads SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS,
+// SMTP_FROM, SMTP_POOL_SIZE (default 2), SMTP_TIMEOUT (default 30s),
+// SMTP_IDLE_TIMEOUT (default 30s) and SMTP_MAX_PER_SESSION (default 100).
+func newSMTPPoolFromEnv() *smtpPool {
+	p := &smtpPool{
+		host:          os.Getenv("SMTP_HOST"),
+		port:          os.Getenv("SMTP_PORT"),
+		user:          os.Getenv("SMTP_USER"),
+		pass:          os.Getenv("SMTP_PASS"),
+		from:          os.Getenv("SMTP_FROM"),
+		size:          envInt("SMTP_POOL_SIZE", 2),
+		timeout:       envDuration("SMTP_TIMEOUT", 30*time.Second),
+		idleTimeout:   envDuration("SMTP_IDLE_TIMEOUT", 30*time.Second),
+		maxPerSession: envInt("SMTP_MAX_PER_SESSION", 100),
 	}
-	
-	msg := fmt.Sprintf("From: %s\r\nTo: %s\r\nSubject: %s\r\n\r\n%s", from, to, subject, body)
-	
-	auth := smtp.PlainAuth("", user, pass, host)
-	
-	tlsConfig := &tls.Config{
-		InsecureSkipVerify: false,
-		ServerName:         host,
+	if p.from == "" {
+		p.from = p.user
 	}
-	
-	addr := host + ":" + port
-	conn, err := tls.Dial("tcp", addr, tlsConfig)
+	return p
+}
+
+func (p *smtpPool) configured() bool {
+	return p.host != "" && p.user != ""
+}
+
+func (p *smtpPool) dial() (*smtpSession, error) {
+	dialer := &net.Dialer{Timeout: p.timeout}
+	conn, err := tls.DialWithDialer(dialer, "tcp", p.host+":"+p.port, &tls.Config{ServerName: p.host})
 	if err != nil {
-		return err
+		return nil, err
 	}
-	
-	client, err := smtp.NewClient(conn, host)
+	conn.SetDeadline(time.Now().Add(p.timeout))
+	client, err := smtp.NewClient(conn, p.host)
 	if err != nil {
-		return err
+		conn.Close()
+		return nil, err
 	}
-	defer client.Close()
-	
-	if err = client.Auth(auth); err != nil {
-		return err
+	if err := client.Auth(smtp.PlainAuth("", p.user, p.pass, p.host)); err != nil {
+		client.Close()
+		return nil, err
 	}
-	
-	if err = client.Mail(from); err != nil {
-		return err
+	return &smtpSession{client: client, conn: conn, lastUsed: time.Now()}, nil
+}
+
+// get returns an idle session, or dials a new one.
+func (p *smtpPool) get() (*smtpSession, error) {
+	p.mu.Lock()
+	for len(p.idle) > 0 {
+		sess := p.idle[len(p.idle)-1]
+		p.idle = p.idle[:len(p.idle)-1]
+		if time.Since(sess.lastUsed) < p.idleTimeout {
+			p.mu.Unlock()
+			return sess, nil
+		}
+		sess.client.Close()
+	}
+	p.mu.Unlock()
+	return p.dial()
+}
+
+// put returns a healthy session to the pool, or closes it.
+func (p *smtpPool) put(sess *smtpSession) {
+	sess.lastUsed = time.Now()
+	p.mu.Lock()
+	if !p.closed && len(p.idle) < p.size && sess.sent < p.maxPerSession {
+		p.idle = append(p.idle, sess)
+		p.mu.Unlock()
+		return
 	}
-	
-	if err = client.Rcpt(to); err != nil {
+	p.mu.Unlock()
+	sess.deadline(p.timeout)
+	sess.client.Quit()
+}
+
+// Send delivers one message. A stale pooled session is replaced once
+// before giving up.
+func (p *smtpPool) Send(to, subject, body string) error {
+	if !p.configured() {
+		return errSMTPNotConfigured
+	}
+	var err error
+	for attempt := 0; attempt < 2; attempt++ {
+		var sess *smtpSession
+		if sess, err = p.get(); err != nil {
+			return err
+		}
+		fresh := sess.sent == 0
+		sess.deadline(p.timeout)
+		err = p.sendOn(sess, to, subject, body)
+		if err == nil {
+			sess.sent++
+			p.put(sess)
+			return nil
+		}
+		// The server rejected this message but the session is fine.
+		if isPermanentSMTPError(err) && sess.client.Reset() == nil {
+			p.put(sess)
+			return err
+		}
+		sess.client.Close()
+		if fresh {
+			return err
+		}
+	}
+	return err
+}
+
+func (p *smtpPool) sendOn(sess *smtpSession, to, subject, body string) error {
+	c := sess.client
+	if sess.sent > 0 {
+		if err := c.Reset(); err != nil {
+			return err
+		}
+	}
+	if err := c.Mail(p.from); err != nil {
 		return err
 	}
-	
-	w, err := client.Data()
-	if err != nil {
+	if err := c.Rcpt(to); err != nil {
 		return err
 	}
-	
-	_, err = w.Write([]byte(msg))
+	w, err := c.Data()
 	if err != nil {
 		return err
 	}
-	
-	err = w.Close()
-	if err != nil {
+	msg := fmt.Sprintf("From: %s\r\nTo: %s\r\nSubject: %s\r\n\r\n%s", p.from, to, headerLineBreaks.Replace(subject), body)
+	if _, err := w.Write([]byte(msg)); err != nil {
 		return err
 	}
-	
-	return client.Quit()
+	return w.Close()
+}
+
+// Close quits every idle session.
+func (p *smtpPool) Close() {
+	p.mu.Lock()
+	idle := p.idle
+	p.idle = nil
+	p.closed = true
+	p.mu.Unlock()
+	for _, sess := range idle {
+		sess.deadline(p.timeout)
+		sess.client.Quit()
+	}
+}
+
+// isPermanentSMTPError reports a 5xx reply, which retrying will not fix.
+func isPermanentSMTPError(err error) bool {
+	var perr *textproto.Error
+	return errors.As(err, &perr) && perr.Code >= 500
 }
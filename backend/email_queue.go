@@ -0,0 +1,224 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"fmt"
+	"math/rand"
+	"sync"
+	"time"
+)
+
+const claimEmailsSQL = `
+UPDATE outbound_emails SET status='sending', attempts=attempts+1, locked_until=now()+$2::interval
+WHERE id IN (
+  SELECT id FROM outbound_emails
+  WHERE (status='pending' AND next_attempt_at <= now()) OR (status='sending' AND locked_until < now())
+  ORDER BY next_attempt_at
+  LIMIT $1
+  FOR UPDATE SKIP LOCKED)
+RETURNING id, recipient, subject, body, attempts`
+
+type outboundEmail struct {
+	ID       int64
+	To       string
+	Subject  string
+	Body     string
+	Attempts int
+}
+
+// emailQueue delivers rows of outbound_emails. Handlers only insert; the
+// workers claim due rows in batches, send them through the shared SMTP
+// pool and reschedule failures with exponential backoff. Several backend
+// replicas can run workers against the same table.
+type emailQueue struct {
+	db          *sql.DB
+	smtp        *smtpPool
+	workers     int
+	batch       int
+	poll        time.Duration
+	lease       time.Duration
+	retryBase   time.Duration
+	maxAttempts int
+
+	wake chan struct{}
+	ctx  context.Context
+	stop context.CancelFunc
+	wg   sync.WaitGroup
+}
+
+// newEmailQueueFromEnv reads EMAIL_WORKERS (default 2), EMAIL_BATCH_SIZE
+// (default 20), EMAIL_POLL_INTERVAL (default 5s), EMAIL_RETRY_BASE
+// (default 30s) and EMAIL_MAX_ATTEMPTS (default 8), plus the SMTP pool
+// settings.
+func newEmailQueueFromEnv(db *sql.DB) *emailQueue {
+	ctx, stop := context.WithCancel(context.Background())
+	q := &emailQueue{
+		db:          db,
+		smtp:        newSMTPPoolFromEnv(),
+		workers:     envInt("EMAIL_WORKERS", 2),
+		batch:       envInt("EMAIL_BATCH_SIZE", 20),
+		poll:        envDuration("EMAIL_POLL_INTERVAL", 5*time.Second),
+		lease:       5 * time.Minute,
+		retryBase:   envDuration("EMAIL_RETRY_BASE", 30*time.Second),
+		maxAttempts: envInt("EMAIL_MAX_ATTEMPTS", 8),
+		wake:        make(chan struct{}, 1),
+		ctx:         ctx,
+		stop:        stop,
+	}
+	// The lease is renewed per message, so it only has to outlast one
+	// Send: a dial and a send, retried once on a stale session.
+	if min := 4*q.smtp.timeout + time.Minute; q.lease < min {
+		q.lease = min
+	}
+	return q
+}
+
+func (q *emailQueue) Start() {
+	for i := 0; i < q.workers; i++ {
+		q.wg.Add(1)
+		go q.run()
+	}
+}
+
+// Close stops the workers after their current message and closes the SMTP
+// sessions. Unsent rows stay queued for the next start.
+func (q *emailQueue) Close() {
+	q.stop()
+	q.wg.Wait()
+	q.smtp.Close()
+}
+
+// Enqueue stores a message for delivery and wakes a worker.
+func (q *emailQueue) Enqueue(ctx context.Context, to, subject, body string) error {
+	_, err := q.db.ExecContext(ctx, "INSERT INTO outbound_emails (recipient, subject, body) VALUES ($1,$2,$3)", to, subject, body)
+	if err != nil {
+		return err
+	}
+	select {
+	case q.wake <- struct{}{}:
+	default:
+	}
+	return nil
+}
+
+func (q *emailQueue) run() {
+	defer q.wg.Done()
+	ticker := time.NewTicker(q.poll)
+	defer ticker.Stop()
+	for {
+		n, err := q.deliverBatch()
+		if err != nil && q.ctx.Err() == nil {
+			fmt.Println("email queue:", err)
+		}
+		// A full batch suggests more are due; go again straight away.
+		if err == nil && n == q.batch {
+			continue
+		}
+		select {
+		case <-q.ctx.Done():
+			return
+		case <-q.wake:
+		case <-ticker.C:
+		}
+	}
+}
+
+func (q *emailQueue) deliverBatch() (int, error) {
+	rows, err := q.db.QueryContext(q.ctx, claimEmailsSQL, q.batch, pgInterval(q.lease))
+	if err != nil {
+		return 0, err
+	}
+	var claimed []outboundEmail
+	for rows.Next() {
+		var m outboundEmail
+		if err := rows.Scan(&m.ID, &m.To, &m.Subject, &m.Body, &m.Attempts); err != nil {
+			rows.Close()
+			return 0, err
+		}
+		claimed = append(claimed, m)
+	}
+	rows.Close()
+	if err := rows.Err(); err != nil {
+		return 0, err
+	}
+
+	for i, m := range claimed {
+		if q.ctx.Err() != nil {
+			// Hand the rest back rather than waiting out the lease.
+			q.release(claimed[i:])
+			return len(claimed), nil
+		}
+		// Earlier sends may have outlasted the claim's lease; renew it so
+		// no other worker takes the row mid-send, and skip the row if one
+		// already has.
+		if ok, err := q.renew(m); err != nil || !ok {
+			if err != nil {
+				return len(claimed), err
+			}
+			continue
+		}
+		if err := q.record(m, q.smtp.Send(m.To, m.Subject, m.Body)); err != nil {
+			return len(claimed), err
+		}
+	}
+	return len(claimed), nil
+}
+
+// renew extends the lease of a claimed row. attempts identifies this claim:
+// a worker that reclaimed the row after the lease ran out bumped it.
+func (q *emailQueue) renew(m outboundEmail) (bool, error) {
+	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+	defer cancel()
+	res, err := q.db.ExecContext(ctx, "UPDATE outbound_emails SET locked_until=now()+$3::interval WHERE id=$1 AND status='sending' AND attempts=$2",
+		m.ID, m.Attempts, pgInterval(q.lease))
+	if err != nil {
+		return false, err
+	}
+	n, _ := res.RowsAffected()
+	return n > 0, nil
+}
+
+// record stores the outcome of one attempt.
+func (q *emailQueue) record(m outboundEmail, sendErr error) error {
+	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+	defer cancel()
+	if sendErr == nil {
+		_, err := q.db.ExecContext(ctx, "UPDATE outbound_emails SET status='sent', sent_at=now(), locked_until=NULL, last_error=NULL WHERE id=$1", m.ID)
+		return err
+	}
+	if sendErr == errSMTPNotConfigured || isPermanentSMTPError(sendErr) || m.Attempts >= q.maxAttempts {
+		fmt.Printf("email %d to %s failed: %v\n", m.ID, m.To, sendErr)
+		_, err := q.db.ExecContext(ctx, "UPDATE outbound_emails SET status='failed', locked_until=NULL, last_error=$2 WHERE id=$1", m.ID, sendErr.Error())
+		return err
+	}
+	_, err := q.db.ExecContext(ctx, "UPDATE outbound_emails SET status='pending', locked_until=NULL, last_error=$2, next_attempt_at=$3 WHERE id=$1",
+		m.ID, sendErr.Error(), time.Now().Add(q.backoff(m.Attempts)))
+	return err
+}
+
+func (q *emailQueue) release(ms []outboundEmail) {
+	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+	defer cancel()
+	for _, m := range ms {
+		q.db.ExecContext(ctx, "UPDATE outbound_emails SET status='pending', attempts=attempts-1, locked_until=NULL WHERE id=$1 AND status='sending'", m.ID)
+	}
+}
+
+// pgInterval formats d for a $n::interval parameter.
+func pgInterval(d time.Duration) string {
+	return fmt.Sprintf("%d milliseconds", d.Milliseconds())
+}
+
+// backoff doubles retryBase per attempt up to an hour, with up to 20%
+// jitter so a recovering SMTP server is not hit by every retry at once.
+func (q *emailQueue) backoff(attempts int) time.Duration {
+	d := q.retryBase
+	for i := 1; i < attempts && d < time.Hour; i++ {
+		d *= 2
+	}
+	if d > time.Hour {
+		d = time.Hour
+	}
+	return d + time.Duration(rand.Int63n(int64(d)/5+1))
+}
@@ -0,0 +1,562 @@
+package main
+
+import (
+	"context"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"net/http"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	"github.com/golang-jwt/jwt/v4"
+)
+
+var errExportQueueFull = errors.New("export queue full")
+
+// exportProgress counts finished images of a running export. A nil
+// *exportProgress ignores updates.
+type exportProgress struct {
+	items   atomic.Int64
+	failed  atomic.Int64
+	fetched atomic.Int64
+	written atomic.Int64
+}
+
+func (p *exportProgress) record(it *exportImage) {
+	if p == nil {
+		return
+	}
+	p.items.Add(1)
+	if it.Error != "" {
+		p.failed.Add(1)
+	}
+	p.fetched.Add(it.Bytes)
+}
+
+// progressWriter counts archive bytes written.
+type progressWriter struct {
+	w io.Writer
+	p *exportProgress
+}
+
+func (pw progressWriter) Write(b []byte) (int, error) {
+	n, err := pw.w.Write(b)
+	pw.p.written.Add(int64(n))
+	return n, err
+}
+
+// exportJob is one queued or finished media export.
+type exportJob struct {
+	ID           string
+	RestaurantID int
+	Email        string
+	IP           string
+	Request      exportMediaRequest
+	CreatedAt    time.Time
+
+	progress exportProgress
+	cancel   context.CancelFunc
+
+	mu         sync.Mutex
+	state      string // queued, running, done, failed, canceled
+	canceled   bool   // set by Cancel; execute checks it before running
+	err        string
+	total      int
+	startedAt  time.Time
+	finishedAt time.Time
+	path       string
+	filename   string
+	result     map[string]any
+}
+
+// exportJobStatus is the JSON view of a job.
+type exportJobStatus struct {
+	ID           string         `json:"id"`
+	RestaurantID int            `json:"restaurantId"`
+	State        string         `json:"state"`
+	Error        string         `json:"error,omitempty"`
+	CreatedAt    time.Time      `json:"createdAt"`
+	StartedAt    *time.Time     `json:"startedAt,omitempty"`
+	FinishedAt   *time.Time     `json:"finishedAt,omitempty"`
+	Items        int            `json:"items"`
+	ItemsDone    int64          `json:"itemsDone"`
+	Failed       int64          `json:"failed"`
+	BytesFetched int64          `json:"bytesFetched"`
+	BytesWritten int64          `json:"bytesWritten"`
+	Download     string         `json:"download,omitempty"`
+	Result       map[string]any `json:"result,omitempty"`
+}
+
+func (j *exportJob) status() exportJobStatus {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	st := exportJobStatus{
+		ID:           j.ID,
+		RestaurantID: j.RestaurantID,
+		State:        j.state,
+		Error:        j.err,
+		CreatedAt:    j.CreatedAt,
+		Items:        j.total,
+		ItemsDone:    j.progress.items.Load(),
+		Failed:       j.progress.failed.Load(),
+		BytesFetched: j.progress.fetched.Load(),
+		BytesWritten: j.progress.written.Load(),
+		Result:       j.result,
+	}
+	if !j.startedAt.IsZero() {
+		t := j.startedAt
+		st.StartedAt = &t
+	}
+	if !j.finishedAt.IsZero() {
+		t := j.finishedAt
+		st.FinishedAt = &t
+	}
+	if j.state == "done" && j.path != "" {
+		st.Download = fmt.Sprintf("/api/admin/export_jobs/%d/%s/download", j.RestaurantID, j.ID)
+	}
+	return st
+}
+
+func (j *exportJob) finish(state, errMsg string) {
+	j.mu.Lock()
+	j.state = state
+	j.err = errMsg
+	j.finishedAt = time.Now()
+	j.mu.Unlock()
+}
+
+// exportJobs runs media exports in the background on a bounded worker pool,
+// at most perRestaurant at a time for any one restaurant. Finished archives
+// are kept in dir for ttl.
+type exportJobs struct {
+	server        *Server
+	dir           string
+	workers       int
+	perRestaurant int
+	maxQueued     int
+	ttl           time.Duration
+
+	mu      sync.Mutex
+	cond    *sync.Cond
+	jobs    map[string]*exportJob
+	queue   []*exportJob
+	running map[int]int
+	closed  bool
+	ctx     context.Context
+	stop    context.CancelFunc
+	wg      sync.WaitGroup
+}
+
+// newExportJobsFromEnv reads EXPORT_JOB_DIR (default <tmp>/resto-exports),
+// EXPORT_JOB_WORKERS (default 2), EXPORT_JOBS_PER_RESTAURANT (default 1),
+// EXPORT_JOB_QUEUE (default 32) and EXPORT_JOB_TTL (default 24h).
+func newExportJobsFromEnv(s *Server) *exportJobs {
+	dir := os.Getenv("EXPORT_JOB_DIR")
+	if dir == "" {
+		dir = filepath.Join(os.TempDir(), "resto-exports")
+	}
+	ctx, stop := context.WithCancel(context.Background())
+	q := &exportJobs{
+		server:        s,
+		dir:           dir,
+		workers:       envInt("EXPORT_JOB_WORKERS", 2),
+		perRestaurant: envInt("EXPORT_JOBS_PER_RESTAURANT", 1),
+		maxQueued:     envInt("EXPORT_JOB_QUEUE", 32),
+		ttl:           envDuration("EXPORT_JOB_TTL", 24*time.Hour),
+		jobs:          map[string]*exportJob{},
+		running:       map[int]int{},
+		ctx:           ctx,
+		stop:          stop,
+	}
+	q.cond = sync.NewCond(&q.mu)
+	return q
+}
+
+// Start creates dir and removes archives left there by a previous process:
+// jobs live only in memory, so nothing else would ever delete them.
+func (q *exportJobs) Start() {
+	if err := os.MkdirAll(q.dir, 0o755); err != nil {
+		fmt.Println("export jobs dir:", err)
+	}
+	for _, pattern := range []string{"*.zip", "*.zip.part"} {
+		stale, _ := filepath.Glob(filepath.Join(q.dir, pattern))
+		for _, path := range stale {
+			if err := os.Remove(path); err != nil {
+				fmt.Println("remove stale export archive:", err)
+			}
+		}
+	}
+	for i := 0; i < q.workers; i++ {
+		q.wg.Add(1)
+		go q.run()
+	}
+	q.wg.Add(1)
+	go q.janitor()
+}
+
+// Close cancels running exports and waits for the workers to exit.
+func (q *exportJobs) Close() {
+	q.mu.Lock()
+	q.closed = true
+	q.cond.Broadcast()
+	q.mu.Unlock()
+	q.stop()
+	q.wg.Wait()
+}
+
+// Enqueue adds a job, failing with errExportQueueFull when too many are
+// waiting.
+func (q *exportJobs) Enqueue(job *exportJob) error {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	if q.closed || len(q.queue) >= q.maxQueued {
+		return errExportQueueFull
+	}
+	job.state = "queued"
+	q.jobs[job.ID] = job
+	q.queue = append(q.queue, job)
+	q.cond.Signal()
+	return nil
+}
+
+func (q *exportJobs) Get(id string) (*exportJob, bool) {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	job, ok := q.jobs[id]
+	return job, ok
+}
+
+// List returns a restaurant's jobs, newest first.
+func (q *exportJobs) List(restaurantID int) []*exportJob {
+	q.mu.Lock()
+	var out []*exportJob
+	for _, job := range q.jobs {
+		if job.RestaurantID == restaurantID {
+			out = append(out, job)
+		}
+	}
+	q.mu.Unlock()
+	sort.Slice(out, func(i, j int) bool { return out[i].CreatedAt.After(out[j].CreatedAt) })
+	return out
+}
+
+// Cancel stops a queued or running job.
+func (q *exportJobs) Cancel(job *exportJob) {
+	q.mu.Lock()
+	for i, queued := range q.queue {
+		if queued == job {
+			q.queue = append(q.queue[:i], q.queue[i+1:]...)
+			q.mu.Unlock()
+			job.finish("canceled", "")
+			return
+		}
+	}
+	q.mu.Unlock()
+	// A job taken off the queue may not have reached execute yet; the
+	// flag stops it there.
+	job.mu.Lock()
+	job.canceled = true
+	cancel := job.cancel
+	job.mu.Unlock()
+	if cancel != nil {
+		cancel()
+	}
+}
+
+// next blocks until a queued job can start without exceeding its
+// restaurant's limit, and claims it.
+func (q *exportJobs) next() *exportJob {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	for {
+		if q.closed {
+			return nil
+		}
+		for i, job := range q.queue {
+			if q.running[job.RestaurantID] < q.perRestaurant {
+				q.queue = append(q.queue[:i], q.queue[i+1:]...)
+				q.running[job.RestaurantID]++
+				return job
+			}
+		}
+		q.cond.Wait()
+	}
+}
+
+func (q *exportJobs) run() {
+	defer q.wg.Done()
+	for {
+		job := q.next()
+		if job == nil {
+			return
+		}
+		q.execute(job)
+		q.mu.Lock()
+		q.running[job.RestaurantID]--
+		q.cond.Broadcast()
+		q.mu.Unlock()
+	}
+}
+
+func (q *exportJobs) execute(job *exportJob) {
+	ctx, cancel := context.WithCancel(q.ctx)
+	defer cancel()
+	job.mu.Lock()
+	if job.canceled {
+		job.mu.Unlock()
+		job.finish("canceled", "")
+		return
+	}
+	job.state = "running"
+	job.startedAt = time.Now()
+	job.cancel = cancel
+	job.mu.Unlock()
+
+	err := q.server.runExportJob(ctx, q.dir, job)
+	switch {
+	case err == nil:
+		job.finish("done", "")
+	case ctx.Err() != nil:
+		job.finish("canceled", "")
+	default:
+		fmt.Printf("export job %s failed: %v\n", job.ID, err)
+		job.finish("failed", err.Error())
+	}
+}
+
+// janitor removes jobs and archives older than ttl.
+func (q *exportJobs) janitor() {
+	defer q.wg.Done()
+	ticker := time.NewTicker(time.Minute)
+	defer ticker.Stop()
+	for {
+		select {
+		case <-q.ctx.Done():
+			return
+		case <-ticker.C:
+		}
+		cutoff := time.Now().Add(-q.ttl)
+		q.mu.Lock()
+		for id, job := range q.jobs {
+			job.mu.Lock()
+			expired := !job.finishedAt.IsZero() && job.finishedAt.Before(cutoff)
+			path := job.path
+			job.mu.Unlock()
+			if expired {
+				delete(q.jobs, id)
+				if path != "" {
+					os.Remove(path)
+				}
+			}
+		}
+		q.mu.Unlock()
+	}
+}
+
+// runExportJob performs the export described by job.Request. ZIP archives
+// are written to dir and, for the S3 target, uploaded from there.
+func (s *Server) runExportJob(ctx context.Context, dir string, job *exportJob) error {
+	req := job.Request
+	id := job.RestaurantID
+	target := req.normalize(id)
+
+	images, err := s.collectExportImages(ctx, id)
+	if err != nil {
+		return fmt.Errorf("load data: %w", err)
+	}
+	if len(images) == 0 {
+		return errors.New("no images found")
+	}
+	job.mu.Lock()
+	job.total = len(images)
+	job.mu.Unlock()
+
+	baseline, err := s.loadExportBaseline(ctx, id, &req, target)
+	if err != nil {
+		return fmt.Errorf("load previous manifest: %w", err)
+	}
+
+	if req.toS3() && req.delta() {
+		s3client, err := s.media.S3()
+		if err != nil {
+			return fmt.Errorf("aws config: %w", err)
+		}
+		manifest, err := s.uploadMediaDelta(ctx, s3client, req.Bucket, req.KeyPrefix, images, baseline, req.Public, &job.progress)
+		if err != nil {
+			return err
+		}
+		if err := saveExportManifest(ctx, s.store.DB, id, target, manifest); err != nil {
+			fmt.Println("save export manifest:", err)
+		}
+		counts := countStatuses(manifest)
+		job.mu.Lock()
+		job.result = map[string]any{"s3": req.location(), "manifest": req.location() + "manifest.json", "counts": counts}
+		job.mu.Unlock()
+		s.audit.Log(id, job.Email, "export_media_s3_delta", map[string]any{"bucket": req.Bucket, "prefix": req.KeyPrefix, "counts": counts, "job": job.ID}, job.IP)
+		return nil
+	}
+
+	filename := exportArchiveName(id)
+	path := filepath.Join(dir, job.ID+".zip")
+	f, err := os.Create(path + ".part")
+	if err != nil {
+		return err
+	}
+	err = s.writeZipStream(ctx, progressWriter{f, &job.progress}, images, baseline, &job.progress)
+	if cerr := f.Close(); err == nil {
+		err = cerr
+	}
+	if err == nil {
+		err = os.Rename(path+".part", path)
+	}
+	if err != nil {
+		os.Remove(path + ".part")
+		return err
+	}
+	if err := saveExportManifest(ctx, s.store.DB, id, target, exportManifest(images, baseline)); err != nil {
+		fmt.Println("save export manifest:", err)
+	}
+
+	if !req.toS3() {
+		job.mu.Lock()
+		job.path = path
+		job.filename = filename
+		job.mu.Unlock()
+		s.audit.Log(id, job.Email, "export_media_download", map[string]any{"count": len(images), "job": job.ID}, job.IP)
+		return nil
+	}
+
+	defer os.Remove(path)
+	archive, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer archive.Close()
+	key := req.KeyPrefix + filename
+	url, err := s.uploadExportArchive(ctx, &req, key, archive)
+	if err != nil {
+		return fmt.Errorf("upload to S3: %w", err)
+	}
+	job.mu.Lock()
+	if strings.HasPrefix(url, "s3://") {
+		job.result = map[string]any{"s3": url}
+	} else {
+		job.result = map[string]any{"url": url}
+	}
+	job.mu.Unlock()
+	s.audit.Log(id, job.Email, "export_media_s3", map[string]any{"bucket": req.Bucket, "key": key, "count": len(images), "job": job.ID}, job.IP)
+	return nil
+}
+
+// handleExportJobs serves
+//
+//	POST   /api/admin/export_jobs/:restaurantId                 enqueue (export_media body)
+//	GET    /api/admin/export_jobs/:restaurantId                 list jobs
+//	GET    /api/admin/export_jobs/:restaurantId/:jobId          status and progress
+//	DELETE /api/admin/export_jobs/:restaurantId/:jobId          cancel
+//	GET    /api/admin/export_jobs/:restaurantId/:jobId/download archive, with Range support
+func (s *Server) handleExportJobs(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
+	role, _ := claims["role"].(string)
+	if role != "owner" {
+		http.Error(w, "forbidden - owner only", http.StatusForbidden)
+		return
+	}
+
+	rest := strings.Trim(strings.TrimPrefix(r.URL.Path, "/api/admin/export_jobs/"), "/")
+	parts := strings.Split(rest, "/")
+	id, err := getIDFromPath("", parts[0])
+	if err != nil {
+		http.Error(w, "invalid restaurant id", http.StatusBadRequest)
+		return
+	}
+
+	if len(parts) == 1 {
+		switch r.Method {
+		case http.MethodPost:
+			var payload exportMediaRequest
+			if err := json.NewDecoder(r.Body).Decode(&payload); err != nil && err != io.EOF {
+				http.Error(w, "invalid json", http.StatusBadRequest)
+				return
+			}
+			jobID, err := generateToken(16)
+			if err != nil {
+				http.Error(w, "failed to create job", http.StatusInternalServerError)
+				return
+			}
+			email, _ := claims["email"].(string)
+			job := &exportJob{ID: jobID, RestaurantID: id, Email: email, IP: r.RemoteAddr, Request: payload, CreatedAt: time.Now()}
+			if err := s.exports.Enqueue(job); err != nil {
+				w.Header().Set("Retry-After", "30")
+				http.Error(w, "too many export jobs, try again later", http.StatusServiceUnavailable)
+				return
+			}
+			w.Header().Set("Location", fmt.Sprintf("/api/admin/export_jobs/%d/%s", id, jobID))
+			w.Header().Set("Content-Type", "application/json")
+			w.WriteHeader(http.StatusAccepted)
+			json.NewEncoder(w).Encode(map[string]any{"ok": true, "id": jobID, "job": job.status()})
+		case http.MethodGet:
+			jobs := s.exports.List(id)
+			items := make([]exportJobStatus, len(jobs))
+			for i, job := range jobs {
+				items[i] = job.status()
+			}
+			writeJSON(w, page{Items: items})
+		default:
+			http.Error(w, "only GET/POST allowed", http.StatusMethodNotAllowed)
+		}
+		return
+	}
+
+	job, ok := s.exports.Get(parts[1])
+	if !ok || job.RestaurantID != id || len(parts) > 3 || (len(parts) == 3 && parts[2] != "download") {
+		http.Error(w, "not found", http.StatusNotFound)
+		return
+	}
+
+	if len(parts) == 3 {
+		if r.Method != http.MethodGet && r.Method != http.MethodHead {
+			http.Error(w, "only GET allowed", http.StatusMethodNotAllowed)
+			return
+		}
+		job.mu.Lock()
+		state, path, filename := job.state, job.path, job.filename
+		job.mu.Unlock()
+		if state != "done" || path == "" {
+			http.Error(w, "archive not available", http.StatusConflict)
+			return
+		}
+		f, err := os.Open(path)
+		if err != nil {
+			http.Error(w, "archive expired", http.StatusGone)
+			return
+		}
+		defer f.Close()
+		fi, err := f.Stat()
+		if err != nil {
+			http.Error(w, "archive expired", http.StatusGone)
+			return
+		}
+		w.Header().Set("Content-Type", "application/zip")
+		w.Header().Set("Content-Disposition", fmt.Sprintf("attachment; filename=\"%s\"", filename))
+		w.Header().Set("ETag", `"`+job.ID+`"`)
+		http.ServeContent(w, r, filename, fi.ModTime(), f)
+		return
+	}
+
+	switch r.Method {
+	case http.MethodGet:
+		writeJSON(w, job.status())
+	case http.MethodDelete:
+		s.exports.Cancel(job)
+		writeJSON(w, map[string]any{"ok": true})
+	default:
+		http.Error(w, "only GET/DELETE allowed", http.StatusMethodNotAllowed)
+	}
+}
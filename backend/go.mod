@@ -3,6 +3,7 @@ module github.com/yourname/restaurant-site-backend
 go 1.20
 
 require (
+	github.com/andybalholm/brotli v1.0.5
 	github.com/aws/aws-sdk-go-v2 v1.28.0
 	github.com/aws/aws-sdk-go-v2/config v1.28.0
 	github.com/aws/aws-sdk-go-v2/service/s3 v1.28.0
@@ -1,9 +1,14 @@
 package main
 
 import (
+	"bytes"
 	"encoding/json"
+	"log"
 	"net/http"
+	"strings"
 	"time"
+
+	"github.com/golang-jwt/jwt/v4"
 )
 
 func (s *Server) handleRestaurants(w http.ResponseWriter, r *http.Request) {
@@ -18,13 +23,18 @@ func (s *Server) handleRestaurants(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	
-	data, err := s.store.LoadRestaurantData(r.Context(), id)
-	if err != nil {
-		http.Error(w, "not found", http.StatusNotFound)
-		return
+	entry, ok := s.cache.Get(id)
+	if !ok {
+		gen := s.cache.Generation(id)
+		body, err := s.store.RestaurantDocument(r.Context(), id)
+		if err != nil {
+			http.Error(w, "not found", http.StatusNotFound)
+			return
+		}
+		entry = s.cache.Put(id, gen, body)
 	}
 	
-	writeJSON(w, data)
+	writeCachedResponse(w, r, entry)
 }
 
 func (s *Server) handleOrders(w http.ResponseWriter, r *http.Request) {
@@ -54,18 +64,34 @@ func (s *Server) handleOrders(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	
-	itemsJSON, _ := json.Marshal(order.Items)
-	_, err = s.store.DB.ExecContext(r.Context(),
-		`INSERT INTO orders (restaurant_id, items_json, total, status, created_at, customer_name, customer_phone, customer_address, customer_email, notes)
-		 VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)`,
-		id, itemsJSON, order.Total, "pending", time.Now(), order.CustomerName, order.CustomerPhone, order.CustomerAddress, order.CustomerEmail, order.Notes)
+	if len(order.Items) == 0 || order.Total < 0 {
+		http.Error(w, "invalid order", http.StatusBadRequest)
+		return
+	}
 	
+	itemsJSON, _ := json.Marshal(order.Items)
+	orderID, err := s.orders.Submit(r.Context(), orderRecord{
+		RestaurantID:    id,
+		ItemsJSON:       itemsJSON,
+		Total:           order.Total,
+		CustomerName:    order.CustomerName,
+		CustomerPhone:   order.CustomerPhone,
+		CustomerAddress: order.CustomerAddress,
+		CustomerEmail:   order.CustomerEmail,
+		Notes:           order.Notes,
+		CreatedAt:       time.Now(),
+	})
+	if err == errOrderQueueFull {
+		w.Header().Set("Retry-After", "1")
+		http.Error(w, "too many orders, try again", http.StatusServiceUnavailable)
+		return
+	}
 	if err != nil {
 		http.Error(w, "failed to create order", http.StatusInternalServerError)
 		return
 	}
 	
-	writeJSON(w, map[string]interface{}{"ok": true})
+	writeJSON(w, map[string]interface{}{"ok": true, "id": orderID})
 }
 
 func (s *Server) handleSubscribe(w http.ResponseWriter, r *http.Request) {
@@ -101,33 +127,6 @@ func (s *Server) handleSubscribe(w http.ResponseWriter, r *http.Request) {
 	writeJSON(w, map[string]interface{}{"ok": true})
 }
 
-func (s *Server) handleReviews(w http.ResponseWriter, r *http.Request) {
-	if r.Method != http.MethodPost {
-		http.Error(w, "only POST allowed", http.StatusMethodNotAllowed)
-		return
-	}
-	
-	id, err := getIDFromPath("/api/reviews/", r.URL.Path)
-	if err != nil {
-		http.Error(w, "invalid id", http.StatusBadRequest)
-		return
-	}
-	
-	var review struct {
-		Name    string `json:"name"`
-		Rating  int    `json:"rating"`
-		Comment string `json:"comment"`
-	}
-	
-	if err := json.NewDecoder(r.Body).Decode(&review); err != nil {
-		http.Error(w, "invalid payload", http.StatusBadRequest)
-		return
-	}
-	
-	// For simplicity, just append to existing testimonials
-	writeJSON(w, map[string]interface{}{"ok": true})
-}
-
 func (s *Server) handleMenus(w http.ResponseWriter, r *http.Request) {
 	id, err := getIDFromPath("/api/menus/", r.URL.Path)
 	if err != nil {
@@ -135,35 +134,27 @@ func (s *Server) handleMenus(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	
-	if r.Method == http.MethodPost {
-		// Admin update menus
-		var menus []MenuCategory
-		if err := json.NewDecoder(r.Body).Decode(&menus); err != nil {
-			http.Error(w, "invalid payload", http.StatusBadRequest)
+	if strings.HasSuffix(strings.TrimSuffix(r.URL.Path, "/"), "/search") {
+		if r.Method != http.MethodGet {
+			http.Error(w, "only GET allowed", http.StatusMethodNotAllowed)
 			return
 		}
-		
-		// Update each category
-		for _, cat := range menus {
-			itemsJSON, _ := json.Marshal(cat.Items)
-			_, err := s.store.DB.ExecContext(r.Context(),
-				`INSERT INTO menus (restaurant_id, category, items_json) VALUES ($1, $2, $3)
-				 ON CONFLICT (restaurant_id, category) DO UPDATE SET items_json = EXCLUDED.items_json`,
-				id, cat.Category, itemsJSON)
-			if err != nil {
-				http.Error(w, "failed to update menu", http.StatusInternalServerError)
-				return
-			}
-		}
-		
-		writeJSON(w, map[string]interface{}{"ok": true})
+		s.handleMenuSearch(w, r, id)
+		return
+	}
+	
+	if r.Method == http.MethodPost {
+		// Admin update menus: a full replace, so it needs an admin token for this restaurant
+		s.requireAuth(func(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
+			s.replaceMenu(w, r, claims, id)
+		})(w, r)
 		return
 	}
 	
 	http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
 }
 
-func (s *Server) handleRestaurantPatch(w http.ResponseWriter, r *http.Request) {
+func (s *Server) handleRestaurantPatch(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
 	if r.Method != http.MethodPost {
 		http.Error(w, "only POST allowed", http.StatusMethodNotAllowed)
 		return
@@ -184,10 +175,11 @@ func (s *Server) handleRestaurantPatch(w http.ResponseWriter, r *http.Request) {
 	// Simple implementation - update allowed fields
 	// In production, validate each field properly
 	
+	s.cache.Invalidate(id)
 	writeJSON(w, map[string]interface{}{"ok": true})
 }
 
-func (s *Server) handleAdminOrders(w http.ResponseWriter, r *http.Request, claims map[string]interface{}) {
+func (s *Server) handleAdminOrders(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
 	if r.Method != http.MethodGet {
 		http.Error(w, "only GET allowed", http.StatusMethodNotAllowed)
 		return
@@ -199,9 +191,35 @@ func (s *Server) handleAdminOrders(w http.ResponseWriter, r *http.Request, claim
 		return
 	}
 	
-	rows, err := s.store.DB.QueryContext(r.Context(),
-		`SELECT id, items_json, total, status, created_at, customer_name, customer_phone, customer_email, notes
-		 FROM orders WHERE restaurant_id=$1 ORDER BY created_at DESC LIMIT 100`, id)
+	limit, err := parseLimit(r, 50, 500)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	cursor, err := parseCursorParam(r)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	from, err := parseTimeParam(r, "from")
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	to, err := parseTimeParam(r, "to")
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	
+	var q listQuery
+	q.where("restaurant_id = %s", id)
+	if status := r.URL.Query().Get("status"); status != "" {
+		q.where("status = %s", status)
+	}
+	q.timeRange(from, to)
+	q.after(cursor)
+	rows, err := s.store.DB.QueryContext(r.Context(), q.sql(orderRowColumns, "orders", limit+1), q.args...)
 	
 	if err != nil {
 		http.Error(w, "failed to fetch orders", http.StatusInternalServerError)
@@ -209,37 +227,17 @@ func (s *Server) handleAdminOrders(w http.ResponseWriter, r *http.Request, claim
 	}
 	defer rows.Close()
 	
-	var orders []map[string]interface{}
-	for rows.Next() {
-		var order map[string]interface{} = make(map[string]interface{})
-		var itemsJSON []byte
-		var id int
-		var total float64
-		var status, name, phone, email, notes string
-		var createdAt time.Time
-		
-		rows.Scan(&id, &itemsJSON, &total, &status, &createdAt, &name, &phone, &email, &notes)
-		
-		var items []map[string]interface{}
-		json.Unmarshal(itemsJSON, &items)
-		
-		order["id"] = id
-		order["items"] = items
-		order["total"] = total
-		order["status"] = status
-		order["createdAt"] = createdAt
-		order["customerName"] = name
-		order["customerPhone"] = phone
-		order["customerEmail"] = email
-		order["notes"] = notes
-		
-		orders = append(orders, order)
-	}
-	
-	writeJSON(w, orders)
+	stream := newRowStream(w, wantsNDJSON(r))
+	stream.Begin("")
+	next, err := streamOrders(rows, stream, limit)
+	if err != nil {
+		log.Println("streaming orders failed:", err)
+		panic(http.ErrAbortHandler)
+	}
+	stream.End("", next)
 }
 
-func (s *Server) handleExportData(w http.ResponseWriter, r *http.Request, claims map[string]interface{}) {
+func (s *Server) handleExportData(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
 	if r.Method != http.MethodGet {
 		http.Error(w, "only GET allowed", http.StatusMethodNotAllowed)
 		return
@@ -251,18 +249,51 @@ func (s *Server) handleExportData(w http.ResponseWriter, r *http.Request, claims
 		return
 	}
 	
-	data, err := s.store.LoadRestaurantData(r.Context(), id)
+	doc, err := s.store.RestaurantDocument(r.Context(), id)
 	if err != nil {
 		http.Error(w, "failed to load data", http.StatusInternalServerError)
 		return
 	}
 	
-	w.Header().Set("Content-Type", "application/json")
-	w.Header().Set("Content-Disposition", "attachment; filename=export.json")
-	json.NewEncoder(w).Encode(data)
+	if r.URL.Query().Get("include") != "orders" {
+		w.Header().Set("Content-Type", "application/json")
+		w.Header().Set("Content-Disposition", "attachment; filename=export.json")
+		w.Write(doc)
+		return
+	}
+	
+	// Orders are streamed after the restaurant document: as an "orders"
+	// array inside it, or one order per line after it for NDJSON.
+	rows, err := s.store.DB.QueryContext(r.Context(),
+		"SELECT "+orderRowColumns+" FROM orders WHERE restaurant_id=$1 ORDER BY id", id)
+	if err != nil {
+		http.Error(w, "failed to fetch orders", http.StatusInternalServerError)
+		return
+	}
+	defer rows.Close()
+	
+	ndjson := wantsNDJSON(r)
+	stream := newRowStream(w, ndjson)
+	if ndjson {
+		w.Header().Set("Content-Disposition", "attachment; filename=export.ndjson")
+		stream.Begin(string(doc))
+	} else {
+		w.Header().Set("Content-Disposition", "attachment; filename=export.json")
+		body := bytes.TrimRight(doc, " \n")
+		stream.Begin(string(body[:len(body)-1]) + `,"orders":`)
+	}
+	if _, err := streamOrders(rows, stream, 0); err != nil {
+		log.Println("streaming export failed:", err)
+		panic(http.ErrAbortHandler)
+	}
+	if ndjson {
+		stream.End("", "")
+	} else {
+		stream.End("}\n", "")
+	}
 }
 
-func (s *Server) handleAuditLog(w http.ResponseWriter, r *http.Request, claims map[string]interface{}) {
+func (s *Server) handleAuditLog(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
 	if r.Method != http.MethodGet {
 		http.Error(w, "only GET allowed", http.StatusMethodNotAllowed)
 		return
@@ -274,9 +305,43 @@ func (s *Server) handleAuditLog(w http.ResponseWriter, r *http.Request, claims m
 		return
 	}
 	
-	rows, err := s.store.DB.QueryContext(r.Context(),
-		`SELECT id, admin_email, action, payload, ip, created_at 
-		 FROM audit_log WHERE restaurant_id=$1 ORDER BY created_at DESC LIMIT 200`, id)
+	limit, err := parseLimit(r, 100, 500)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	cursor, err := parseCursorParam(r)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	from, err := parseTimeParam(r, "from")
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	to, err := parseTimeParam(r, "to")
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	
+	if month := r.URL.Query().Get("archive"); month != "" {
+		s.serveArchivedAuditLog(w, r, month, auditArchiveFilter{
+			RestaurantID: id, Email: r.URL.Query().Get("email"),
+			From: from, To: to, After: cursor, Limit: limit,
+		})
+		return
+	}
+
+	var q listQuery
+	q.where("restaurant_id = %s", id)
+	if email := r.URL.Query().Get("email"); email != "" {
+		q.where("admin_email = %s", email)
+	}
+	q.timeRange(from, to)
+	q.after(cursor)
+	rows, err := s.store.DB.QueryContext(r.Context(), q.sql(auditRowColumns, "audit_log", limit+1), q.args...)
 	
 	if err != nil {
 		http.Error(w, "failed to fetch audit log", http.StatusInternalServerError)
@@ -284,28 +349,43 @@ func (s *Server) handleAuditLog(w http.ResponseWriter, r *http.Request, claims m
 	}
 	defer rows.Close()
 	
-	var logs []map[string]interface{}
-	for rows.Next() {
-		var log map[string]interface{} = make(map[string]interface{})
-		var id int
-		var email, action, ip string
-		var payloadJSON []byte
-		var createdAt time.Time
-		
-		rows.Scan(&id, &email, &action, &payloadJSON, &ip, &createdAt)
-		
-		var payload map[string]interface{}
-		json.Unmarshal(payloadJSON, &payload)
-		
-		log["id"] = id
-		log["email"] = email
-		log["action"] = action
-		log["payload"] = payload
-		log["ip"] = ip
-		log["createdAt"] = createdAt
-		
-		logs = append(logs, log)
-	}
-	
-	writeJSON(w, logs)
+	stream := newRowStream(w, wantsNDJSON(r))
+	stream.Begin("")
+	next, err := streamAuditRows(rows, stream, limit)
+	if err != nil {
+		log.Println("streaming audit log failed:", err)
+		panic(http.ErrAbortHandler)
+	}
+	stream.End("", next)
+}
+
+// serveArchivedAuditLog answers handleAuditLog for a month (YYYY-MM) that
+// scripts/archive_partitions.go has moved out of the database, reading the
+// archive file on demand.
+func (s *Server) serveArchivedAuditLog(w http.ResponseWriter, r *http.Request, month string, f auditArchiveFilter) {
+	m, err := time.Parse("2006-01", month)
+	if err != nil {
+		http.Error(w, "invalid archive month, want YYYY-MM", http.StatusBadRequest)
+		return
+	}
+	archive, err := s.store.openArchive(r.Context(), "audit_log", m)
+	if err == errNotArchived {
+		http.Error(w, "month not archived", http.StatusNotFound)
+		return
+	}
+	if err != nil {
+		log.Println("open audit archive failed:", err)
+		http.Error(w, "failed to open audit archive", http.StatusInternalServerError)
+		return
+	}
+	defer archive.Close()
+
+	stream := newRowStream(w, wantsNDJSON(r))
+	stream.Begin("")
+	next, err := streamArchivedAudit(archive, f, stream)
+	if err != nil {
+		log.Println("streaming audit archive failed:", err)
+		panic(http.ErrAbortHandler)
+	}
+	stream.End("", next)
 }
@@ -1,7 +1,6 @@
 package main
 
 import (
-	"context"
 	"crypto/rand"
 	"database/sql"
 	"encoding/hex"
@@ -11,8 +10,6 @@ import (
 	"os"
 	"time"
 
-	"golang.org/x/crypto/bcrypt"
-
 	"github.com/golang-jwt/jwt/v4"
 )
 
@@ -85,14 +82,12 @@ func (s *Server) handleInviteAdmin(w http.ResponseWriter, r *http.Request, claim
 	inviteURL := fmt.Sprintf("%s/invite/accept?token=%s&restaurantId=%d", frontend, token, restaurantId)
 	subject := "You're invited to manage the restaurant"
 	body := fmt.Sprintf("You have been invited as '%s' for restaurant ID %d.\n\nClick the link to accept and create your password (expires in 72 hours):\n\n%s", payload.Role, restaurantId, inviteURL)
-	go func() {
-		if err := sendEmail(payload.Email, subject, body); err != nil {
-			fmt.Println("failed sending invite email:", err)
-		}
-	}()
+	if err := s.mail.Enqueue(r.Context(), payload.Email, subject, body); err != nil {
+		fmt.Println("failed queueing invite email:", err)
+	}
 
 	pl := map[string]any{"action": "invite_created", "invited_email": payload.Email, "role": payload.Role}
-	_ = insertAuditLog(r.Context(), s.store.DB, restaurantId, claims["email"].(string), "invite_created", pl, r.RemoteAddr)
+	s.audit.Log(restaurantId, claims["email"].(string), "invite_created", pl, r.RemoteAddr)
 
 	writeJSON(w, map[string]any{"ok": true})
 }
@@ -102,6 +97,10 @@ func (s *Server) handleAcceptInvite(w http.ResponseWriter, r *http.Request) {
 		http.Error(w, "only POST", http.StatusMethodNotAllowed)
 		return
 	}
+	if ok, retry := s.throttle.AllowIP(r); !ok {
+		writeThrottled(w, retry)
+		return
+	}
 	var p struct {
 		Token    string `json:"token"`
 		Password string `json:"password"`
@@ -133,7 +132,11 @@ func (s *Server) handleAcceptInvite(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	hash, err := bcrypt.GenerateFromPassword([]byte(p.Password), bcrypt.DefaultCost)
+	hash, err := s.hasher.Hash(r.Context(), p.Password)
+	if err == errHasherBusy {
+		writeThrottled(w, 0)
+		return
+	}
 	if err != nil {
 		http.Error(w, "failed to hash password", http.StatusInternalServerError)
 		return
@@ -141,26 +144,20 @@ func (s *Server) handleAcceptInvite(w http.ResponseWriter, r *http.Request) {
 	perms := []string{}
 	permB, _ := json.Marshal(perms)
 	_, err = s.store.DB.ExecContext(r.Context(), "INSERT INTO admins (restaurant_id, email, password_hash, role, permissions) VALUES ($1,$2,$3,$4,$5) ON CONFLICT (restaurant_id, email) DO UPDATE SET password_hash=EXCLUDED.password_hash, role=EXCLUDED.role, permissions=EXCLUDED.permissions",
-		inv.RestaurantID, inv.Email, string(hash), inv.Role, permB)
+		inv.RestaurantID, inv.Email, hash, inv.Role, permB)
 	if err != nil {
 		http.Error(w, "failed to create admin", http.StatusInternalServerError)
 		return
 	}
 
 	_, _ = s.store.DB.ExecContext(r.Context(), "UPDATE admin_invitations SET accepted_at=$1 WHERE id=$2", time.Now(), inv.ID)
-	_ = insertAuditLog(r.Context(), s.store.DB, inv.RestaurantID, inv.Email, "invite_accepted", map[string]any{"invitation_id": inv.ID}, r.RemoteAddr)
+	s.audit.Log(inv.RestaurantID, inv.Email, "invite_accepted", map[string]any{"invitation_id": inv.ID}, r.RemoteAddr)
 
-	go func() {
-		subject := "Your admin account is ready"
-		body := fmt.Sprintf("Hello %s. Your admin account for restaurant %d is now active. You can login at %s/restaurant/%d/admin", inv.Email, inv.RestaurantID, os.Getenv("FRONTEND_URL"), inv.RestaurantID)
-		_ = sendEmail(inv.Email, subject, body)
-	}()
+	subject := "Your admin account is ready"
+	body := fmt.Sprintf("Hello %s. Your admin account for restaurant %d is now active. You can login at %s/restaurant/%d/admin", inv.Email, inv.RestaurantID, os.Getenv("FRONTEND_URL"), inv.RestaurantID)
+	if err := s.mail.Enqueue(r.Context(), inv.Email, subject, body); err != nil {
+		fmt.Println("failed queueing welcome email:", err)
+	}
 
 	writeJSON(w, map[string]any{"ok": true})
 }
-
-func insertAuditLog(ctx context.Context, db *sql.DB, restaurantID int, adminEmail string, action string, payload any, ip string) error {
-	plb, _ := json.Marshal(payload)
-	_, err := db.ExecContext(ctx, "INSERT INTO audit_log (restaurant_id, admin_email, action, payload, ip, created_at) VALUES ($1,$2,$3,$4,$5,$6)", restaurantID, adminEmail, action, plb, ip, time.Now())
-	return err
-}
@@ -0,0 +1,110 @@
+package main
+
+import (
+	"fmt"
+	"net"
+	"net/http"
+	"strconv"
+	"strings"
+	"sync"
+	"time"
+)
+
+type throttleBucket struct {
+	tokens float64
+	last   time.Time
+}
+
+// loginThrottle rate-limits credential endpoints per client IP and per
+// account with token buckets, so stuffing attempts are refused before they
+// cost a bcrypt run. Each key may make perMinute attempts in a burst and
+// then one every minute/perMinute.
+type loginThrottle struct {
+	ipPerMinute      int
+	accountPerMinute int
+	reviewPerMinute  int
+
+	mu        sync.Mutex
+	buckets   map[string]*throttleBucket
+	lastSweep time.Time
+}
+
+// newLoginThrottleFromEnv reads LOGIN_IP_PER_MINUTE (default 20),
+// LOGIN_ACCOUNT_PER_MINUTE (default 5) and REVIEW_IP_PER_MINUTE (default 5).
+func newLoginThrottleFromEnv() *loginThrottle {
+	return &loginThrottle{
+		ipPerMinute:      envInt("LOGIN_IP_PER_MINUTE", 20),
+		accountPerMinute: envInt("LOGIN_ACCOUNT_PER_MINUTE", 5),
+		reviewPerMinute:  envInt("REVIEW_IP_PER_MINUTE", 5),
+		buckets:          map[string]*throttleBucket{},
+		lastSweep:        time.Now(),
+	}
+}
+
+// AllowIP takes a token for the request's client address.
+func (t *loginThrottle) AllowIP(r *http.Request) (bool, time.Duration) {
+	return t.allow("ip:"+clientIP(r), t.ipPerMinute)
+}
+
+// AllowAccount takes a token for one admin account.
+func (t *loginThrottle) AllowAccount(restaurantID int, email string) (bool, time.Duration) {
+	return t.allow(fmt.Sprintf("acct:%d:%s", restaurantID, strings.ToLower(email)), t.accountPerMinute)
+}
+
+// AllowReview takes a token for a client address posting reviews of one
+// restaurant. Reviews are public, so this keeps one client from flooding
+// the review tables and keeping the restaurant document uncached.
+func (t *loginThrottle) AllowReview(r *http.Request, restaurantID int) (bool, time.Duration) {
+	return t.allow(fmt.Sprintf("review:%d:%s", restaurantID, clientIP(r)), t.reviewPerMinute)
+}
+
+func (t *loginThrottle) allow(key string, perMinute int) (bool, time.Duration) {
+	now := time.Now()
+	rate := float64(perMinute) / time.Minute.Seconds()
+	burst := float64(perMinute)
+
+	t.mu.Lock()
+	defer t.mu.Unlock()
+	if now.Sub(t.lastSweep) > time.Minute {
+		t.sweepLocked(now)
+	}
+	b, ok := t.buckets[key]
+	if !ok {
+		b = &throttleBucket{tokens: burst, last: now}
+		t.buckets[key] = b
+	}
+	b.tokens += now.Sub(b.last).Seconds() * rate
+	if b.tokens > burst {
+		b.tokens = burst
+	}
+	b.last = now
+	if b.tokens < 1 {
+		return false, time.Duration((1 - b.tokens) / rate * float64(time.Second))
+	}
+	b.tokens--
+	return true, 0
+}
+
+// sweepLocked drops buckets idle long enough to have refilled completely.
+// Every limit is per minute, so a minute of inactivity suffices.
+func (t *loginThrottle) sweepLocked(now time.Time) {
+	for k, b := range t.buckets {
+		if now.Sub(b.last) > time.Minute {
+			delete(t.buckets, k)
+		}
+	}
+	t.lastSweep = now
+}
+
+// writeThrottled answers 429 with a whole-second Retry-After.
+func writeThrottled(w http.ResponseWriter, retry time.Duration) {
+	w.Header().Set("Retry-After", strconv.Itoa(int(retry/time.Second)+1))
+	http.Error(w, "too many attempts, try again later", http.StatusTooManyRequests)
+}
+
+func clientIP(r *http.Request) string {
+	if host, _, err := net.SplitHostPort(r.RemoteAddr); err == nil {
+		return host
+	}
+	return r.RemoteAddr
+}
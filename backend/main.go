@@ -1,23 +1,35 @@
 package main
 
 import (
+	"context"
 	"database/sql"
 	"encoding/json"
-	"fmt"
 	"log"
 	"net/http"
 	"os"
+	"os/signal"
 	"strconv"
 	"strings"
+	"syscall"
 	"time"
 
-	"github.com/golang-jwt/jwt/v4"
 	_ "github.com/lib/pq"
 	"github.com/rs/cors"
 )
 
 type Server struct {
-	store *Store
+	store    *Store
+	cache    *restaurantCache
+	orders   *orderIngester
+	media    *mediaFetcher
+	exports  *exportJobs
+	auth     *tokenVerifier
+	hasher   *passwordHasher
+	throttle *loginThrottle
+	mail     *emailQueue
+	audit    *auditWriter
+
+	newsletters *newsletterSender
 }
 
 func main() {
@@ -31,13 +43,26 @@ func main() {
 		log.Fatal("Failed to connect to database:", err)
 	}
 	defer db.Close()
+	configureDBPoolFromEnv(db)
 
 	if err := db.Ping(); err != nil {
 		log.Fatal("Database ping failed:", err)
 	}
 
-	store := &Store{DB: db}
-	server := &Server{store: store}
+	store := &Store{DB: db, SingleQueryDocument: os.Getenv("RESTAURANT_DOCUMENT_MODE") == "single", ReviewsInDocument: envInt("REVIEWS_IN_DOCUMENT", 10)}
+	if err := store.Prepare(context.Background()); err != nil {
+		log.Fatal("Preparing statements failed:", err)
+	}
+	defer store.Close()
+	server := &Server{store: store, cache: newRestaurantCacheFromEnv(), orders: newOrderIngesterFromEnv(db), media: newMediaFetcherFromEnv(), auth: newTokenVerifierFromEnv(), hasher: newPasswordHasherFromEnv(), throttle: newLoginThrottleFromEnv(), mail: newEmailQueueFromEnv(db), audit: newAuditWriterFromEnv(db)}
+	server.audit.Start()
+	server.orders.Start()
+	server.hasher.Start()
+	server.mail.Start()
+	server.newsletters = newNewsletterSenderFromEnv(store)
+	server.newsletters.Start()
+	server.exports = newExportJobsFromEnv(server)
+	server.exports.Start()
 
 	mux := http.NewServeMux()
 	
@@ -66,22 +91,51 @@ func main() {
 	mux.HandleFunc("/api/admin/sessions/revoke_all", server.requireAuth(server.handleRevokeAllOtherSessions))
 	mux.HandleFunc("/api/admin/export/", server.requireAuth(server.handleExportData))
 	mux.HandleFunc("/api/admin/export_media/", server.requireAuth(server.handleExportMedia))
+	mux.HandleFunc("/api/admin/export_jobs/", server.requireAuth(server.handleExportJobs))
 	mux.HandleFunc("/api/admin/audit/", server.requireAuth(server.handleAuditLog))
+	mux.HandleFunc("/api/admin/newsletters/", server.requireAuth(server.handleNewsletters))
+	mux.HandleFunc("/api/admin/menu_items/", server.requireAuth(server.handleMenuItems))
+	mux.HandleFunc("/api/admin/metrics", server.requireAuth(server.handleMetrics))
 
 	corsHandler := cors.New(cors.Options{
 		AllowedOrigins:   []string{os.Getenv("ALLOW_ORIGIN")},
-		AllowedMethods:   []string{"GET", "POST", "PUT", "DELETE", "OPTIONS"},
-		AllowedHeaders:   []string{"Authorization", "Content-Type"},
+		AllowedMethods:   []string{"GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"},
+		AllowedHeaders:   []string{"Authorization", "Content-Type", "If-None-Match", "Range", "If-Range"},
+		ExposedHeaders:   []string{"ETag", "Location", "Content-Range", "Accept-Ranges"},
 		AllowCredentials: true,
-	}).Handler(mux)
+	}).Handler(compressHandler(mux))
 
 	port := os.Getenv("PORT")
 	if port == "" {
 		port = "8080"
 	}
 
-	log.Printf("Server starting on :%s", port)
-	log.Fatal(http.ListenAndServe(":"+port, corsHandler))
+	httpServer := &http.Server{Addr: ":" + port, Handler: corsHandler}
+	ctx, stop := signal.NotifyContext(context.Background(), os.Interrupt, syscall.SIGTERM)
+	defer stop()
+	if d := envDuration("DB_STATS_LOG_INTERVAL", 0); d > 0 {
+		go store.logDBStats(ctx, d)
+	}
+	go store.maintainPartitions(ctx, envInt("PARTITION_MONTHS_AHEAD", 3))
+	go func() {
+		log.Printf("Server starting on :%s", port)
+		if err := httpServer.ListenAndServe(); err != nil && err != http.ErrServerClosed {
+			log.Fatal(err)
+		}
+	}()
+
+	<-ctx.Done()
+	log.Println("Shutting down")
+	shutdownCtx, cancel := context.WithTimeout(context.Background(), 20*time.Second)
+	defer cancel()
+	if err := httpServer.Shutdown(shutdownCtx); err != nil {
+		log.Println("http shutdown:", err)
+	}
+	server.exports.Close()
+	server.orders.Close()
+	server.newsletters.Close()
+	server.mail.Close()
+	server.audit.Close()
 }
 
 func writeJSON(w http.ResponseWriter, data any) {
@@ -0,0 +1,356 @@
+package main
+
+import (
+	"container/list"
+	"context"
+	"crypto/sha256"
+	"encoding/hex"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"net/http"
+	"os"
+	"path/filepath"
+	"sort"
+	"strconv"
+	"strings"
+	"sync"
+	"time"
+
+	"github.com/aws/aws-sdk-go-v2/aws"
+	"github.com/aws/aws-sdk-go-v2/service/s3"
+)
+
+var errMediaNotCached = errors.New("media not cached")
+
+// mediaCacheMeta is what the cache remembers about a remote source: the
+// validators to revalidate it with and the content blob it resolved to.
+type mediaCacheMeta struct {
+	Source       string    `json:"source"`
+	ETag         string    `json:"etag,omitempty"`
+	LastModified string    `json:"lastModified,omitempty"`
+	SHA256       string    `json:"sha256"`
+	Size         int64     `json:"size"`
+	StoredAt     time.Time `json:"storedAt"`
+}
+
+type mediaBlob struct {
+	sha  string
+	size int64
+}
+
+// mediaCache is a content-addressed on-disk cache for remote export media.
+// Content lives in blobs/<sha256>, so sources with identical bytes share a
+// blob; sources/<sha256 of URL>.json maps each URL to its blob and
+// validators. Blobs are evicted LRU once their total size exceeds maxBytes.
+// Files are written to a temp name and renamed into place.
+type mediaCache struct {
+	dir      string
+	maxBytes int64
+
+	mu      sync.Mutex
+	size    int64
+	lru     *list.List
+	blobs   map[string]*list.Element
+	sources map[string]mediaCacheMeta
+}
+
+// newMediaCacheFromEnv reads MEDIA_CACHE_DIR (unset disables the cache) and
+// MEDIA_CACHE_MAX_BYTES (default 1GB).
+func newMediaCacheFromEnv() *mediaCache {
+	dir := strings.TrimSpace(os.Getenv("MEDIA_CACHE_DIR"))
+	if dir == "" {
+		return nil
+	}
+	maxBytes := int64(1 << 30)
+	if v := os.Getenv("MEDIA_CACHE_MAX_BYTES"); v != "" {
+		if n, err := strconv.ParseInt(v, 10, 64); err == nil && n > 0 {
+			maxBytes = n
+		}
+	}
+	c, err := openMediaCache(dir, maxBytes)
+	if err != nil {
+		fmt.Println("media cache disabled:", err)
+		return nil
+	}
+	return c
+}
+
+// openMediaCache loads the index from dir, dropping source entries whose
+// blob is gone and ordering blobs by their last use.
+func openMediaCache(dir string, maxBytes int64) (*mediaCache, error) {
+	for _, sub := range []string{"blobs", "sources", "tmp"} {
+		if err := os.MkdirAll(filepath.Join(dir, sub), 0o755); err != nil {
+			return nil, err
+		}
+	}
+	c := &mediaCache{
+		dir:      dir,
+		maxBytes: maxBytes,
+		lru:      list.New(),
+		blobs:    map[string]*list.Element{},
+		sources:  map[string]mediaCacheMeta{},
+	}
+
+	tmp, _ := os.ReadDir(filepath.Join(dir, "tmp"))
+	for _, e := range tmp {
+		os.Remove(filepath.Join(dir, "tmp", e.Name()))
+	}
+
+	blobs, err := os.ReadDir(filepath.Join(dir, "blobs"))
+	if err != nil {
+		return nil, err
+	}
+	type blobInfo struct {
+		mediaBlob
+		used time.Time
+	}
+	var infos []blobInfo
+	for _, e := range blobs {
+		fi, err := e.Info()
+		if err != nil || !fi.Mode().IsRegular() {
+			continue
+		}
+		infos = append(infos, blobInfo{mediaBlob{sha: e.Name(), size: fi.Size()}, fi.ModTime()})
+	}
+	sort.Slice(infos, func(i, j int) bool { return infos[i].used.After(infos[j].used) })
+	for _, b := range infos {
+		c.blobs[b.sha] = c.lru.PushBack(&mediaBlob{sha: b.sha, size: b.size})
+		c.size += b.size
+	}
+
+	metas, err := os.ReadDir(filepath.Join(dir, "sources"))
+	if err != nil {
+		return nil, err
+	}
+	for _, e := range metas {
+		path := filepath.Join(dir, "sources", e.Name())
+		b, err := os.ReadFile(path)
+		var meta mediaCacheMeta
+		if err != nil || json.Unmarshal(b, &meta) != nil || c.blobs[meta.SHA256] == nil {
+			os.Remove(path)
+			continue
+		}
+		c.sources[meta.Source] = meta
+	}
+
+	c.mu.Lock()
+	c.evictLocked()
+	c.mu.Unlock()
+	return c, nil
+}
+
+func (c *mediaCache) blobPath(sha string) string {
+	return filepath.Join(c.dir, "blobs", sha)
+}
+
+func (c *mediaCache) sourcePath(src string) string {
+	sum := sha256.Sum256([]byte(src))
+	return filepath.Join(c.dir, "sources", hex.EncodeToString(sum[:])+".json")
+}
+
+// Lookup returns the cached validators for src.
+func (c *mediaCache) Lookup(src string) (mediaCacheMeta, bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	meta, ok := c.sources[src]
+	if ok && c.blobs[meta.SHA256] == nil {
+		delete(c.sources, src)
+		return mediaCacheMeta{}, false
+	}
+	return meta, ok
+}
+
+// Open opens the blob src resolved to and marks it recently used. An open
+// file stays readable even if the blob is evicted meanwhile.
+func (c *mediaCache) Open(meta mediaCacheMeta) (*os.File, error) {
+	c.mu.Lock()
+	el, ok := c.blobs[meta.SHA256]
+	if ok {
+		c.lru.MoveToFront(el)
+	}
+	c.mu.Unlock()
+	if !ok {
+		return nil, errMediaNotCached
+	}
+	f, err := os.Open(c.blobPath(meta.SHA256))
+	if err != nil {
+		return nil, errMediaNotCached
+	}
+	now := time.Now()
+	os.Chtimes(f.Name(), now, now)
+	return f, nil
+}
+
+// Store copies body into the cache under meta.Source and returns the stored
+// blob opened for reading.
+func (c *mediaCache) Store(meta mediaCacheMeta, body io.Reader) (*os.File, error) {
+	tmp, err := os.CreateTemp(filepath.Join(c.dir, "tmp"), "blob-*")
+	if err != nil {
+		return nil, err
+	}
+	defer os.Remove(tmp.Name())
+	h := sha256.New()
+	size, err := io.Copy(io.MultiWriter(tmp, h), body)
+	if cerr := tmp.Close(); err == nil {
+		err = cerr
+	}
+	if err != nil {
+		return nil, err
+	}
+
+	meta.SHA256 = hex.EncodeToString(h.Sum(nil))
+	meta.Size = size
+	meta.StoredAt = time.Now().UTC()
+	if err := os.Rename(tmp.Name(), c.blobPath(meta.SHA256)); err != nil {
+		return nil, err
+	}
+	f, err := os.Open(c.blobPath(meta.SHA256))
+	if err != nil {
+		return nil, err
+	}
+	if err := c.writeMeta(meta); err != nil {
+		fmt.Println("media cache: write meta:", err)
+	}
+
+	c.mu.Lock()
+	if el, ok := c.blobs[meta.SHA256]; ok {
+		c.lru.MoveToFront(el)
+	} else {
+		c.blobs[meta.SHA256] = c.lru.PushFront(&mediaBlob{sha: meta.SHA256, size: size})
+		c.size += size
+	}
+	c.sources[meta.Source] = meta
+	c.evictLocked()
+	c.mu.Unlock()
+	return f, nil
+}
+
+func (c *mediaCache) writeMeta(meta mediaCacheMeta) error {
+	b, err := json.Marshal(meta)
+	if err != nil {
+		return err
+	}
+	tmp, err := os.CreateTemp(filepath.Join(c.dir, "tmp"), "meta-*")
+	if err != nil {
+		return err
+	}
+	defer os.Remove(tmp.Name())
+	_, err = tmp.Write(b)
+	if cerr := tmp.Close(); err == nil {
+		err = cerr
+	}
+	if err != nil {
+		return err
+	}
+	return os.Rename(tmp.Name(), c.sourcePath(meta.Source))
+}
+
+// evictLocked removes least recently used blobs until the cache fits, but
+// never the most recent one. Source entries pointing at an evicted blob are
+// dropped on their next Lookup or on restart.
+func (c *mediaCache) evictLocked() {
+	for c.size > c.maxBytes && c.lru.Len() > 1 {
+		b := c.lru.Remove(c.lru.Back()).(*mediaBlob)
+		delete(c.blobs, b.sha)
+		c.size -= b.size
+		os.Remove(c.blobPath(b.sha))
+	}
+}
+
+// fetchCached returns a remote source from the media cache, revalidating
+// it first: HTTP sources with If-None-Match/If-Modified-Since, S3 sources
+// by comparing the object's ETag from HeadObject. Misses and changed
+// sources are downloaded into the cache; the returned buffer reads the
+// cached blob straight from disk.
+func (f *mediaFetcher) fetchCached(ctx context.Context, src string) (*spillBuffer, error) {
+	meta, ok := f.cache.Lookup(src)
+	buf, err := f.revalidate(ctx, src, meta, ok)
+	if errors.Is(err, errMediaNotCached) {
+		// The blob was evicted between Lookup and Open.
+		buf, err = f.revalidate(ctx, src, mediaCacheMeta{}, false)
+	}
+	return buf, err
+}
+
+func (f *mediaFetcher) revalidate(ctx context.Context, src string, meta mediaCacheMeta, cached bool) (*spillBuffer, error) {
+	if strings.HasPrefix(src, "s3://") {
+		parts := strings.SplitN(strings.TrimPrefix(src, "s3://"), "/", 2)
+		if len(parts) != 2 {
+			return nil, fmt.Errorf("invalid s3 url: %s", src)
+		}
+		client, err := f.S3()
+		if err != nil {
+			return nil, fmt.Errorf("aws config: %w", err)
+		}
+		if cached && meta.ETag != "" {
+			head, err := client.HeadObject(ctx, &s3.HeadObjectInput{Bucket: &parts[0], Key: &parts[1]})
+			if err != nil {
+				return nil, fmt.Errorf("s3 head object: %w", err)
+			}
+			if aws.ToString(head.ETag) == meta.ETag {
+				return cachedBuffer(f.cache.Open(meta))
+			}
+		}
+		out, err := client.GetObject(ctx, &s3.GetObjectInput{Bucket: &parts[0], Key: &parts[1]})
+		if err != nil {
+			return nil, fmt.Errorf("s3 get object: %w", err)
+		}
+		defer out.Body.Close()
+		next := mediaCacheMeta{Source: src, ETag: aws.ToString(out.ETag)}
+		if out.LastModified != nil {
+			next.LastModified = out.LastModified.UTC().Format(http.TimeFormat)
+		}
+		return cachedBuffer(f.cache.Store(next, out.Body))
+	}
+
+	req, err := http.NewRequestWithContext(ctx, "GET", src, nil)
+	if err != nil {
+		return nil, err
+	}
+	if cached {
+		if meta.ETag != "" {
+			req.Header.Set("If-None-Match", meta.ETag)
+		}
+		if meta.LastModified != "" {
+			req.Header.Set("If-Modified-Since", meta.LastModified)
+		}
+	}
+	resp, err := f.http.Do(req)
+	if err != nil {
+		return nil, err
+	}
+	defer resp.Body.Close()
+	if resp.StatusCode == http.StatusNotModified && cached {
+		return cachedBuffer(f.cache.Open(meta))
+	}
+	if resp.StatusCode >= 400 {
+		return nil, fmt.Errorf("http status %d", resp.StatusCode)
+	}
+	next := mediaCacheMeta{Source: src, ETag: resp.Header.Get("ETag"), LastModified: resp.Header.Get("Last-Modified")}
+	if next.ETag == "" && next.LastModified == "" {
+		// Without validators the copy could never be reused.
+		buf := &spillBuffer{dir: f.spillDir, limit: f.spillBytes}
+		if _, err := io.Copy(buf, resp.Body); err != nil {
+			buf.Close()
+			return nil, err
+		}
+		return buf, nil
+	}
+	return cachedBuffer(f.cache.Store(next, resp.Body))
+}
+
+// cachedBuffer wraps an open cache blob so it can be consumed like a
+// prefetched download; closing it leaves the blob in place.
+func cachedBuffer(file *os.File, err error) (*spillBuffer, error) {
+	if err != nil {
+		return nil, err
+	}
+	fi, err := file.Stat()
+	if err != nil {
+		file.Close()
+		return nil, err
+	}
+	return &spillBuffer{file: file, keep: true, size: fi.Size(), sum: filepath.Base(file.Name())}, nil
+}
@@ -0,0 +1,203 @@
+package main
+
+import (
+	"bytes"
+	"context"
+	"database/sql"
+	"encoding/json"
+	"errors"
+	"fmt"
+
+	"github.com/aws/aws-sdk-go-v2/aws"
+	"github.com/aws/aws-sdk-go-v2/service/s3"
+	"github.com/aws/aws-sdk-go-v2/service/s3/types"
+)
+
+// exportBaseline is the previous manifest a delta export is compared with.
+// A nil baseline means a full export.
+type exportBaseline struct {
+	entries  []exportImage
+	bySource map[string]exportImage
+}
+
+// newExportBaseline indexes a previous manifest by source. Entries that were
+// removed or failed to download then count as absent.
+func newExportBaseline(entries []exportImage) *exportBaseline {
+	b := &exportBaseline{bySource: map[string]exportImage{}}
+	for _, e := range entries {
+		if e.Status == "removed" || e.Error != "" || e.SHA256 == "" {
+			continue
+		}
+		b.entries = append(b.entries, e)
+		b.bySource[e.Src] = e
+	}
+	return b
+}
+
+// include sets the delta status of a downloaded image and reports whether
+// it belongs in the export. An image is unchanged when both its content
+// hash and its archive path match the previous manifest.
+func (b *exportBaseline) include(it *exportImage) bool {
+	if b == nil {
+		return true
+	}
+	prev, ok := b.bySource[it.Src]
+	switch {
+	case !ok:
+		it.Status = "added"
+	case prev.SHA256 != it.SHA256 || prev.ZipName != it.ZipName:
+		it.Status = "changed"
+	default:
+		it.Status = "unchanged"
+		return false
+	}
+	return true
+}
+
+// removed lists the previous entries whose source is no longer exported or
+// now lives under a different archive path.
+func (b *exportBaseline) removed(images []exportImage) []exportImage {
+	if b == nil {
+		return nil
+	}
+	current := make(map[string]string, len(images))
+	for _, it := range images {
+		current[it.Src] = it.ZipName
+	}
+	var out []exportImage
+	for _, e := range b.entries {
+		if zipName, ok := current[e.Src]; !ok || zipName != e.ZipName {
+			out = append(out, exportImage{ZipName: e.ZipName, Src: e.Src, Kind: e.Kind, Category: e.Category, ItemName: e.ItemName, SHA256: e.SHA256, Status: "removed"})
+		}
+	}
+	return out
+}
+
+// exportManifest is the manifest.json content: every current image plus,
+// for delta exports, the removals.
+func exportManifest(images []exportImage, baseline *exportBaseline) []exportImage {
+	return append(images[:len(images):len(images)], baseline.removed(images)...)
+}
+
+// countStatuses summarises a manifest for the API response.
+func countStatuses(manifest []exportImage) map[string]int {
+	counts := map[string]int{}
+	for _, e := range manifest {
+		if e.Error != "" {
+			counts["failed"]++
+			continue
+		}
+		if e.Status != "" {
+			counts[e.Status]++
+		}
+	}
+	return counts
+}
+
+func loadExportManifest(ctx context.Context, db *sql.DB, restaurantID int, target string) ([]exportImage, error) {
+	var raw []byte
+	err := db.QueryRowContext(ctx, `SELECT manifest FROM media_export_manifests WHERE restaurant_id=$1 AND target=$2`, restaurantID, target).Scan(&raw)
+	if errors.Is(err, sql.ErrNoRows) {
+		return nil, nil
+	}
+	if err != nil {
+		return nil, err
+	}
+	var entries []exportImage
+	if err := json.Unmarshal(raw, &entries); err != nil {
+		return nil, err
+	}
+	return entries, nil
+}
+
+func saveExportManifest(ctx context.Context, db *sql.DB, restaurantID int, target string, manifest []exportImage) error {
+	raw, err := json.Marshal(manifest)
+	if err != nil {
+		return err
+	}
+	_, err = db.ExecContext(ctx, `
+		INSERT INTO media_export_manifests (restaurant_id, target, manifest, created_at)
+		VALUES ($1, $2, $3, now())
+		ON CONFLICT (restaurant_id, target) DO UPDATE SET manifest = EXCLUDED.manifest, created_at = EXCLUDED.created_at`,
+		restaurantID, target, raw)
+	return err
+}
+
+// uploadMediaDelta syncs the export to bucket/prefix as individual objects:
+// added and changed images are uploaded, removed ones deleted, and
+// manifest.json rewritten. It returns the manifest.
+func (s *Server) uploadMediaDelta(ctx context.Context, client *s3.Client, bucket, prefix string, images []exportImage, baseline *exportBaseline, public bool, progress *exportProgress) ([]exportImage, error) {
+	var acl types.ObjectCannedACL
+	if public {
+		acl = types.ObjectCannedACLPublicRead
+	}
+
+	sources := make([]string, len(images))
+	for i, it := range images {
+		sources[i] = it.Src
+	}
+	err := s.media.Prefetch(ctx, sources, func(i int, res prefetchResult) error {
+		it := &images[i]
+		defer progress.record(it)
+		it.FetchMs = res.duration.Milliseconds()
+		if res.err != nil {
+			it.Error = res.err.Error()
+			return nil
+		}
+		it.Bytes = res.buf.size
+		it.SHA256 = res.buf.SHA256()
+		if !baseline.include(it) {
+			return nil
+		}
+		body, err := res.buf.Reader()
+		if err != nil {
+			it.Error = err.Error()
+			return nil
+		}
+		if _, err := client.PutObject(ctx, &s3.PutObjectInput{
+			Bucket:        aws.String(bucket),
+			Key:           aws.String(prefix + it.ZipName),
+			Body:          body,
+			ContentLength: aws.Int64(it.Bytes),
+			ACL:           acl,
+		}); err != nil {
+			it.Error = fmt.Sprintf("s3 put object: %v", err)
+		}
+		return nil
+	})
+	if err != nil {
+		return nil, err
+	}
+
+	removed := baseline.removed(images)
+	for start := 0; start < len(removed); start += 1000 {
+		end := start + 1000
+		if end > len(removed) {
+			end = len(removed)
+		}
+		objects := make([]types.ObjectIdentifier, 0, end-start)
+		for _, e := range removed[start:end] {
+			objects = append(objects, types.ObjectIdentifier{Key: aws.String(prefix + e.ZipName)})
+		}
+		if _, err := client.DeleteObjects(ctx, &s3.DeleteObjectsInput{
+			Bucket: aws.String(bucket),
+			Delete: &types.Delete{Objects: objects, Quiet: aws.Bool(true)},
+		}); err != nil {
+			return nil, fmt.Errorf("s3 delete objects: %w", err)
+		}
+	}
+
+	manifest := append(images[:len(images):len(images)], removed...)
+	mbytes, _ := json.MarshalIndent(manifest, "", "  ")
+	if _, err := client.PutObject(ctx, &s3.PutObjectInput{
+		Bucket:        aws.String(bucket),
+		Key:           aws.String(prefix + "manifest.json"),
+		Body:          bytes.NewReader(mbytes),
+		ContentLength: aws.Int64(int64(len(mbytes))),
+		ContentType:   aws.String("application/json"),
+		ACL:           acl,
+	}); err != nil {
+		return nil, fmt.Errorf("s3 put manifest: %w", err)
+	}
+	return manifest, nil
+}
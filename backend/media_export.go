@@ -1,10 +1,8 @@
 package main
 
 import (
-	"archive/zip"
 	"context"
 	"encoding/json"
-	"errors"
 	"fmt"
 	"io"
 	"net/http"
@@ -14,9 +12,11 @@ import (
 	"strings"
 	"time"
 
+	"github.com/aws/aws-sdk-go-v2/aws"
 	"github.com/aws/aws-sdk-go-v2/config"
 	"github.com/aws/aws-sdk-go-v2/feature/s3/manager"
 	"github.com/aws/aws-sdk-go-v2/service/s3"
+	"github.com/aws/aws-sdk-go-v2/service/s3/types"
 	"github.com/golang-jwt/jwt/v4"
 )
 
@@ -64,155 +64,153 @@ func createZipEntryName(kind string, category string, itemName string, src strin
 	return filepath.ToSlash(filepath.Join("galleries", fmt.Sprintf("%02d_%s", idx, bn)))
 }
 
-func fetchToWriter(ctx context.Context, src string, writer io.Writer) error {
-	src = strings.TrimSpace(src)
-	if src == "" {
-		return errors.New("empty src")
+// newS3Client builds an S3 client from the default AWS config. When
+// S3_ENDPOINT is set (MinIO, a local stand-in, ...) requests go to that
+// endpoint using path-style addressing.
+func newS3Client(ctx context.Context) (*s3.Client, error) {
+	cfg, err := config.LoadDefaultConfig(ctx)
+	if err != nil {
+		return nil, err
 	}
-
-	if strings.HasPrefix(src, "s3://") {
-		trim := strings.TrimPrefix(src, "s3://")
-		parts := strings.SplitN(trim, "/", 2)
-		if len(parts) != 2 {
-			return fmt.Errorf("invalid s3 url: %s", src)
+	endpoint := strings.TrimSpace(os.Getenv("S3_ENDPOINT"))
+	return s3.NewFromConfig(cfg, func(o *s3.Options) {
+		if endpoint != "" {
+			o.BaseEndpoint = aws.String(endpoint)
+			o.UsePathStyle = true
 		}
-		bucket := parts[0]
-		key := parts[1]
+	}), nil
+}
 
-		cfg, err := config.LoadDefaultConfig(ctx)
-		if err != nil {
-			return fmt.Errorf("aws config: %w", err)
+// exportImage is one image of a media export and, once written, its
+// manifest.json entry.
+type exportImage struct {
+	ZipName  string `json:"zip"`
+	Src      string `json:"source"`
+	Kind     string `json:"kind"`
+	Category string `json:"category,omitempty"`
+	ItemName string `json:"itemName,omitempty"`
+	Bytes    int64  `json:"bytes"`
+	SHA256   string `json:"sha256,omitempty"`
+	FetchMs  int64  `json:"fetchMs"`
+	Status   string `json:"status,omitempty"`
+	Error    string `json:"error,omitempty"`
+}
+
+// writeZipStream writes the images, prefetched concurrently but added in
+// order, followed by manifest.json. Sources that fail to download are left
+// out of the archive and reported in the manifest. With a baseline only
+// added and changed images are written and the manifest lists removals.
+func (s *Server) writeZipStream(ctx context.Context, w io.Writer, images []exportImage, baseline *exportBaseline, progress *exportProgress) error {
+	zw := newExportZipWriter(w)
+
+	sources := make([]string, len(images))
+	for i, it := range images {
+		sources[i] = it.Src
+	}
+	err := s.media.Prefetch(ctx, sources, func(i int, res prefetchResult) error {
+		it := &images[i]
+		defer progress.record(it)
+		it.FetchMs = res.duration.Milliseconds()
+		if res.err != nil {
+			fmt.Printf("fetch failed for %s -> %s: %v\n", it.Src, it.ZipName, res.err)
+			it.Error = res.err.Error()
+			return nil
 		}
-		client := s3.NewFromConfig(cfg)
-		out, err := client.GetObject(ctx, &s3.GetObjectInput{
-			Bucket: &bucket,
-			Key:    &key,
-		})
-		if err != nil {
-			return fmt.Errorf("s3 get object: %w", err)
+		it.Bytes = res.buf.size
+		it.SHA256 = res.buf.SHA256()
+		if !baseline.include(it) {
+			return nil
 		}
-		defer out.Body.Close()
-		_, err = io.Copy(writer, out.Body)
-		return err
-	}
-
-	if strings.HasPrefix(src, "http://") || strings.HasPrefix(src, "https://") {
-		req, err := http.NewRequestWithContext(ctx, "GET", src, nil)
+		body, err := res.buf.Reader()
 		if err != nil {
-			return err
+			it.Error = err.Error()
+			return nil
 		}
-		client := &http.Client{Timeout: 20 * time.Second}
-		resp, err := client.Do(req)
+		fh, err := zipEntryHeader(it.ZipName, body)
 		if err != nil {
-			return err
+			it.Error = err.Error()
+			return nil
 		}
-		defer resp.Body.Close()
-		if resp.StatusCode >= 400 {
-			return fmt.Errorf("http status %d", resp.StatusCode)
+		fw, err := zw.CreateHeader(fh)
+		if err != nil {
+			return fmt.Errorf("zip create %s: %w", it.ZipName, err)
 		}
-		_, err = io.Copy(writer, resp.Body)
+		_, err = io.Copy(fw, body)
+		return err
+	})
+	if err != nil {
 		return err
 	}
 
-	local := src
-	imgRoot := os.Getenv("IMG_ROOT")
-	if imgRoot == "" {
-		imgRoot = "./frontend/public"
-	}
-	if strings.HasPrefix(src, "/") {
-		local = filepath.Join(imgRoot, strings.TrimPrefix(src, "/"))
-	} else {
-		local = filepath.Join(imgRoot, src)
-	}
-	local = filepath.Clean(local)
-
-	f, err := os.Open(local)
+	mbytes, _ := json.MarshalIndent(exportManifest(images, baseline), "", "  ")
+	fh, _ := zipEntryHeader("manifest.json", nil)
+	fm, err := zw.CreateHeader(fh)
 	if err != nil {
-		return fmt.Errorf("open local: %w", err)
+		return err
 	}
-	defer f.Close()
-	_, err = io.Copy(writer, f)
-	return err
-}
-
-func (s *Server) writeZipStream(ctx context.Context, w io.Writer, images []struct {
-	Src      string
-	ZipName  string
-	Kind     string
-	Category string
-	ItemName string
-}, manifest []map[string]any) error {
-	zw := zip.NewWriter(w)
-	defer zw.Close()
-
-	for _, it := range images {
-		fw, err := zw.Create(it.ZipName)
-		if err != nil {
-			fmt.Printf("zip create failed for %s: %v\n", it.ZipName, err)
-			continue
-		}
-		if err := fetchToWriter(ctx, it.Src, fw); err != nil {
-			fmt.Printf("fetch failed for %s -> %s: %v\n", it.Src, it.ZipName, err)
-			continue
-		}
+	if _, err := fm.Write(mbytes); err != nil {
+		return err
 	}
+	return zw.Close()
+}
 
-	if manifest != nil {
-		mbytes, _ := json.MarshalIndent(manifest, "", "  ")
-		fm, err := zw.Create("manifest.json")
-		if err == nil {
-			_, _ = fm.Write(mbytes)
-		}
-	}
+// exportMediaRequest is the body of POST /api/admin/export_media/:id and
+// /api/admin/export_jobs/:id.
+type exportMediaRequest struct {
+	Target    string `json:"target"`
+	Bucket    string `json:"bucket"`
+	KeyPrefix string `json:"keyPrefix"`
+	Public    bool   `json:"public"`
+	// Mode "delta" exports only images added or changed since
+	// PreviousManifest, or since the last export to the same target.
+	Mode             string        `json:"mode"`
+	PreviousManifest []exportImage `json:"previousManifest,omitempty"`
+}
 
-	return nil
+func (req *exportMediaRequest) toS3() bool {
+	return strings.ToLower(req.Target) == "s3" && req.Bucket != ""
 }
 
-func (s *Server) handleExportMedia(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
-	if r.Method != http.MethodPost && r.Method != http.MethodGet {
-		http.Error(w, "only GET/POST allowed", http.StatusMethodNotAllowed)
-		return
-	}
+func (req *exportMediaRequest) delta() bool {
+	return strings.ToLower(req.Mode) == "delta"
+}
 
-	id, err := getIDFromPath("/api/admin/export_media/", r.URL.Path)
-	if err != nil {
-		http.Error(w, "invalid restaurant id", http.StatusBadRequest)
-		return
+// normalize fills in the key prefix and returns the target the export's
+// manifest is stored under. ZIP uploads and object syncs to the same
+// bucket and prefix are different targets: a sync must diff against what
+// the previous sync wrote, not against an archive.
+func (req *exportMediaRequest) normalize(restaurantID int) string {
+	req.KeyPrefix = strings.TrimSpace(req.KeyPrefix)
+	if req.KeyPrefix != "" && !strings.HasSuffix(req.KeyPrefix, "/") {
+		req.KeyPrefix += "/"
 	}
-
-	role, _ := claims["role"].(string)
-	if role != "owner" {
-		http.Error(w, "forbidden - owner only", http.StatusForbidden)
-		return
+	if !req.toS3() {
+		return "zip"
 	}
-
-	var payload struct {
-		Target    string `json:"target"`
-		Bucket    string `json:"bucket"`
-		KeyPrefix string `json:"keyPrefix"`
-		Public    bool   `json:"public"`
+	if !req.delta() {
+		return fmt.Sprintf("s3zip://%s/%s", req.Bucket, req.KeyPrefix)
 	}
-	if r.Method == http.MethodPost {
-		_ = json.NewDecoder(r.Body).Decode(&payload)
+	if req.KeyPrefix == "" {
+		req.KeyPrefix = fmt.Sprintf("restaurant_%d_media/", restaurantID)
 	}
+	return fmt.Sprintf("s3sync://%s/%s", req.Bucket, req.KeyPrefix)
+}
 
-	ctx := r.Context()
+// location is the s3:// URL of the bucket and prefix the export writes to.
+func (req *exportMediaRequest) location() string {
+	return fmt.Sprintf("s3://%s/%s", req.Bucket, req.KeyPrefix)
+}
+
+// collectExportImages lists the distinct menu and gallery images of a
+// restaurant with their archive paths.
+func (s *Server) collectExportImages(ctx context.Context, id int) ([]exportImage, error) {
 	data, err := s.store.LoadRestaurantData(ctx, id)
 	if err != nil {
-		http.Error(w, "failed to load data", http.StatusInternalServerError)
-		return
+		return nil, err
 	}
 
-	type imgEntry struct {
-		Src      string
-		ZipName  string
-		Kind     string
-		Category string
-		ItemName string
-	}
 	seen := map[string]bool{}
-	var images []imgEntry
-	var manifest []map[string]any
+	var images []exportImage
 	idx := 0
 	for _, cat := range data.Menus {
 		for _, it := range cat.Items {
@@ -225,14 +223,7 @@ func (s *Server) handleExportMedia(w http.ResponseWriter, r *http.Request, claim
 			}
 			idx++
 			zn := createZipEntryName("menu", cat.Category, it.Name, src, idx)
-			images = append(images, imgEntry{Src: src, ZipName: zn, Kind: "menu", Category: cat.Category, ItemName: it.Name})
-			manifest = append(manifest, map[string]any{
-				"zip":      zn,
-				"source":   src,
-				"kind":     "menu",
-				"category": cat.Category,
-				"itemName": it.Name,
-			})
+			images = append(images, exportImage{Src: src, ZipName: zn, Kind: "menu", Category: cat.Category, ItemName: it.Name})
 			seen[src] = true
 		}
 	}
@@ -245,122 +236,168 @@ func (s *Server) handleExportMedia(w http.ResponseWriter, r *http.Request, claim
 		}
 		idx++
 		zn := createZipEntryName("gallery", "", "", g, gi+1)
-		images = append(images, imgEntry{Src: g, ZipName: zn, Kind: "gallery"})
-		manifest = append(manifest, map[string]any{
-			"zip":    zn,
-			"source": g,
-			"kind":   "gallery",
-		})
+		images = append(images, exportImage{Src: g, ZipName: zn, Kind: "gallery"})
 		seen[g] = true
 	}
+	return images, nil
+}
 
+// loadExportBaseline returns the baseline for a delta request, or nil for a
+// full export.
+func (s *Server) loadExportBaseline(ctx context.Context, id int, req *exportMediaRequest, target string) (*exportBaseline, error) {
+	if !req.delta() {
+		return nil, nil
+	}
+	prev := req.PreviousManifest
+	if prev == nil {
+		var err error
+		prev, err = loadExportManifest(ctx, s.store.DB, id, target)
+		if err != nil {
+			return nil, err
+		}
+	}
+	return newExportBaseline(prev), nil
+}
+
+// uploadExportArchive uploads a ZIP to bucket/key and returns a presigned
+// download URL, or the s3:// location if presigning fails.
+func (s *Server) uploadExportArchive(ctx context.Context, req *exportMediaRequest, key string, body io.Reader) (string, error) {
+	s3client, err := s.media.S3()
+	if err != nil {
+		return "", fmt.Errorf("aws config: %w", err)
+	}
+	input := &s3.PutObjectInput{
+		Bucket: aws.String(req.Bucket),
+		Key:    aws.String(key),
+		Body:   body,
+	}
+	if req.Public {
+		input.ACL = types.ObjectCannedACLPublicRead
+	}
+	if _, err := manager.NewUploader(s3client).Upload(ctx, input); err != nil {
+		return "", err
+	}
+
+	presigner := s3.NewPresignClient(s3client)
+	presignCtx, cancel := context.WithTimeout(ctx, 15*time.Second)
+	defer cancel()
+	presignRes, err := presigner.PresignGetObject(presignCtx, &s3.GetObjectInput{
+		Bucket: aws.String(req.Bucket),
+		Key:    aws.String(key),
+	}, s3.WithPresignExpires(24*time.Hour))
+	if err != nil {
+		return fmt.Sprintf("s3://%s/%s", req.Bucket, key), nil
+	}
+	return presignRes.URL, nil
+}
+
+func exportArchiveName(id int) string {
+	return fmt.Sprintf("restaurant_%d_media_%s.zip", id, time.Now().Format("20060102T150405"))
+}
+
+// handleExportMedia runs an export within the request. Large galleries
+// should use export jobs (handleExportJobs) instead.
+func (s *Server) handleExportMedia(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
+	if r.Method != http.MethodPost && r.Method != http.MethodGet {
+		http.Error(w, "only GET/POST allowed", http.StatusMethodNotAllowed)
+		return
+	}
+
+	id, err := getIDFromPath("/api/admin/export_media/", r.URL.Path)
+	if err != nil {
+		http.Error(w, "invalid restaurant id", http.StatusBadRequest)
+		return
+	}
+
+	role, _ := claims["role"].(string)
+	if role != "owner" {
+		http.Error(w, "forbidden - owner only", http.StatusForbidden)
+		return
+	}
+
+	var payload exportMediaRequest
+	if r.Method == http.MethodPost {
+		_ = json.NewDecoder(r.Body).Decode(&payload)
+	}
+	if payload.Mode == "" {
+		payload.Mode = r.URL.Query().Get("mode")
+	}
+	target := payload.normalize(id)
+
+	ctx := r.Context()
+	images, err := s.collectExportImages(ctx, id)
+	if err != nil {
+		http.Error(w, "failed to load data", http.StatusInternalServerError)
+		return
+	}
 	if len(images) == 0 {
 		http.Error(w, "no images found", http.StatusNotFound)
 		return
 	}
 
-	if strings.ToLower(payload.Target) == "s3" && payload.Bucket != "" {
-		keyPrefix := strings.TrimSpace(payload.KeyPrefix)
-		if keyPrefix != "" && !strings.HasSuffix(keyPrefix, "/") {
-			keyPrefix += "/"
-		}
-		key := fmt.Sprintf("%srestaurant_%d_media_%s.zip", keyPrefix, id, time.Now().Format("20060102T150405"))
+	baseline, err := s.loadExportBaseline(ctx, id, &payload, target)
+	if err != nil {
+		http.Error(w, "failed to load previous manifest", http.StatusInternalServerError)
+		return
+	}
 
-		awsCfg, err := config.LoadDefaultConfig(ctx)
+	if payload.toS3() && payload.delta() {
+		s3client, err := s.media.S3()
 		if err != nil {
 			http.Error(w, "failed to load AWS config", http.StatusInternalServerError)
 			return
 		}
-		s3client := s3.NewFromConfig(awsCfg)
-		uploader := manager.NewUploader(s3client)
+		manifest, err := s.uploadMediaDelta(ctx, s3client, payload.Bucket, payload.KeyPrefix, images, baseline, payload.Public, nil)
+		if err != nil {
+			http.Error(w, "failed to sync to S3: "+err.Error(), http.StatusInternalServerError)
+			return
+		}
+		if err := saveExportManifest(ctx, s.store.DB, id, target, manifest); err != nil {
+			fmt.Println("save export manifest:", err)
+		}
+		counts := countStatuses(manifest)
+		s.audit.Log(id, claims["email"].(string), "export_media_s3_delta", map[string]any{"bucket": payload.Bucket, "prefix": payload.KeyPrefix, "counts": counts}, r.RemoteAddr)
+		writeJSON(w, map[string]any{"ok": true, "s3": payload.location(), "manifest": payload.location() + "manifest.json", "counts": counts})
+		return
+	}
 
+	if payload.toS3() {
+		key := payload.KeyPrefix + exportArchiveName(id)
 		pr, pw := io.Pipe()
+		defer pr.Close()
 		go func() {
-			defer pw.Close()
-			var imgs []struct {
-				Src      string
-				ZipName  string
-				Kind     string
-				Category string
-				ItemName string
-			}
-			for _, it := range images {
-				imgs = append(imgs, struct {
-					Src      string
-					ZipName  string
-					Kind     string
-					Category string
-					ItemName string
-				}{Src: it.Src, ZipName: it.ZipName, Kind: it.Kind, Category: it.Category, ItemName: it.ItemName})
-			}
-			if err := s.writeZipStream(ctx, pw, imgs, manifest); err != nil {
+			if err := s.writeZipStream(ctx, pw, images, baseline, nil); err != nil {
 				fmt.Println("error writing zip to pipe:", err)
 				_ = pw.CloseWithError(err)
+				return
 			}
+			pw.Close()
 		}()
 
-		putInput := &s3.PutObjectInput{
-			Bucket: &payload.Bucket,
-			Key:    &key,
-		}
-		if payload.Public {
-			acl := "public-read"
-			putInput.ACL = s3.ObjectCannedACL(acl)
-		}
-
-		_, err = uploader.Upload(ctx, &s3.PutObjectInput{
-			Bucket: putInput.Bucket,
-			Key:    putInput.Key,
-			Body:   pr,
-			ACL:    putInput.ACL,
-		})
+		url, err := s.uploadExportArchive(ctx, &payload, key, pr)
 		if err != nil {
 			http.Error(w, "failed to upload to S3: "+err.Error(), http.StatusInternalServerError)
 			return
 		}
-
-		presigner := s3.NewPresignClient(s3client)
-		getInput := &s3.GetObjectInput{
-			Bucket: &payload.Bucket,
-			Key:    &key,
+		if err := saveExportManifest(ctx, s.store.DB, id, target, exportManifest(images, baseline)); err != nil {
+			fmt.Println("save export manifest:", err)
 		}
-		presignCtx, cancel := context.WithTimeout(ctx, 15*time.Second)
-		defer cancel()
-		presignRes, err := presigner.PresignGetObject(presignCtx, getInput, s3.WithPresignExpires(24*time.Hour))
-		if err != nil {
-			_ = insertAuditLog(ctx, s.store.DB, id, claims["email"].(string), "export_media_s3", map[string]any{"bucket": payload.Bucket, "key": key, "count": len(images)}, r.RemoteAddr)
-			writeJSON(w, map[string]any{"ok": true, "s3": fmt.Sprintf("s3://%s/%s", payload.Bucket, key)})
+		s.audit.Log(id, claims["email"].(string), "export_media_s3", map[string]any{"bucket": payload.Bucket, "key": key, "count": len(images)}, r.RemoteAddr)
+		if strings.HasPrefix(url, "s3://") {
+			writeJSON(w, map[string]any{"ok": true, "s3": url})
 			return
 		}
-
-		_ = insertAuditLog(ctx, s.store.DB, id, claims["email"].(string), "export_media_s3", map[string]any{"bucket": payload.Bucket, "key": key, "count": len(images)}, r.RemoteAddr)
-		writeJSON(w, map[string]any{"ok": true, "url": presignRes.URL})
+		writeJSON(w, map[string]any{"ok": true, "url": url})
 		return
 	}
 
-	filename := fmt.Sprintf("restaurant_%d_media_%s.zip", id, time.Now().Format("20060102T150405"))
 	w.Header().Set("Content-Type", "application/zip")
-	w.Header().Set("Content-Disposition", fmt.Sprintf("attachment; filename=\"%s\"", filename))
-
-	var imgs []struct {
-		Src      string
-		ZipName  string
-		Kind     string
-		Category string
-		ItemName string
-	}
-	for _, it := range images {
-		imgs = append(imgs, struct {
-			Src      string
-			ZipName  string
-			Kind     string
-			Category string
-			ItemName string
-		}{Src: it.Src, ZipName: it.ZipName, Kind: it.Kind, Category: it.Category, ItemName: it.ItemName})
-	}
-
-	if err := s.writeZipStream(ctx, w, imgs, manifest); err != nil {
+	w.Header().Set("Content-Disposition", fmt.Sprintf("attachment; filename=\"%s\"", exportArchiveName(id)))
+
+	if err := s.writeZipStream(ctx, w, images, baseline, nil); err != nil {
 		fmt.Println("zip stream error:", err)
+	} else if err := saveExportManifest(ctx, s.store.DB, id, target, exportManifest(images, baseline)); err != nil {
+		fmt.Println("save export manifest:", err)
 	}
-	_ = insertAuditLog(ctx, s.store.DB, id, claims["email"].(string), "export_media_download", map[string]any{"count": len(images)}, r.RemoteAddr)
+	s.audit.Log(id, claims["email"].(string), "export_media_download", map[string]any{"count": len(images)}, r.RemoteAddr)
 }
@@ -0,0 +1,63 @@
+package main
+
+import (
+	"archive/zip"
+	"bytes"
+	"context"
+	"encoding/json"
+	"io"
+	"net/http"
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+// A source that fails to download is left out of the archive and reported
+// in the manifest; it must not take the export (or the process) down.
+func TestWriteZipStreamSkipsFailedSource(t *testing.T) {
+	root := t.TempDir()
+	t.Setenv("IMG_ROOT", root)
+	if err := os.WriteFile(filepath.Join(root, "ok.jpg"), []byte("jpeg bytes"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+
+	s := &Server{media: &mediaFetcher{http: http.DefaultClient, concurrency: 2, spillBytes: 1 << 10}}
+	images := []exportImage{
+		{Src: "/missing.jpg", ZipName: "menus/a/missing.jpg", Kind: "menu"},
+		{Src: "/ok.jpg", ZipName: "menus/a/ok.jpg", Kind: "menu"},
+		{Src: "/missing-too.jpg", ZipName: "menus/a/missing-too.jpg", Kind: "menu"},
+	}
+	var out bytes.Buffer
+	if err := s.writeZipStream(context.Background(), &out, images, nil, nil); err != nil {
+		t.Fatalf("writeZipStream: %v", err)
+	}
+
+	zr, err := zip.NewReader(bytes.NewReader(out.Bytes()), int64(out.Len()))
+	if err != nil {
+		t.Fatalf("read zip: %v", err)
+	}
+	entries := map[string]*zip.File{}
+	for _, f := range zr.File {
+		entries[f.Name] = f
+	}
+	if len(entries) != 2 || entries["menus/a/ok.jpg"] == nil || entries["manifest.json"] == nil {
+		t.Fatalf("unexpected entries: %v", entries)
+	}
+
+	rc, err := entries["manifest.json"].Open()
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer rc.Close()
+	body, _ := io.ReadAll(rc)
+	var manifest []exportImage
+	if err := json.Unmarshal(body, &manifest); err != nil {
+		t.Fatalf("manifest: %v", err)
+	}
+	if len(manifest) != 3 || manifest[0].Error == "" || manifest[1].Error != "" || manifest[2].Error == "" {
+		t.Fatalf("unexpected manifest: %+v", manifest)
+	}
+	if manifest[1].Bytes != int64(len("jpeg bytes")) {
+		t.Fatalf("ok.jpg bytes = %d", manifest[1].Bytes)
+	}
+}
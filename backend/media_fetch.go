@@ -0,0 +1,311 @@
+package main
+
+import (
+	"bytes"
+	"context"
+	"crypto/sha256"
+	"encoding/hex"
+	"errors"
+	"fmt"
+	"hash"
+	"io"
+	"net/http"
+	"os"
+	"path/filepath"
+	"strings"
+	"sync"
+	"time"
+
+	"github.com/aws/aws-sdk-go-v2/service/s3"
+)
+
+// mediaFetcher downloads export sources with HTTP and S3 clients that are
+// shared by every export, so connections and AWS credentials are reused.
+type mediaFetcher struct {
+	http        *http.Client
+	concurrency int
+	spillBytes  int
+	spillDir    string
+	cache       *mediaCache
+
+	s3Once   sync.Once
+	s3Client *s3.Client
+	s3Err    error
+}
+
+// newMediaFetcherFromEnv reads EXPORT_FETCH_CONCURRENCY (default 8),
+// EXPORT_SPILL_BYTES (in-memory buffer per prefetched image before it
+// spills to a temp file, default 4MB) and EXPORT_SPILL_DIR.
+func newMediaFetcherFromEnv() *mediaFetcher {
+	concurrency := envInt("EXPORT_FETCH_CONCURRENCY", 8)
+	transport := http.DefaultTransport.(*http.Transport).Clone()
+	transport.MaxIdleConnsPerHost = concurrency * 2
+	return &mediaFetcher{
+		http:        &http.Client{Timeout: 20 * time.Second, Transport: transport},
+		concurrency: concurrency,
+		spillBytes:  envInt("EXPORT_SPILL_BYTES", 4<<20),
+		spillDir:    os.Getenv("EXPORT_SPILL_DIR"),
+		cache:       newMediaCacheFromEnv(),
+	}
+}
+
+// S3 returns the shared S3 client, creating it on first use.
+func (f *mediaFetcher) S3() (*s3.Client, error) {
+	f.s3Once.Do(func() {
+		f.s3Client, f.s3Err = newS3Client(context.Background())
+	})
+	return f.s3Client, f.s3Err
+}
+
+// Fetch copies the source (s3://bucket/key, http(s) URL or a path under
+// IMG_ROOT) into writer.
+func (f *mediaFetcher) Fetch(ctx context.Context, src string, writer io.Writer) error {
+	src = strings.TrimSpace(src)
+	if src == "" {
+		return errors.New("empty src")
+	}
+
+	if strings.HasPrefix(src, "s3://") {
+		trim := strings.TrimPrefix(src, "s3://")
+		parts := strings.SplitN(trim, "/", 2)
+		if len(parts) != 2 {
+			return fmt.Errorf("invalid s3 url: %s", src)
+		}
+		bucket := parts[0]
+		key := parts[1]
+
+		client, err := f.S3()
+		if err != nil {
+			return fmt.Errorf("aws config: %w", err)
+		}
+		out, err := client.GetObject(ctx, &s3.GetObjectInput{
+			Bucket: &bucket,
+			Key:    &key,
+		})
+		if err != nil {
+			return fmt.Errorf("s3 get object: %w", err)
+		}
+		defer out.Body.Close()
+		_, err = io.Copy(writer, out.Body)
+		return err
+	}
+
+	if strings.HasPrefix(src, "http://") || strings.HasPrefix(src, "https://") {
+		req, err := http.NewRequestWithContext(ctx, "GET", src, nil)
+		if err != nil {
+			return err
+		}
+		resp, err := f.http.Do(req)
+		if err != nil {
+			return err
+		}
+		defer resp.Body.Close()
+		if resp.StatusCode >= 400 {
+			return fmt.Errorf("http status %d", resp.StatusCode)
+		}
+		_, err = io.Copy(writer, resp.Body)
+		return err
+	}
+
+	file, err := os.Open(localMediaPath(src))
+	if err != nil {
+		return fmt.Errorf("open local: %w", err)
+	}
+	defer file.Close()
+	_, err = io.Copy(writer, file)
+	return err
+}
+
+// localMediaPath maps a site-relative image path onto IMG_ROOT.
+func localMediaPath(src string) string {
+	imgRoot := os.Getenv("IMG_ROOT")
+	if imgRoot == "" {
+		imgRoot = "./frontend/public"
+	}
+	return filepath.Clean(filepath.Join(imgRoot, strings.TrimPrefix(src, "/")))
+}
+
+// fetchBuffered downloads src for Prefetch. Remote sources go through the
+// media cache when one is configured.
+func (f *mediaFetcher) fetchBuffered(ctx context.Context, src string) (*spillBuffer, error) {
+	src = strings.TrimSpace(src)
+	if f.cache != nil && (strings.HasPrefix(src, "s3://") || strings.HasPrefix(src, "http://") || strings.HasPrefix(src, "https://")) {
+		return f.fetchCached(ctx, src)
+	}
+	buf := &spillBuffer{dir: f.spillDir, limit: f.spillBytes}
+	if err := f.Fetch(ctx, src, buf); err != nil {
+		buf.Close()
+		return nil, err
+	}
+	return buf, nil
+}
+
+// spillBuffer holds a prefetched image in memory up to limit bytes and
+// moves it to a temp file beyond that. With keep set, file is a media cache
+// blob that is read in place and not removed on Close.
+type spillBuffer struct {
+	mem   bytes.Buffer
+	file  *os.File
+	keep  bool
+	dir   string
+	limit int
+	size  int64
+	hash  hash.Hash
+	sum   string
+}
+
+func (b *spillBuffer) Write(p []byte) (int, error) {
+	if b.file == nil && b.mem.Len()+len(p) > b.limit {
+		f, err := os.CreateTemp(b.dir, "export-media-*")
+		if err != nil {
+			return 0, err
+		}
+		b.file = f
+		if _, err := f.Write(b.mem.Bytes()); err != nil {
+			return 0, err
+		}
+		b.mem = bytes.Buffer{}
+	}
+	var n int
+	var err error
+	if b.file != nil {
+		n, err = b.file.Write(p)
+	} else {
+		n, err = b.mem.Write(p)
+	}
+	if b.hash == nil {
+		b.hash = sha256.New()
+	}
+	b.hash.Write(p[:n])
+	b.size += int64(n)
+	return n, err
+}
+
+// SHA256 returns the hex digest of the buffered content.
+func (b *spillBuffer) SHA256() string {
+	if b.sum == "" {
+		if b.hash == nil {
+			b.hash = sha256.New()
+		}
+		b.sum = hex.EncodeToString(b.hash.Sum(nil))
+	}
+	return b.sum
+}
+
+// Reader returns the buffered content from the start.
+func (b *spillBuffer) Reader() (io.ReadSeeker, error) {
+	if b.file == nil {
+		return bytes.NewReader(b.mem.Bytes()), nil
+	}
+	if _, err := b.file.Seek(0, io.SeekStart); err != nil {
+		return nil, err
+	}
+	return b.file, nil
+}
+
+// Close releases the buffer and removes its temp file, if any.
+func (b *spillBuffer) Close() error {
+	b.mem = bytes.Buffer{}
+	if b.file == nil {
+		return nil
+	}
+	name := b.file.Name()
+	b.file.Close()
+	b.file = nil
+	if b.keep {
+		return nil
+	}
+	return os.Remove(name)
+}
+
+// prefetchResult is one downloaded source, ready to be copied into the
+// archive.
+type prefetchResult struct {
+	buf      *spillBuffer
+	err      error
+	duration time.Duration
+}
+
+// close releases the buffer of a successful fetch; failed fetches have none.
+func (r prefetchResult) close() {
+	if r.buf != nil {
+		r.buf.Close()
+	}
+}
+
+// Prefetch downloads the sources with a bounded worker pool and calls
+// consume for each one in the original order as soon as it is available.
+// At most 2*concurrency images are buffered ahead of the consumer. consume
+// must not retain the buffer; it is closed once consume returns.
+func (f *mediaFetcher) Prefetch(ctx context.Context, sources []string, consume func(i int, res prefetchResult) error) error {
+	ctx, cancel := context.WithCancel(ctx)
+	defer cancel()
+
+	results := make([]chan prefetchResult, len(sources))
+	for i := range results {
+		results[i] = make(chan prefetchResult, 1)
+	}
+	window := make(chan struct{}, 2*f.concurrency)
+	jobs := make(chan int)
+
+	var wg sync.WaitGroup
+	for w := 0; w < f.concurrency; w++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range jobs {
+				start := time.Now()
+				buf, err := f.fetchBuffered(ctx, sources[i])
+				results[i] <- prefetchResult{buf: buf, err: err, duration: time.Since(start)}
+			}
+		}()
+	}
+	go func() {
+		defer close(jobs)
+		for i := range sources {
+			select {
+			case window <- struct{}{}:
+			case <-ctx.Done():
+				return
+			}
+			select {
+			case jobs <- i:
+			case <-ctx.Done():
+				return
+			}
+		}
+	}()
+
+	var err error
+	consumed := 0
+	for ; consumed < len(sources); consumed++ {
+		var res prefetchResult
+		select {
+		case res = <-results[consumed]:
+		case <-ctx.Done():
+			err = ctx.Err()
+		}
+		if err != nil {
+			break
+		}
+		err = consume(consumed, res)
+		res.close()
+		<-window
+		if err != nil {
+			consumed++
+			break
+		}
+	}
+
+	// Stop outstanding downloads and drop whatever was fetched ahead.
+	cancel()
+	wg.Wait()
+	for i := consumed; i < len(sources); i++ {
+		select {
+		case res := <-results[i]:
+			res.close()
+		default:
+		}
+	}
+	return err
+}
@@ -0,0 +1,70 @@
+package main
+
+import (
+	"archive/zip"
+	"compress/flate"
+	"io"
+	"net/http"
+	"os"
+	"path"
+	"strconv"
+	"strings"
+	"time"
+)
+
+// zipDeflateLevel is the flate level used for entries that are deflated
+// (manifest.json and other text). EXPORT_ZIP_LEVEL, default 6.
+var zipDeflateLevel = func() int {
+	if v := os.Getenv("EXPORT_ZIP_LEVEL"); v != "" {
+		if n, err := strconv.Atoi(v); err == nil && n >= flate.HuffmanOnly && n <= flate.BestCompression {
+			return n
+		}
+	}
+	return 6
+}()
+
+// storedExts are formats that are already compressed; deflating them costs
+// CPU and saves next to nothing.
+var storedExts = map[string]bool{
+	".jpg": true, ".jpeg": true, ".png": true, ".gif": true, ".webp": true,
+	".avif": true, ".heic": true, ".mp4": true, ".webm": true, ".zip": true, ".gz": true,
+}
+
+// newExportZipWriter returns a zip.Writer whose deflated entries use
+// zipDeflateLevel.
+func newExportZipWriter(w io.Writer) *zip.Writer {
+	zw := zip.NewWriter(w)
+	zw.RegisterCompressor(zip.Deflate, func(out io.Writer) (io.WriteCloser, error) {
+		return flate.NewWriter(out, zipDeflateLevel)
+	})
+	return zw
+}
+
+// zipEntryHeader picks the compression method for an entry: Store for
+// compressed media, recognised by extension or else by sniffing the start
+// of body (which is rewound; body may be nil), and Deflate otherwise.
+func zipEntryHeader(name string, body io.ReadSeeker) (*zip.FileHeader, error) {
+	fh := &zip.FileHeader{Name: name, Method: zip.Deflate, Modified: time.Now()}
+	if storedExts[strings.ToLower(path.Ext(name))] {
+		fh.Method = zip.Store
+		return fh, nil
+	}
+	if body == nil {
+		return fh, nil
+	}
+	head := make([]byte, 512)
+	n, err := io.ReadFull(body, head)
+	if err != nil && err != io.ErrUnexpectedEOF && err != io.EOF {
+		return nil, err
+	}
+	if _, err := body.Seek(0, io.SeekStart); err != nil {
+		return nil, err
+	}
+	ct := http.DetectContentType(head[:n])
+	if strings.HasPrefix(ct, "image/") && ct != "image/bmp" && ct != "image/x-icon" ||
+		strings.HasPrefix(ct, "video/") || strings.HasPrefix(ct, "audio/") ||
+		ct == "application/zip" || ct == "application/x-gzip" || ct == "application/pdf" {
+		fh.Method = zip.Store
+	}
+	return fh, nil
+}
@@ -0,0 +1,341 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"encoding/json"
+	"net/http"
+	"strings"
+
+	"github.com/golang-jwt/jwt/v4"
+	"github.com/lib/pq"
+)
+
+// Menu items live one row each in menu_items (see
+// normalized_menu_items_migration.sql). menus.items_json is kept as the
+// read projection of a category, rebuilt from its rows whenever they
+// change, so the public document is still assembled without touching
+// menu_items. Every change bumps restaurants.menu_version.
+
+// menuItemJSON renders a menu_items row aliased i in the MenuItem shape.
+const menuItemJSON = `jsonb_build_object('id', i.id, 'name', i.name, 'desc', i.description, 'price', i.price, 'img', i.img, 'available', i.available)`
+
+// rebuildMenusSQL refreshes items_json of the categories in $2 and bumps
+// the restaurant's menu version, returning it.
+const rebuildMenusSQL = `
+WITH rebuilt AS (
+  UPDATE menus m SET items_json = (
+    SELECT COALESCE(jsonb_agg(` + menuItemJSON + ` ORDER BY i.position, i.id), '[]'::jsonb)
+    FROM menu_items i WHERE i.restaurant_id = m.restaurant_id AND i.category = m.category)
+  WHERE m.restaurant_id = $1 AND m.category = ANY($2)
+)
+UPDATE restaurants SET menu_version = menu_version + 1 WHERE id = $1 RETURNING menu_version`
+
+// replaceMenuSQL makes the restaurant's menu exactly the categories in $2
+// (in order) holding the items in the remaining arrays, in one statement:
+// items whose id belongs to the restaurant are updated in place (moving
+// category if needed), the rest are inserted with new ids, and items and
+// categories not submitted are deleted. items_json is built from the
+// written rows and the new menu version is returned.
+const replaceMenuSQL = `
+WITH cats AS (
+  SELECT c.category, c.ord FROM unnest($2::text[]) WITH ORDINALITY AS c(category, ord)
+), input AS (
+  SELECT NULLIF(t.id, 0) AS id, t.category, t.name, t.description, t.price, t.img, t.available,
+         (row_number() OVER (PARTITION BY t.category ORDER BY t.ord))::int AS position
+  FROM unnest($3::bigint[], $4::text[], $5::text[], $6::text[], $7::numeric[], $8::text[], $9::boolean[])
+    WITH ORDINALITY AS t(id, category, name, description, price, img, available, ord)
+), upd AS (
+  UPDATE menu_items i SET category = n.category, position = n.position, name = n.name, description = n.description,
+    price = n.price, img = n.img, available = n.available, updated_at = now()
+  FROM input n
+  WHERE i.id = n.id AND i.restaurant_id = $1
+  RETURNING i.id, i.category, i.position, i.name, i.description, i.price, i.img, i.available
+), ins AS (
+  INSERT INTO menu_items (restaurant_id, category, position, name, description, price, img, available)
+  SELECT $1, n.category, n.position, n.name, n.description, n.price, n.img, n.available
+  FROM input n
+  WHERE n.id IS NULL OR n.id NOT IN (SELECT id FROM upd)
+  RETURNING id, category, position, name, description, price, img, available
+), del_items AS (
+  DELETE FROM menu_items i
+  WHERE i.restaurant_id = $1 AND NOT EXISTS (SELECT 1 FROM input n WHERE n.id = i.id)
+), del_cats AS (
+  DELETE FROM menus m WHERE m.restaurant_id = $1 AND m.category <> ALL($2::text[])
+), written AS (
+  SELECT * FROM upd UNION ALL SELECT * FROM ins
+), upsert AS (
+  INSERT INTO menus (restaurant_id, category, items_json)
+  SELECT $1, c.category, COALESCE((
+    SELECT jsonb_agg(` + menuItemJSON + ` ORDER BY i.position, i.id) FROM written i WHERE i.category = c.category), '[]'::jsonb)
+  FROM cats c ORDER BY c.ord
+  ON CONFLICT (restaurant_id, category) DO UPDATE SET items_json = EXCLUDED.items_json
+)
+UPDATE restaurants SET menu_version = menu_version + 1 WHERE id = $1 RETURNING menu_version`
+
+// patchMenuItemsSQL applies the fields present in each patch ($2, a JSON
+// array) and returns the categories of the rows that actually changed.
+const patchMenuItemsSQL = `
+UPDATE menu_items i SET
+  name = COALESCE(p.name, i.name),
+  description = COALESCE(p."desc", i.description),
+  price = COALESCE(p.price, i.price),
+  img = COALESCE(p.img, i.img),
+  available = COALESCE(p.available, i.available),
+  updated_at = now()
+FROM jsonb_to_recordset($2::jsonb) AS p(id bigint, name text, "desc" text, price numeric, img text, available boolean)
+WHERE i.id = p.id AND i.restaurant_id = $1
+  AND (i.name, i.description, i.price, i.img, i.available) IS DISTINCT FROM
+      (COALESCE(p.name, i.name), COALESCE(p."desc", i.description), COALESCE(p.price, i.price), COALESCE(p.img, i.img), COALESCE(p.available, i.available))
+RETURNING i.category`
+
+// MenuItemPatch changes the given fields of one menu item; nil fields are
+// left alone.
+type MenuItemPatch struct {
+	ID        int64    `json:"id"`
+	Name      *string  `json:"name,omitempty"`
+	Desc      *string  `json:"desc,omitempty"`
+	Price     *float64 `json:"price,omitempty"`
+	Img       *string  `json:"img,omitempty"`
+	Available *bool    `json:"available,omitempty"`
+}
+
+// mergeMenuItemPatches folds later patches for the same item into earlier ones.
+func mergeMenuItemPatches(patches []MenuItemPatch) []MenuItemPatch {
+	byID := map[int64]int{}
+	out := make([]MenuItemPatch, 0, len(patches))
+	for _, p := range patches {
+		i, ok := byID[p.ID]
+		if !ok {
+			byID[p.ID] = len(out)
+			out = append(out, p)
+			continue
+		}
+		if p.Name != nil {
+			out[i].Name = p.Name
+		}
+		if p.Desc != nil {
+			out[i].Desc = p.Desc
+		}
+		if p.Price != nil {
+			out[i].Price = p.Price
+		}
+		if p.Img != nil {
+			out[i].Img = p.Img
+		}
+		if p.Available != nil {
+			out[i].Available = p.Available
+		}
+	}
+	return out
+}
+
+// MenuVersion returns the restaurant's current menu version.
+func (s *Store) MenuVersion(ctx context.Context, restaurantID int) (int64, error) {
+	var v int64
+	err := s.DB.QueryRowContext(ctx, "SELECT menu_version FROM restaurants WHERE id=$1", restaurantID).Scan(&v)
+	return v, err
+}
+
+// ReplaceMenu makes menus the restaurant's whole menu with one statement,
+// however many categories it has. Categories submitted twice are merged,
+// and an item id submitted twice is kept only for its first occurrence.
+// It returns the new menu version.
+func (s *Store) ReplaceMenu(ctx context.Context, restaurantID int, menus []MenuCategory) (int64, error) {
+	// Non-nil slices: pq encodes nil as NULL, and "<> ALL(NULL)" would
+	// keep every old category when the menu is emptied.
+	categories := []string{}
+	itemsByCategory := map[string][]MenuItem{}
+	n := 0
+	for _, cat := range menus {
+		items, ok := itemsByCategory[cat.Category]
+		if !ok {
+			categories = append(categories, cat.Category)
+			items = []MenuItem{}
+		}
+		itemsByCategory[cat.Category] = append(items, cat.Items...)
+		n += len(cat.Items)
+	}
+
+	ids := make([]int64, 0, n)
+	cats, names, descs, imgs := make([]string, 0, n), make([]string, 0, n), make([]string, 0, n), make([]string, 0, n)
+	prices := make([]float64, 0, n)
+	avail := make([]bool, 0, n)
+	seen := map[int64]bool{}
+	for _, category := range categories {
+		for _, it := range itemsByCategory[category] {
+			id := it.ID
+			if seen[id] {
+				id = 0
+			}
+			seen[id] = true
+			ids = append(ids, id)
+			cats = append(cats, category)
+			names = append(names, it.Name)
+			descs = append(descs, it.Desc)
+			prices = append(prices, it.Price)
+			imgs = append(imgs, it.Img)
+			avail = append(avail, it.Available)
+		}
+	}
+
+	var version int64
+	err := s.DB.QueryRowContext(ctx, replaceMenuSQL, restaurantID, pq.Array(categories),
+		pq.Array(ids), pq.Array(cats), pq.Array(names), pq.Array(descs), pq.Array(prices), pq.Array(imgs), pq.Array(avail)).Scan(&version)
+	return version, err
+}
+
+// PatchMenuItems applies patches to items of the restaurant, writing only
+// rows whose values change. It returns how many items changed and the
+// menu version, which is bumped only if something did.
+func (s *Store) PatchMenuItems(ctx context.Context, restaurantID int, patches []MenuItemPatch) (int, int64, error) {
+	body, err := json.Marshal(mergeMenuItemPatches(patches))
+	if err != nil {
+		return 0, 0, err
+	}
+	tx, err := s.DB.BeginTx(ctx, nil)
+	if err != nil {
+		return 0, 0, err
+	}
+	defer tx.Rollback()
+
+	rows, err := tx.QueryContext(ctx, patchMenuItemsSQL, restaurantID, string(body))
+	if err != nil {
+		return 0, 0, err
+	}
+	changed := 0
+	seen := map[string]bool{}
+	var categories []string
+	for rows.Next() {
+		var cat string
+		if err := rows.Scan(&cat); err != nil {
+			rows.Close()
+			return 0, 0, err
+		}
+		changed++
+		if !seen[cat] {
+			seen[cat] = true
+			categories = append(categories, cat)
+		}
+	}
+	rows.Close()
+	if err := rows.Err(); err != nil {
+		return 0, 0, err
+	}
+
+	var version int64
+	if changed == 0 {
+		err = tx.QueryRowContext(ctx, "SELECT menu_version FROM restaurants WHERE id=$1", restaurantID).Scan(&version)
+	} else {
+		err = tx.QueryRowContext(ctx, rebuildMenusSQL, restaurantID, pq.Array(categories)).Scan(&version)
+	}
+	if err != nil {
+		return 0, 0, err
+	}
+	return changed, version, tx.Commit()
+}
+
+// claimsAllowRestaurant reports whether a token may change restaurant id's
+// menu: tokens scoped to another restaurant may not.
+func claimsAllowRestaurant(claims jwt.MapClaims, id int) bool {
+	v, ok := claims["restaurantId"].(float64)
+	return !ok || int(v) == 0 || int(v) == id
+}
+
+// replaceMenu serves POST /api/menus/:id (behind requireAuth), replacing
+// the whole menu with the submitted categories.
+func (s *Server) replaceMenu(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims, id int) {
+	if !claimsAllowRestaurant(claims, id) {
+		http.Error(w, "token restaurant mismatch", http.StatusForbidden)
+		return
+	}
+	var menus []MenuCategory
+	if err := json.NewDecoder(r.Body).Decode(&menus); err != nil {
+		http.Error(w, "invalid payload", http.StatusBadRequest)
+		return
+	}
+
+	version, err := s.store.ReplaceMenu(r.Context(), id, menus)
+	if err != nil {
+		http.Error(w, "failed to update menu", http.StatusInternalServerError)
+		return
+	}
+
+	s.cache.Invalidate(id)
+	email, _ := claims["email"].(string)
+	s.audit.Log(id, email, "menu_replaced", map[string]any{"categories": len(menus), "version": version}, r.RemoteAddr)
+	writeJSON(w, map[string]interface{}{"ok": true, "version": version})
+}
+
+// handleMenuItems serves PATCH /api/admin/menu_items/:id, updating single
+// items or toggling availability in bulk:
+//
+//	{"items": [{"id": 12, "price": 9.5}, {"id": 13, "available": false}]}
+//	{"ids": [12, 13, 14], "available": false}
+//
+// Only changed rows are written. The response carries the number of items
+// changed and the menu version; the public cache is dropped only when the
+// version moved. GET returns the current version.
+func (s *Server) handleMenuItems(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
+	id, err := getIDFromPath("", strings.Trim(strings.TrimPrefix(r.URL.Path, "/api/admin/menu_items/"), "/"))
+	if err != nil {
+		http.Error(w, "invalid restaurant id", http.StatusBadRequest)
+		return
+	}
+	if !claimsAllowRestaurant(claims, id) {
+		http.Error(w, "token restaurant mismatch", http.StatusForbidden)
+		return
+	}
+
+	switch r.Method {
+	case http.MethodGet:
+		version, err := s.store.MenuVersion(r.Context(), id)
+		if err == sql.ErrNoRows {
+			http.Error(w, "not found", http.StatusNotFound)
+			return
+		}
+		if err != nil {
+			http.Error(w, "failed to load menu version", http.StatusInternalServerError)
+			return
+		}
+		writeJSON(w, map[string]any{"version": version})
+	case http.MethodPatch:
+		var payload struct {
+			Items     []MenuItemPatch `json:"items"`
+			IDs       []int64         `json:"ids"`
+			Available *bool           `json:"available"`
+		}
+		if err := json.NewDecoder(r.Body).Decode(&payload); err != nil {
+			http.Error(w, "invalid payload", http.StatusBadRequest)
+			return
+		}
+		patches := payload.Items
+		if len(payload.IDs) > 0 {
+			if payload.Available == nil {
+				http.Error(w, "ids requires available", http.StatusBadRequest)
+				return
+			}
+			for _, itemID := range payload.IDs {
+				patches = append(patches, MenuItemPatch{ID: itemID, Available: payload.Available})
+			}
+		}
+		if len(patches) == 0 {
+			http.Error(w, "no items to update", http.StatusBadRequest)
+			return
+		}
+
+		changed, version, err := s.store.PatchMenuItems(r.Context(), id, patches)
+		if err != nil {
+			http.Error(w, "failed to update menu items", http.StatusInternalServerError)
+			return
+		}
+		if changed > 0 {
+			s.cache.Invalidate(id)
+			email, _ := claims["email"].(string)
+			s.audit.Log(id, email, "menu_items_updated", map[string]any{"changed": changed, "version": version}, r.RemoteAddr)
+		}
+		writeJSON(w, map[string]any{"ok": true, "changed": changed, "version": version})
+	default:
+		http.Error(w, "only GET/PATCH allowed", http.StatusMethodNotAllowed)
+	}
+}
@@ -0,0 +1,130 @@
+package main
+
+import (
+	"fmt"
+	"net/http"
+	"strconv"
+	"strings"
+)
+
+// menuSearchCursor is the keyset position after the last search result,
+// for results ordered by (score DESC, id).
+type menuSearchCursor struct {
+	Score float64 `json:"s"`
+	ID    int64   `json:"i"`
+}
+
+// menuSearchResult is one menu item matching a search.
+type menuSearchResult struct {
+	ID        int64   `json:"id"`
+	Category  string  `json:"category"`
+	Name      string  `json:"name"`
+	Desc      string  `json:"desc"`
+	Price     float64 `json:"price"`
+	Img       string  `json:"img"`
+	Available bool    `json:"available"`
+	score     float64
+}
+
+var likeEscaper = strings.NewReplacer(`\`, `\\`, `%`, `\%`, `_`, `\_`)
+
+// handleMenuSearch serves GET /api/menus/:id/search over the restaurant's
+// menu_items rows, using the indexes from search_menu_items_migration.sql:
+//
+//	q         words matched against name and description (full text, with
+//	          stemming) or a substring of either (trigram)
+//	category  exact category
+//	minPrice, maxPrice  inclusive price bounds
+//	available true or false
+//
+// With q, results are ranked by relevance; otherwise they come in id
+// order. Results are keyset-paginated like the other list endpoints.
+func (s *Server) handleMenuSearch(w http.ResponseWriter, r *http.Request, id int) {
+	limit, err := parseLimit(r, 50, 200)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	var cursor *menuSearchCursor
+	if token := r.URL.Query().Get("cursor"); token != "" {
+		cursor = &menuSearchCursor{}
+		if err := decodeCursor(token, cursor); err != nil {
+			http.Error(w, err.Error(), http.StatusBadRequest)
+			return
+		}
+	}
+
+	params := r.URL.Query()
+	var q listQuery
+	q.where("i.restaurant_id = %s", id)
+	score := "0"
+	if text := strings.TrimSpace(params.Get("q")); text != "" {
+		q.args = append(q.args, text)
+		tp := "$" + strconv.Itoa(len(q.args))
+		like := "%" + likeEscaper.Replace(text) + "%"
+		q.where("(i.search @@ websearch_to_tsquery('english', "+tp+") OR i.name ILIKE %s OR i.description ILIKE %s)", like, like)
+		score = fmt.Sprintf("ts_rank(i.search, websearch_to_tsquery('english', %[1]s)) + similarity(i.name, %[1]s)", tp)
+	}
+	if category := params.Get("category"); category != "" {
+		q.where("i.category = %s", category)
+	}
+	for _, bound := range []struct{ name, cond string }{{"minPrice", "i.price >= %s"}, {"maxPrice", "i.price <= %s"}} {
+		v := params.Get(bound.name)
+		if v == "" {
+			continue
+		}
+		price, err := strconv.ParseFloat(v, 64)
+		if err != nil || price < 0 {
+			http.Error(w, bound.name+" must be a non-negative number", http.StatusBadRequest)
+			return
+		}
+		q.where(bound.cond, price)
+	}
+	if v := params.Get("available"); v != "" {
+		available, err := strconv.ParseBool(v)
+		if err != nil {
+			http.Error(w, "available must be true or false", http.StatusBadRequest)
+			return
+		}
+		q.where("i.available = %s", available)
+	}
+
+	inner := fmt.Sprintf(`SELECT i.id, i.category, i.name, i.description, i.price::float8, i.img, i.available, (%s)::float8 AS score
+		FROM menu_items i WHERE %s`, score, strings.Join(q.conds, " AND "))
+	// The keyset condition needs the computed score, so it filters the
+	// ranked rows outside the index-backed conditions.
+	outer := listQuery{conds: []string{"TRUE"}, args: q.args}
+	if cursor != nil {
+		outer.where("(score < %s OR (score = %[1]s AND id > %s))", cursor.Score, cursor.ID)
+	}
+	outer.args = append(outer.args, limit+1)
+	query := fmt.Sprintf("SELECT * FROM (%s) x WHERE %s ORDER BY score DESC, id LIMIT $%d",
+		inner, strings.Join(outer.conds, " AND "), len(outer.args))
+
+	rows, err := s.store.DB.QueryContext(r.Context(), query, outer.args...)
+	if err != nil {
+		http.Error(w, "failed to search menu", http.StatusInternalServerError)
+		return
+	}
+	defer rows.Close()
+	items := []menuSearchResult{}
+	for rows.Next() {
+		var it menuSearchResult
+		if err := rows.Scan(&it.ID, &it.Category, &it.Name, &it.Desc, &it.Price, &it.Img, &it.Available, &it.score); err != nil {
+			http.Error(w, "failed to search menu", http.StatusInternalServerError)
+			return
+		}
+		items = append(items, it)
+	}
+	if err := rows.Err(); err != nil {
+		http.Error(w, "failed to search menu", http.StatusInternalServerError)
+		return
+	}
+	out := page{Items: items}
+	if len(items) > limit {
+		last := items[limit-1]
+		out.Items = items[:limit]
+		out.NextCursor = encodeCursor(menuSearchCursor{Score: last.score, ID: last.ID})
+	}
+	writeJSON(w, out)
+}
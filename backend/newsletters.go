@@ -0,0 +1,633 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"encoding/json"
+	"fmt"
+	"net/http"
+	"strings"
+	"sync"
+	"time"
+
+	"github.com/golang-jwt/jwt/v4"
+	"github.com/lib/pq"
+)
+
+const (
+	claimNewsletterSQL = `
+UPDATE newsletters SET status='sending', locked_until=now()+$1::interval, started_at=COALESCE(started_at, now())
+WHERE id = (
+  SELECT id FROM newsletters
+  WHERE status='queued' OR (status='sending' AND (locked_until IS NULL OR locked_until < now()))
+  ORDER BY created_at, id
+  LIMIT 1
+  FOR UPDATE SKIP LOCKED)
+RETURNING id, restaurant_id, subject, body, max_subscriber_id, cursor_subscriber_id`
+
+	// materializeDeliveriesSQL copies the next chunk of subscribers into
+	// newsletter_deliveries and advances the cursor atomically.
+	materializeDeliveriesSQL = `
+WITH picked AS (
+  SELECT id, email FROM subscribers
+  WHERE restaurant_id=$2 AND id > $3 AND id <= $4 AND email IS NOT NULL AND email <> ''
+  ORDER BY id
+  LIMIT $5
+), ins AS (
+  INSERT INTO newsletter_deliveries (newsletter_id, subscriber_id, email)
+  SELECT $1, id, email FROM picked
+  ON CONFLICT DO NOTHING
+)
+UPDATE newsletters SET cursor_subscriber_id = COALESCE((SELECT max(id) FROM picked), $4)
+WHERE id=$1
+RETURNING cursor_subscriber_id, (SELECT count(*) FROM picked)`
+
+	pendingDeliveriesSQL = `
+SELECT subscriber_id, email FROM newsletter_deliveries
+WHERE newsletter_id=$1 AND status='pending' AND subscriber_id > $2
+ORDER BY subscriber_id
+LIMIT $3`
+
+	// recordDeliveriesSQL stores a batch of outcomes, bumps the counters
+	// and renews the lease in one round-trip. It returns no row once the
+	// newsletter has been cancelled.
+	recordDeliveriesSQL = `
+WITH upd AS (
+  UPDATE newsletter_deliveries d SET
+    attempts = d.attempts + 1,
+    status = CASE WHEN v.err = '' THEN 'sent' WHEN v.permanent OR d.attempts + 1 >= $5 THEN 'failed' ELSE 'pending' END,
+    last_error = NULLIF(v.err, ''),
+    sent_at = CASE WHEN v.err = '' THEN now() END
+  FROM unnest($2::int[], $3::text[], $4::bool[]) AS v(subscriber_id, err, permanent)
+  WHERE d.newsletter_id=$1 AND d.subscriber_id=v.subscriber_id AND d.status='pending'
+  RETURNING d.status
+)
+UPDATE newsletters SET
+  sent = sent + (SELECT count(*) FROM upd WHERE status='sent'),
+  failed = failed + (SELECT count(*) FROM upd WHERE status='failed'),
+  locked_until = now()+$6::interval
+WHERE id=$1 AND status='sending'
+RETURNING id`
+)
+
+type newsletter struct {
+	ID           int
+	RestaurantID int
+	Subject      string
+	Body         string
+	MaxID        int
+	Cursor       int
+}
+
+type newsletterRecipient struct {
+	SubscriberID int
+	Email        string
+}
+
+// newsletterSender delivers queued newsletters, one at a time per process.
+// Recipients are streamed from subscribers in id order, sent by
+// concurrency workers over a dedicated SMTP pool (so a bulk send does not
+// hold up transactional mail) at no more than rate messages per second,
+// and recorded per recipient in batches.
+type newsletterSender struct {
+	store       *Store
+	smtp        *smtpPool
+	concurrency int
+	rate        int
+	batch       int
+	lease       time.Duration
+	poll        time.Duration
+	retryDelay  time.Duration
+	maxAttempts int
+
+	wake chan struct{}
+	ctx  context.Context
+	stop context.CancelFunc
+	wg   sync.WaitGroup
+}
+
+// newNewsletterSenderFromEnv reads NEWSLETTER_CONCURRENCY (default 4, also
+// the SMTP session count), NEWSLETTER_RATE (default 100 messages/s),
+// NEWSLETTER_BATCH_SIZE (default 500), NEWSLETTER_MAX_ATTEMPTS (default 3)
+// and NEWSLETTER_RETRY_DELAY (default 1m).
+func newNewsletterSenderFromEnv(store *Store) *newsletterSender {
+	ctx, stop := context.WithCancel(context.Background())
+	n := &newsletterSender{
+		store:       store,
+		smtp:        newSMTPPoolFromEnv(),
+		concurrency: envInt("NEWSLETTER_CONCURRENCY", 4),
+		rate:        envInt("NEWSLETTER_RATE", 100),
+		batch:       envInt("NEWSLETTER_BATCH_SIZE", 500),
+		poll:        30 * time.Second,
+		retryDelay:  envDuration("NEWSLETTER_RETRY_DELAY", time.Minute),
+		maxAttempts: envInt("NEWSLETTER_MAX_ATTEMPTS", 3),
+		wake:        make(chan struct{}, 1),
+		ctx:         ctx,
+		stop:        stop,
+	}
+	n.smtp.size = n.concurrency
+	// Long enough to cover one batch at the configured rate; deliver renews
+	// it while a batch is slowed down by SMTP latency.
+	n.lease = 2*time.Minute + 2*time.Duration(n.batch)*time.Second/time.Duration(n.rate)
+	return n
+}
+
+func (n *newsletterSender) Start() {
+	n.wg.Add(1)
+	go n.run()
+}
+
+// Close stops sending after the in-flight messages and hands the lease back
+// so the newsletter resumes on the next start, here or on another replica.
+func (n *newsletterSender) Close() {
+	n.stop()
+	n.wg.Wait()
+	n.smtp.Close()
+}
+
+// Wake makes the sender look for queued newsletters now.
+func (n *newsletterSender) Wake() {
+	select {
+	case n.wake <- struct{}{}:
+	default:
+	}
+}
+
+func (n *newsletterSender) run() {
+	defer n.wg.Done()
+	ticker := time.NewTicker(n.poll)
+	defer ticker.Stop()
+	for {
+		nl, err := n.claim()
+		if err == nil {
+			err = n.send(nl)
+			if err == nil || n.ctx.Err() != nil {
+				n.release(nl.ID, 0)
+				continue
+			}
+			// Keep the newsletter leased for retryDelay so neither this
+			// loop nor another replica picks it up again straight away,
+			// and back off before claiming anything else.
+			fmt.Printf("newsletter %d: %v\n", nl.ID, err)
+			n.release(nl.ID, n.retryDelay)
+		} else if err != sql.ErrNoRows && n.ctx.Err() == nil {
+			fmt.Println("newsletter claim:", err)
+		}
+		select {
+		case <-n.ctx.Done():
+			return
+		case <-n.wake:
+		case <-ticker.C:
+		}
+	}
+}
+
+func (n *newsletterSender) claim() (newsletter, error) {
+	var nl newsletter
+	err := n.store.DB.QueryRowContext(n.ctx, claimNewsletterSQL, pgInterval(n.lease)).
+		Scan(&nl.ID, &nl.RestaurantID, &nl.Subject, &nl.Body, &nl.MaxID, &nl.Cursor)
+	return nl, err
+}
+
+// send works through a claimed newsletter until every recipient is sent or
+// failed, it is cancelled, or the sender stops.
+func (n *newsletterSender) send(nl newsletter) error {
+	restaurant, err := n.store.GetRestaurant(n.ctx, nl.RestaurantID)
+	if err != nil {
+		return err
+	}
+	render := func(email string) string {
+		return strings.NewReplacer("{{email}}", email, "{{restaurant}}", restaurant.Name).Replace(nl.Body)
+	}
+	subject := strings.ReplaceAll(nl.Subject, "{{restaurant}}", restaurant.Name)
+
+	// Pending rows left by an earlier run have ids up to the cursor; newly
+	// materialized ones follow it, so one keyset pass covers both.
+	after := 0
+	for n.ctx.Err() == nil {
+		batch, err := n.pending(nl.ID, after)
+		if err != nil {
+			return err
+		}
+		if len(batch) > 0 {
+			live, err := n.deliver(nl.ID, batch, subject, render)
+			if err != nil || !live {
+				return err
+			}
+			after = batch[len(batch)-1].SubscriberID
+			continue
+		}
+		if nl.Cursor < nl.MaxID {
+			if err := n.materialize(&nl); err != nil {
+				return err
+			}
+			continue
+		}
+		var retry bool
+		if err := n.store.DB.QueryRowContext(n.ctx, "SELECT EXISTS (SELECT 1 FROM newsletter_deliveries WHERE newsletter_id=$1 AND status='pending')", nl.ID).Scan(&retry); err != nil {
+			return err
+		}
+		if !retry {
+			_, err := n.store.DB.ExecContext(n.ctx, "UPDATE newsletters SET status='done', finished_at=now(), locked_until=NULL WHERE id=$1 AND status='sending'", nl.ID)
+			return err
+		}
+		// Another pass for transient failures after retryDelay, holding the
+		// lease meanwhile.
+		res, err := n.store.DB.ExecContext(n.ctx, "UPDATE newsletters SET locked_until=now()+$2::interval WHERE id=$1 AND status='sending'", nl.ID, pgInterval(n.lease+n.retryDelay))
+		if err != nil {
+			return err
+		}
+		if live, _ := res.RowsAffected(); live == 0 {
+			return nil
+		}
+		select {
+		case <-n.ctx.Done():
+		case <-time.After(n.retryDelay):
+		}
+		after = 0
+	}
+	return nil
+}
+
+func (n *newsletterSender) materialize(nl *newsletter) error {
+	var added int
+	err := n.store.DB.QueryRowContext(n.ctx, materializeDeliveriesSQL, nl.ID, nl.RestaurantID, nl.Cursor, nl.MaxID, n.batch).Scan(&nl.Cursor, &added)
+	return err
+}
+
+func (n *newsletterSender) pending(id, after int) ([]newsletterRecipient, error) {
+	rows, err := n.store.DB.QueryContext(n.ctx, pendingDeliveriesSQL, id, after, n.batch)
+	if err != nil {
+		return nil, err
+	}
+	defer rows.Close()
+	var out []newsletterRecipient
+	for rows.Next() {
+		var rc newsletterRecipient
+		if err := rows.Scan(&rc.SubscriberID, &rc.Email); err != nil {
+			return nil, err
+		}
+		out = append(out, rc)
+	}
+	return out, rows.Err()
+}
+
+// deliver sends one batch and records the outcomes. It reports false when
+// the newsletter was cancelled meanwhile.
+func (n *newsletterSender) deliver(id int, batch []newsletterRecipient, subject string, render func(string) string) (bool, error) {
+	errs := make([]error, len(batch))
+	done := make([]bool, len(batch))
+	interval := time.Second / time.Duration(n.rate)
+	tick := time.NewTicker(interval)
+	defer tick.Stop()
+
+	// SMTP latency, not the send rate, bounds how long a batch takes, so
+	// the lease is renewed while it runs rather than only once recorded.
+	lost, stopLease := n.keepLease(id)
+	defer stopLease()
+
+	next := make(chan int)
+	var wg sync.WaitGroup
+	for w := 0; w < n.concurrency; w++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range next {
+				errs[i] = n.smtp.Send(batch[i].Email, subject, render(batch[i].Email))
+				done[i] = true
+			}
+		}()
+	}
+feed:
+	for i := range batch {
+		select {
+		case <-n.ctx.Done():
+			break feed
+		case <-lost:
+			break feed
+		case <-tick.C:
+		}
+		next <- i
+	}
+	close(next)
+	wg.Wait()
+
+	var ids []int64
+	var msgs []string
+	var permanent []bool
+	for i, rc := range batch {
+		if !done[i] {
+			continue
+		}
+		ids = append(ids, int64(rc.SubscriberID))
+		if errs[i] == nil {
+			msgs = append(msgs, "")
+			permanent = append(permanent, false)
+			continue
+		}
+		msgs = append(msgs, errs[i].Error())
+		permanent = append(permanent, errs[i] == errSMTPNotConfigured || isPermanentSMTPError(errs[i]))
+	}
+	// Outcomes are recorded even while stopping so nothing is sent twice.
+	ctx, cancel := context.WithTimeout(context.Background(), 10*time.Second)
+	defer cancel()
+	var live int
+	err := n.store.DB.QueryRowContext(ctx, recordDeliveriesSQL, id, pq.Array(ids), pq.Array(msgs), pq.Array(permanent), n.maxAttempts, pgInterval(n.lease)).Scan(&live)
+	if err == sql.ErrNoRows {
+		return false, nil
+	}
+	return err == nil, err
+}
+
+// keepLease extends the newsletter's lease every lease/3 until stop is
+// called. lost is closed if the newsletter stops being sendable
+// (cancelled, say), so the caller can stop feeding recipients.
+func (n *newsletterSender) keepLease(id int) (lost <-chan struct{}, stop func()) {
+	lostc := make(chan struct{})
+	done := make(chan struct{})
+	go func() {
+		ticker := time.NewTicker(n.lease / 3)
+		defer ticker.Stop()
+		for {
+			select {
+			case <-done:
+				return
+			case <-ticker.C:
+			}
+			ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+			res, err := n.store.DB.ExecContext(ctx, "UPDATE newsletters SET locked_until=now()+$2::interval WHERE id=$1 AND status='sending'", id, pgInterval(n.lease))
+			cancel()
+			if err != nil {
+				fmt.Printf("newsletter %d: renew lease: %v\n", id, err)
+				continue
+			}
+			if live, _ := res.RowsAffected(); live == 0 {
+				close(lostc)
+				return
+			}
+		}
+	}()
+	return lostc, func() { close(done) }
+}
+
+// release hands the lease back, or with after > 0 keeps the newsletter
+// leased for that long.
+func (n *newsletterSender) release(id int, after time.Duration) {
+	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+	defer cancel()
+	if after <= 0 {
+		n.store.DB.ExecContext(ctx, "UPDATE newsletters SET locked_until=NULL WHERE id=$1 AND status='sending'", id)
+		return
+	}
+	n.store.DB.ExecContext(ctx, "UPDATE newsletters SET locked_until=now()+$2::interval WHERE id=$1 AND status='sending'", id, pgInterval(after))
+}
+
+type newsletterStatus struct {
+	ID         int        `json:"id"`
+	Subject    string     `json:"subject"`
+	Status     string     `json:"status"`
+	Total      int        `json:"total"`
+	Sent       int        `json:"sent"`
+	Failed     int        `json:"failed"`
+	CreatedBy  string     `json:"createdBy,omitempty"`
+	CreatedAt  time.Time  `json:"createdAt"`
+	StartedAt  *time.Time `json:"startedAt,omitempty"`
+	FinishedAt *time.Time `json:"finishedAt,omitempty"`
+}
+
+const newsletterColumns = "id, subject, status, total, sent, failed, COALESCE(created_by, ''), created_at, started_at, finished_at"
+
+func scanNewsletterStatus(row interface{ Scan(...any) error }) (newsletterStatus, error) {
+	var st newsletterStatus
+	var started, finished sql.NullTime
+	err := row.Scan(&st.ID, &st.Subject, &st.Status, &st.Total, &st.Sent, &st.Failed, &st.CreatedBy, &st.CreatedAt, &started, &finished)
+	if started.Valid {
+		st.StartedAt = &started.Time
+	}
+	if finished.Valid {
+		st.FinishedAt = &finished.Time
+	}
+	return st, err
+}
+
+type newsletterDelivery struct {
+	SubscriberID int        `json:"subscriberId"`
+	Email        string     `json:"email"`
+	Status       string     `json:"status"`
+	Attempts     int        `json:"attempts"`
+	Error        string     `json:"error,omitempty"`
+	SentAt       *time.Time `json:"sentAt,omitempty"`
+}
+
+// handleNewsletters serves
+//
+//	POST   /api/admin/newsletters/:restaurantId                    compose and queue ({subject, body})
+//	GET    /api/admin/newsletters/:restaurantId                    list, newest first
+//	GET    /api/admin/newsletters/:restaurantId/:id                status and counts
+//	DELETE /api/admin/newsletters/:restaurantId/:id                cancel
+//	GET    /api/admin/newsletters/:restaurantId/:id/deliveries     per-recipient status (status=pending|sent|failed)
+//
+// {{email}} and {{restaurant}} in the body are replaced per recipient.
+func (s *Server) handleNewsletters(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
+	role, _ := claims["role"].(string)
+	if role != "owner" {
+		http.Error(w, "forbidden - owner only", http.StatusForbidden)
+		return
+	}
+
+	rest := strings.Trim(strings.TrimPrefix(r.URL.Path, "/api/admin/newsletters/"), "/")
+	parts := strings.Split(rest, "/")
+	id, err := getIDFromPath("", parts[0])
+	if err != nil {
+		http.Error(w, "invalid restaurant id", http.StatusBadRequest)
+		return
+	}
+	if v, ok := claims["restaurantId"].(float64); ok && int(v) != 0 && int(v) != id {
+		http.Error(w, "token restaurant mismatch", http.StatusForbidden)
+		return
+	}
+
+	if len(parts) == 1 {
+		switch r.Method {
+		case http.MethodPost:
+			s.createNewsletter(w, r, claims, id)
+		case http.MethodGet:
+			s.listNewsletters(w, r, id)
+		default:
+			http.Error(w, "only GET/POST allowed", http.StatusMethodNotAllowed)
+		}
+		return
+	}
+
+	nid, err := getIDFromPath("", parts[1])
+	if err != nil || len(parts) > 3 || (len(parts) == 3 && parts[2] != "deliveries") {
+		http.Error(w, "not found", http.StatusNotFound)
+		return
+	}
+	if len(parts) == 3 {
+		if r.Method != http.MethodGet {
+			http.Error(w, "only GET allowed", http.StatusMethodNotAllowed)
+			return
+		}
+		s.listNewsletterDeliveries(w, r, id, nid)
+		return
+	}
+
+	switch r.Method {
+	case http.MethodGet:
+		st, err := scanNewsletterStatus(s.store.DB.QueryRowContext(r.Context(),
+			"SELECT "+newsletterColumns+" FROM newsletters WHERE id=$1 AND restaurant_id=$2", nid, id))
+		if err == sql.ErrNoRows {
+			http.Error(w, "not found", http.StatusNotFound)
+			return
+		}
+		if err != nil {
+			http.Error(w, "failed to load newsletter", http.StatusInternalServerError)
+			return
+		}
+		writeJSON(w, st)
+	case http.MethodDelete:
+		res, err := s.store.DB.ExecContext(r.Context(),
+			"UPDATE newsletters SET status='cancelled', finished_at=now(), locked_until=NULL WHERE id=$1 AND restaurant_id=$2 AND status IN ('queued','sending')", nid, id)
+		if err != nil {
+			http.Error(w, "failed to cancel newsletter", http.StatusInternalServerError)
+			return
+		}
+		if n, _ := res.RowsAffected(); n == 0 {
+			http.Error(w, "newsletter not active", http.StatusConflict)
+			return
+		}
+		email, _ := claims["email"].(string)
+		s.audit.Log(id, email, "newsletter_cancelled", map[string]any{"newsletter_id": nid}, r.RemoteAddr)
+		writeJSON(w, map[string]any{"ok": true})
+	default:
+		http.Error(w, "only GET/DELETE allowed", http.StatusMethodNotAllowed)
+	}
+}
+
+func (s *Server) createNewsletter(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims, id int) {
+	var p struct {
+		Subject string `json:"subject"`
+		Body    string `json:"body"`
+	}
+	if err := json.NewDecoder(r.Body).Decode(&p); err != nil || strings.TrimSpace(p.Subject) == "" || strings.TrimSpace(p.Body) == "" {
+		http.Error(w, "invalid payload", http.StatusBadRequest)
+		return
+	}
+	if strings.ContainsAny(p.Subject, "\r\n") {
+		http.Error(w, "subject must be a single line", http.StatusBadRequest)
+		return
+	}
+	email, _ := claims["email"].(string)
+	var nid, total int
+	err := s.store.DB.QueryRowContext(r.Context(), `INSERT INTO newsletters (restaurant_id, subject, body, created_by, total, max_subscriber_id)
+		SELECT $1, $2, $3, $4, count(*), COALESCE(max(id), 0) FROM subscribers WHERE restaurant_id=$1 AND email IS NOT NULL AND email <> ''
+		RETURNING id, total`, id, p.Subject, p.Body, email).Scan(&nid, &total)
+	if err != nil {
+		http.Error(w, "failed to create newsletter", http.StatusInternalServerError)
+		return
+	}
+	s.audit.Log(id, email, "newsletter_created", map[string]any{"newsletter_id": nid, "recipients": total}, r.RemoteAddr)
+	s.newsletters.Wake()
+
+	w.Header().Set("Location", fmt.Sprintf("/api/admin/newsletters/%d/%d", id, nid))
+	w.Header().Set("Content-Type", "application/json")
+	w.WriteHeader(http.StatusAccepted)
+	json.NewEncoder(w).Encode(map[string]any{"ok": true, "id": nid, "recipients": total})
+}
+
+func (s *Server) listNewsletters(w http.ResponseWriter, r *http.Request, id int) {
+	limit, err := parseLimit(r, 20, 100)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	cursor, err := parseCursorParam(r)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	var q listQuery
+	q.where("restaurant_id = %s", id)
+	q.after(cursor)
+	rows, err := s.store.DB.QueryContext(r.Context(), q.sql(newsletterColumns, "newsletters", limit+1), q.args...)
+	if err != nil {
+		http.Error(w, "failed to list newsletters", http.StatusInternalServerError)
+		return
+	}
+	defer rows.Close()
+	items := []newsletterStatus{}
+	for rows.Next() {
+		st, err := scanNewsletterStatus(rows)
+		if err != nil {
+			http.Error(w, "failed to list newsletters", http.StatusInternalServerError)
+			return
+		}
+		items = append(items, st)
+	}
+	if err := rows.Err(); err != nil {
+		http.Error(w, "failed to list newsletters", http.StatusInternalServerError)
+		return
+	}
+	out := page{Items: items}
+	if len(items) > limit {
+		last := items[limit-1]
+		out.Items = items[:limit]
+		out.NextCursor = encodeCursor(pageCursor{CreatedAt: last.CreatedAt, ID: last.ID})
+	}
+	writeJSON(w, out)
+}
+
+// listNewsletterDeliveries pages through recipients by subscriber id; the
+// cursor is the last id returned.
+func (s *Server) listNewsletterDeliveries(w http.ResponseWriter, r *http.Request, id, nid int) {
+	limit, err := parseLimit(r, 100, 1000)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	after := 0
+	if token := r.URL.Query().Get("cursor"); token != "" {
+		if err := decodeCursor(token, &after); err != nil {
+			http.Error(w, err.Error(), http.StatusBadRequest)
+			return
+		}
+	}
+	status := r.URL.Query().Get("status")
+	if status != "" && status != "pending" && status != "sent" && status != "failed" {
+		http.Error(w, "status must be pending, sent or failed", http.StatusBadRequest)
+		return
+	}
+	rows, err := s.store.DB.QueryContext(r.Context(), `SELECT d.subscriber_id, d.email, d.status, d.attempts, COALESCE(d.last_error, ''), d.sent_at
+		FROM newsletter_deliveries d JOIN newsletters n ON n.id = d.newsletter_id
+		WHERE d.newsletter_id=$1 AND n.restaurant_id=$2 AND d.subscriber_id > $3 AND ($4 = '' OR d.status = $4)
+		ORDER BY d.subscriber_id LIMIT $5`, nid, id, after, status, limit+1)
+	if err != nil {
+		http.Error(w, "failed to list deliveries", http.StatusInternalServerError)
+		return
+	}
+	defer rows.Close()
+	items := []newsletterDelivery{}
+	for rows.Next() {
+		var d newsletterDelivery
+		var sentAt sql.NullTime
+		if err := rows.Scan(&d.SubscriberID, &d.Email, &d.Status, &d.Attempts, &d.Error, &sentAt); err != nil {
+			http.Error(w, "failed to list deliveries", http.StatusInternalServerError)
+			return
+		}
+		if sentAt.Valid {
+			d.SentAt = &sentAt.Time
+		}
+		items = append(items, d)
+	}
+	if err := rows.Err(); err != nil {
+		http.Error(w, "failed to list deliveries", http.StatusInternalServerError)
+		return
+	}
+	out := page{Items: items}
+	if len(items) > limit {
+		out.Items = items[:limit]
+		out.NextCursor = encodeCursor(items[limit-1].SubscriberID)
+	}
+	writeJSON(w, out)
+}
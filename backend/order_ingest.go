@@ -0,0 +1,234 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"errors"
+	"fmt"
+	"os"
+	"strconv"
+	"sync"
+	"time"
+
+	"github.com/lib/pq"
+)
+
+var errOrderQueueFull = errors.New("order queue full")
+
+// orderRecord is a validated order waiting to be written.
+type orderRecord struct {
+	RestaurantID    int
+	ItemsJSON       []byte
+	Total           float64
+	CustomerName    string
+	CustomerPhone   string
+	CustomerAddress string
+	CustomerEmail   string
+	Notes           string
+	CreatedAt       time.Time
+}
+
+type orderResult struct {
+	id  int
+	err error
+}
+
+type pendingOrder struct {
+	order orderRecord
+	done  chan orderResult
+}
+
+// orderIngester group-commits orders: handlers enqueue onto a bounded
+// queue and block until a writer has committed the batch containing their
+// order. Writers flush every maxBatch orders or maxDelay, whichever comes
+// first, with one COPY per batch.
+type orderIngester struct {
+	db       *sql.DB
+	queue    chan *pendingOrder
+	maxBatch int
+	maxDelay time.Duration
+	writers  int
+
+	mu     sync.RWMutex
+	closed bool
+	wg     sync.WaitGroup
+}
+
+// newOrderIngesterFromEnv reads ORDER_QUEUE_SIZE (default 1024),
+// ORDER_BATCH_SIZE (default 100), ORDER_BATCH_DELAY (default 5ms) and
+// ORDER_WRITERS (default 2).
+func newOrderIngesterFromEnv(db *sql.DB) *orderIngester {
+	return &orderIngester{
+		db:       db,
+		queue:    make(chan *pendingOrder, envInt("ORDER_QUEUE_SIZE", 1024)),
+		maxBatch: envInt("ORDER_BATCH_SIZE", 100),
+		maxDelay: envDuration("ORDER_BATCH_DELAY", 5*time.Millisecond),
+		writers:  envInt("ORDER_WRITERS", 2),
+	}
+}
+
+func envInt(name string, def int) int {
+	if v := os.Getenv(name); v != "" {
+		if n, err := strconv.Atoi(v); err == nil && n > 0 {
+			return n
+		}
+	}
+	return def
+}
+
+func envDuration(name string, def time.Duration) time.Duration {
+	if v := os.Getenv(name); v != "" {
+		if d, err := time.ParseDuration(v); err == nil && d > 0 {
+			return d
+		}
+	}
+	return def
+}
+
+func (o *orderIngester) Start() {
+	for i := 0; i < o.writers; i++ {
+		o.wg.Add(1)
+		go o.run()
+	}
+}
+
+// Submit enqueues an order and waits for it to be committed, returning its
+// ID. It fails fast with errOrderQueueFull when the queue is saturated.
+// ctx is only checked before queueing: once queued the order may be
+// committed whatever happens to the request, so Submit waits for the
+// outcome (bounded by ORDER_BATCH_DELAY and the flush timeout) rather than
+// report a failure that a retry would turn into a duplicate order.
+func (o *orderIngester) Submit(ctx context.Context, order orderRecord) (int, error) {
+	if err := ctx.Err(); err != nil {
+		return 0, err
+	}
+	p := &pendingOrder{order: order, done: make(chan orderResult, 1)}
+	o.mu.RLock()
+	if o.closed {
+		o.mu.RUnlock()
+		return 0, errOrderQueueFull
+	}
+	select {
+	case o.queue <- p:
+		o.mu.RUnlock()
+	default:
+		o.mu.RUnlock()
+		return 0, errOrderQueueFull
+	}
+	res := <-p.done
+	return res.id, res.err
+}
+
+// Close stops accepting orders and waits for queued ones to be written.
+func (o *orderIngester) Close() {
+	o.mu.Lock()
+	if !o.closed {
+		o.closed = true
+		close(o.queue)
+	}
+	o.mu.Unlock()
+	o.wg.Wait()
+}
+
+func (o *orderIngester) run() {
+	defer o.wg.Done()
+	batch := make([]*pendingOrder, 0, o.maxBatch)
+	for first := range o.queue {
+		batch = append(batch[:0], first)
+		timer := time.NewTimer(o.maxDelay)
+	fill:
+		for len(batch) < o.maxBatch {
+			select {
+			case p, ok := <-o.queue:
+				if !ok {
+					break fill
+				}
+				batch = append(batch, p)
+			case <-timer.C:
+				break fill
+			}
+		}
+		timer.Stop()
+		o.flush(batch)
+	}
+}
+
+// flush commits a batch. If the batch fails as a whole (one order with an
+// unknown restaurant, say) every order is retried alone so a single bad
+// row cannot fail its neighbours.
+func (o *orderIngester) flush(batch []*pendingOrder) {
+	ctx, cancel := context.WithTimeout(context.Background(), 15*time.Second)
+	defer cancel()
+	ids, err := o.insertBatch(ctx, batch)
+	if err != nil && len(batch) > 1 {
+		for _, p := range batch {
+			single, err := o.insertBatch(ctx, []*pendingOrder{p})
+			if err != nil {
+				p.done <- orderResult{err: err}
+				continue
+			}
+			p.done <- orderResult{id: single[0]}
+		}
+		return
+	}
+	for i, p := range batch {
+		if err != nil {
+			p.done <- orderResult{err: err}
+			continue
+		}
+		p.done <- orderResult{id: ids[i]}
+	}
+}
+
+// insertBatch reserves IDs from the orders sequence and COPYs the batch in
+// a single transaction, so each order's ID is known without RETURNING.
+func (o *orderIngester) insertBatch(ctx context.Context, batch []*pendingOrder) ([]int, error) {
+	tx, err := o.db.BeginTx(ctx, nil)
+	if err != nil {
+		return nil, err
+	}
+	defer tx.Rollback()
+
+	rows, err := tx.QueryContext(ctx, "SELECT nextval(pg_get_serial_sequence('orders', 'id')) FROM generate_series(1, $1)", len(batch))
+	if err != nil {
+		return nil, err
+	}
+	ids := make([]int, 0, len(batch))
+	for rows.Next() {
+		var id int
+		if err := rows.Scan(&id); err != nil {
+			rows.Close()
+			return nil, err
+		}
+		ids = append(ids, id)
+	}
+	rows.Close()
+	if err := rows.Err(); err != nil {
+		return nil, err
+	}
+	if len(ids) != len(batch) {
+		return nil, fmt.Errorf("reserved %d order ids for %d orders", len(ids), len(batch))
+	}
+
+	stmt, err := tx.PrepareContext(ctx, pq.CopyIn("orders", "id", "restaurant_id", "items_json", "total", "status", "created_at",
+		"customer_name", "customer_phone", "customer_address", "customer_email", "notes"))
+	if err != nil {
+		return nil, err
+	}
+	for i, p := range batch {
+		ord := p.order
+		if _, err := stmt.ExecContext(ctx, ids[i], ord.RestaurantID, string(ord.ItemsJSON), ord.Total, "pending", ord.CreatedAt,
+			ord.CustomerName, ord.CustomerPhone, ord.CustomerAddress, ord.CustomerEmail, ord.Notes); err != nil {
+			stmt.Close()
+			return nil, err
+		}
+	}
+	if _, err := stmt.ExecContext(ctx); err != nil {
+		stmt.Close()
+		return nil, err
+	}
+	if err := stmt.Close(); err != nil {
+		return nil, err
+	}
+	return ids, tx.Commit()
+}
@@ -0,0 +1,129 @@
+package main
+
+import (
+	"encoding/base64"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"net/http"
+	"strconv"
+	"strings"
+	"time"
+)
+
+var errInvalidCursor = errors.New("invalid cursor")
+
+// pageCursor is the keyset position after the last row of a page for lists
+// ordered by (created_at DESC, id DESC).
+type pageCursor struct {
+	CreatedAt time.Time `json:"t"`
+	ID        int       `json:"i"`
+}
+
+// page is the response envelope of keyset-paginated list endpoints.
+type page struct {
+	Items      any    `json:"items"`
+	NextCursor string `json:"nextCursor,omitempty"`
+}
+
+// encodeCursor turns a keyset position into an opaque token.
+func encodeCursor(v any) string {
+	b, _ := json.Marshal(v)
+	return base64.RawURLEncoding.EncodeToString(b)
+}
+
+// decodeCursor parses a token produced by encodeCursor into v.
+func decodeCursor(token string, v any) error {
+	b, err := base64.RawURLEncoding.DecodeString(token)
+	if err != nil {
+		return errInvalidCursor
+	}
+	if err := json.Unmarshal(b, v); err != nil {
+		return errInvalidCursor
+	}
+	return nil
+}
+
+// parseCursorParam reads the "cursor" query parameter, if present.
+func parseCursorParam(r *http.Request) (*pageCursor, error) {
+	token := r.URL.Query().Get("cursor")
+	if token == "" {
+		return nil, nil
+	}
+	var c pageCursor
+	if err := decodeCursor(token, &c); err != nil {
+		return nil, err
+	}
+	return &c, nil
+}
+
+// parseLimit reads the "limit" query parameter, defaulting to def and
+// rejecting values outside 1..max.
+func parseLimit(r *http.Request, def, max int) (int, error) {
+	v := r.URL.Query().Get("limit")
+	if v == "" {
+		return def, nil
+	}
+	n, err := strconv.Atoi(v)
+	if err != nil || n < 1 || n > max {
+		return 0, fmt.Errorf("limit must be between 1 and %d", max)
+	}
+	return n, nil
+}
+
+// parseTimeParam reads an RFC 3339 timestamp or YYYY-MM-DD date parameter.
+func parseTimeParam(r *http.Request, name string) (*time.Time, error) {
+	v := r.URL.Query().Get(name)
+	if v == "" {
+		return nil, nil
+	}
+	for _, layout := range []string{time.RFC3339, "2006-01-02"} {
+		if t, err := time.Parse(layout, v); err == nil {
+			return &t, nil
+		}
+	}
+	return nil, fmt.Errorf("invalid %s: use RFC 3339 or YYYY-MM-DD", name)
+}
+
+// listQuery accumulates WHERE conditions and their positional arguments
+// for the keyset list endpoints.
+type listQuery struct {
+	conds []string
+	args  []any
+}
+
+// where adds a condition; each %s in cond is replaced by the placeholder of
+// the matching argument.
+func (q *listQuery) where(cond string, args ...any) {
+	ph := make([]any, len(args))
+	for i, a := range args {
+		q.args = append(q.args, a)
+		ph[i] = "$" + strconv.Itoa(len(q.args))
+	}
+	q.conds = append(q.conds, fmt.Sprintf(cond, ph...))
+}
+
+// timeRange adds created_at bounds: from is inclusive, to exclusive.
+func (q *listQuery) timeRange(from, to *time.Time) {
+	if from != nil {
+		q.where("created_at >= %s", *from)
+	}
+	if to != nil {
+		q.where("created_at < %s", *to)
+	}
+}
+
+// after adds the keyset condition for rows following cursor.
+func (q *listQuery) after(cursor *pageCursor) {
+	if cursor != nil {
+		q.where("(created_at, id) < (%s, %s)", cursor.CreatedAt, cursor.ID)
+	}
+}
+
+// sql renders "SELECT cols FROM table WHERE ... ORDER BY created_at DESC,
+// id DESC LIMIT n".
+func (q *listQuery) sql(cols, table string, limit int) string {
+	q.args = append(q.args, limit)
+	return fmt.Sprintf("SELECT %s FROM %s WHERE %s ORDER BY created_at DESC, id DESC LIMIT $%d",
+		cols, table, strings.Join(q.conds, " AND "), len(q.args))
+}
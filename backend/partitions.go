@@ -0,0 +1,150 @@
+package main
+
+import (
+	"bufio"
+	"compress/gzip"
+	"context"
+	"database/sql"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"os"
+	"path/filepath"
+	"time"
+)
+
+var errNotArchived = errors.New("month not archived")
+
+// partitionedTables are range-partitioned by month on created_at (see
+// db/time_partitioning_migration.sql).
+var partitionedTables = []string{"orders", "audit_log"}
+
+// maintainPartitions creates the partitions for the coming monthsAhead
+// months at startup and then daily, so inserts never fall through to the
+// default partition. It returns when ctx is done.
+func (s *Store) maintainPartitions(ctx context.Context, monthsAhead int) {
+	ticker := time.NewTicker(24 * time.Hour)
+	defer ticker.Stop()
+	for {
+		for _, table := range partitionedTables {
+			var created int
+			err := s.DB.QueryRowContext(ctx, "SELECT ensure_monthly_partitions($1, (now() AT TIME ZONE 'UTC')::date, $2)", table, monthsAhead).Scan(&created)
+			if err != nil && ctx.Err() == nil {
+				fmt.Printf("ensure %s partitions: %v\n", table, err)
+			} else if created > 0 {
+				fmt.Printf("created %d %s partition(s)\n", created, table)
+			}
+		}
+		select {
+		case <-ctx.Done():
+			return
+		case <-ticker.C:
+		}
+	}
+}
+
+// archiveDir is where scripts/archive_partitions.go writes archived months.
+func archiveDir() string {
+	if dir := os.Getenv("ARCHIVE_DIR"); dir != "" {
+		return dir
+	}
+	return "./archive"
+}
+
+// openArchive opens the gzip NDJSON archive of parent for month (any day in
+// it), as recorded in archived_partitions.
+func (s *Store) openArchive(ctx context.Context, parent string, month time.Time) (io.ReadCloser, error) {
+	var rel string
+	err := s.DB.QueryRowContext(ctx, "SELECT path FROM archived_partitions WHERE parent=$1 AND month=$2",
+		parent, time.Date(month.Year(), month.Month(), 1, 0, 0, 0, 0, time.UTC)).Scan(&rel)
+	if err == sql.ErrNoRows {
+		return nil, errNotArchived
+	}
+	if err != nil {
+		return nil, err
+	}
+	f, err := os.Open(filepath.Join(archiveDir(), filepath.FromSlash(rel)))
+	if err != nil {
+		return nil, err
+	}
+	zr, err := gzip.NewReader(f)
+	if err != nil {
+		f.Close()
+		return nil, err
+	}
+	return struct {
+		io.Reader
+		io.Closer
+	}{zr, f}, nil
+}
+
+// archivedAuditRow is an audit_log row as written by row_to_json.
+type archivedAuditRow struct {
+	ID           int             `json:"id"`
+	RestaurantID int             `json:"restaurant_id"`
+	AdminEmail   *string         `json:"admin_email"`
+	Action       string          `json:"action"`
+	Payload      json.RawMessage `json:"payload"`
+	IP           *string         `json:"ip"`
+	CreatedAt    time.Time       `json:"created_at"`
+}
+
+// auditArchiveFilter selects rows of an archived month the same way the
+// live handleAuditLog query does.
+type auditArchiveFilter struct {
+	RestaurantID int
+	Email        string
+	From, To     *time.Time
+	After        *pageCursor
+	Limit        int
+}
+
+func (f auditArchiveFilter) match(row *archivedAuditRow) bool {
+	switch {
+	case row.RestaurantID != f.RestaurantID:
+		return false
+	case f.Email != "" && (row.AdminEmail == nil || *row.AdminEmail != f.Email):
+		return false
+	case f.From != nil && row.CreatedAt.Before(*f.From):
+		return false
+	case f.To != nil && !row.CreatedAt.Before(*f.To):
+		return false
+	case f.After != nil && !row.CreatedAt.Before(f.After.CreatedAt) &&
+		!(row.CreatedAt.Equal(f.After.CreatedAt) && row.ID < f.After.ID):
+		return false
+	}
+	return true
+}
+
+// streamArchivedAudit writes matching rows of an archived audit month.
+// Archives are written newest first, so keyset pages work as they do on
+// the live table. It returns the next cursor, if any.
+func streamArchivedAudit(r io.Reader, f auditArchiveFilter, stream *rowStream) (string, error) {
+	sc := bufio.NewScanner(r)
+	sc.Buffer(make([]byte, 64<<10), 16<<20)
+	var last auditRow
+	for sc.Scan() {
+		var row archivedAuditRow
+		if err := json.Unmarshal(sc.Bytes(), &row); err != nil {
+			return "", err
+		}
+		if !f.match(&row) {
+			continue
+		}
+		if f.Limit > 0 && stream.rows == f.Limit {
+			return encodeCursor(pageCursor{CreatedAt: last.CreatedAt, ID: last.ID}), nil
+		}
+		last = auditRow{ID: row.ID, Action: row.Action, Payload: row.Payload, CreatedAt: row.CreatedAt}
+		if row.AdminEmail != nil {
+			last.Email = *row.AdminEmail
+		}
+		if row.IP != nil {
+			last.IP = *row.IP
+		}
+		if err := stream.Row(&last); err != nil {
+			return "", err
+		}
+	}
+	return "", sc.Err()
+}
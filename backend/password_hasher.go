@@ -0,0 +1,108 @@
+package main
+
+import (
+	"context"
+	"errors"
+	"runtime"
+
+	"golang.org/x/crypto/bcrypt"
+)
+
+var errHasherBusy = errors.New("password hasher busy")
+
+type hashJob struct {
+	ctx  context.Context
+	run  func()
+	ran  bool
+	done chan struct{}
+}
+
+// passwordHasher runs bcrypt on a fixed number of workers so a burst of
+// logins cannot take every core from the public handlers. Jobs beyond the
+// queue limit are rejected immediately with errHasherBusy.
+type passwordHasher struct {
+	cost    int
+	workers int
+	queue   chan *hashJob
+}
+
+// newPasswordHasherFromEnv reads BCRYPT_COST (default bcrypt.DefaultCost),
+// BCRYPT_WORKERS (default half the CPUs) and BCRYPT_QUEUE (default 32).
+func newPasswordHasherFromEnv() *passwordHasher {
+	workers := runtime.NumCPU() / 2
+	if workers < 1 {
+		workers = 1
+	}
+	cost := envInt("BCRYPT_COST", bcrypt.DefaultCost)
+	if cost < bcrypt.MinCost || cost > bcrypt.MaxCost {
+		cost = bcrypt.DefaultCost
+	}
+	return &passwordHasher{
+		cost:    cost,
+		workers: envInt("BCRYPT_WORKERS", workers),
+		queue:   make(chan *hashJob, envInt("BCRYPT_QUEUE", 32)),
+	}
+}
+
+func (h *passwordHasher) Start() {
+	for i := 0; i < h.workers; i++ {
+		go func() {
+			for job := range h.queue {
+				// The caller gave up while queued; skip the work.
+				if job.ctx.Err() == nil {
+					job.run()
+					job.ran = true
+				}
+				close(job.done)
+			}
+		}()
+	}
+}
+
+func (h *passwordHasher) do(ctx context.Context, run func()) error {
+	job := &hashJob{ctx: ctx, run: run, done: make(chan struct{})}
+	select {
+	case h.queue <- job:
+	default:
+		return errHasherBusy
+	}
+	select {
+	case <-job.done:
+		if !job.ran {
+			return ctx.Err()
+		}
+		return nil
+	case <-ctx.Done():
+		return ctx.Err()
+	}
+}
+
+// Compare checks password against hash on a worker.
+func (h *passwordHasher) Compare(ctx context.Context, hash, password string) error {
+	var err error
+	if qerr := h.do(ctx, func() {
+		err = bcrypt.CompareHashAndPassword([]byte(hash), []byte(password))
+	}); qerr != nil {
+		return qerr
+	}
+	return err
+}
+
+// Hash hashes password at the configured cost on a worker.
+func (h *passwordHasher) Hash(ctx context.Context, password string) (string, error) {
+	var hash []byte
+	var err error
+	if qerr := h.do(ctx, func() {
+		hash, err = bcrypt.GenerateFromPassword([]byte(password), h.cost)
+	}); qerr != nil {
+		return "", qerr
+	}
+	return string(hash), err
+}
+
+// NeedsRehash reports whether hash was made at a different cost than the
+// configured one.
+func (h *passwordHasher) NeedsRehash(hash string) bool {
+	cost, err := bcrypt.Cost([]byte(hash))
+	return err == nil && cost != h.cost
+}
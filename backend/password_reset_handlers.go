@@ -1,15 +1,12 @@
 package main
 
 import (
-	"context"
 	"database/sql"
 	"encoding/json"
 	"fmt"
 	"net/http"
 	"os"
 	"time"
-
-	"golang.org/x/crypto/bcrypt"
 )
 
 func (s *Server) handlePasswordResetRequest(w http.ResponseWriter, r *http.Request) {
@@ -17,6 +14,10 @@ func (s *Server) handlePasswordResetRequest(w http.ResponseWriter, r *http.Reque
 		http.Error(w, "only POST", http.StatusMethodNotAllowed)
 		return
 	}
+	if ok, retry := s.throttle.AllowIP(r); !ok {
+		writeThrottled(w, retry)
+		return
+	}
 	var p struct {
 		RestaurantId int    `json:"restaurantId"`
 		Email        string `json:"email"`
@@ -25,6 +26,12 @@ func (s *Server) handlePasswordResetRequest(w http.ResponseWriter, r *http.Reque
 		http.Error(w, "invalid payload", http.StatusBadRequest)
 		return
 	}
+	// Each request queues an email and rotates the token, so an account
+	// gets the login limit whether or not it exists.
+	if ok, retry := s.throttle.AllowAccount(p.RestaurantId, p.Email); !ok {
+		writeThrottled(w, retry)
+		return
+	}
 
 	var exists bool
 	row := s.store.DB.QueryRowContext(r.Context(), "SELECT EXISTS (SELECT 1 FROM admins WHERE restaurant_id=$1 AND email=$2)", p.RestaurantId, p.Email)
@@ -53,13 +60,11 @@ func (s *Server) handlePasswordResetRequest(w http.ResponseWriter, r *http.Reque
 		resetURL := fmt.Sprintf("%s/password-reset/confirm?token=%s&restaurantId=%d", frontend, token, p.RestaurantId)
 		subject := "Password reset for admin account"
 		body := fmt.Sprintf("A request to reset the admin password was made. If you requested this, click the link to set a new password (expires in 1 hour):\n\n%s\n\nIf you did not request this, ignore this email.", resetURL)
-		go func() {
-			if err := sendEmail(p.Email, subject, body); err != nil {
-				fmt.Println("password reset email failed:", err)
-			}
-		}()
+		if err := s.mail.Enqueue(r.Context(), p.Email, subject, body); err != nil {
+			fmt.Println("password reset email failed:", err)
+		}
 
-		_ = insertAuditLog(r.Context(), s.store.DB, p.RestaurantId, p.Email, "password_reset_requested", map[string]any{"email": p.Email}, r.RemoteAddr)
+		s.audit.Log(p.RestaurantId, p.Email, "password_reset_requested", map[string]any{"email": p.Email}, r.RemoteAddr)
 	}
 
 	writeJSON(w, map[string]any{"ok": true})
@@ -70,6 +75,10 @@ func (s *Server) handlePasswordResetConfirm(w http.ResponseWriter, r *http.Reque
 		http.Error(w, "only POST", http.StatusMethodNotAllowed)
 		return
 	}
+	if ok, retry := s.throttle.AllowIP(r); !ok {
+		writeThrottled(w, retry)
+		return
+	}
 	var p struct {
 		Token    string `json:"token"`
 		Password string `json:"password"`
@@ -98,12 +107,16 @@ func (s *Server) handlePasswordResetConfirm(w http.ResponseWriter, r *http.Reque
 		return
 	}
 
-	hash, err := bcrypt.GenerateFromPassword([]byte(p.Password), bcrypt.DefaultCost)
+	hash, err := s.hasher.Hash(r.Context(), p.Password)
+	if err == errHasherBusy {
+		writeThrottled(w, 0)
+		return
+	}
 	if err != nil {
 		http.Error(w, "failed to hash password", http.StatusInternalServerError)
 		return
 	}
-	res, err := s.store.DB.ExecContext(r.Context(), "UPDATE admins SET password_hash=$1 WHERE email=$2", string(hash), pr.Email)
+	res, err := s.store.DB.ExecContext(r.Context(), "UPDATE admins SET password_hash=$1 WHERE email=$2", hash, pr.Email)
 	if err != nil {
 		http.Error(w, "failed to update password", http.StatusInternalServerError)
 		return
@@ -119,12 +132,12 @@ func (s *Server) handlePasswordResetConfirm(w http.ResponseWriter, r *http.Reque
 	row2 := s.store.DB.QueryRowContext(r.Context(), "SELECT restaurant_id FROM admins WHERE email=$1 LIMIT 1", pr.Email)
 	_ = row2.Scan(&restaurantID)
 
-	_ = insertAuditLog(r.Context(), s.store.DB, restaurantID, pr.Email, "password_reset_confirmed", map[string]any{"token_id": pr.ID}, r.RemoteAddr)
-	go func() {
-		subject := "Password successfully reset"
-		body := "Your admin password has been successfully reset. If you did not perform this action, please contact support."
-		_ = sendEmail(pr.Email, subject, body)
-	}()
+	s.audit.Log(restaurantID, pr.Email, "password_reset_confirmed", map[string]any{"token_id": pr.ID}, r.RemoteAddr)
+	subject := "Password successfully reset"
+	body := "Your admin password has been successfully reset. If you did not perform this action, please contact support."
+	if err := s.mail.Enqueue(r.Context(), pr.Email, subject, body); err != nil {
+		fmt.Println("failed queueing password reset notice:", err)
+	}
 
 	writeJSON(w, map[string]any{"ok": true})
 }
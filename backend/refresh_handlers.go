@@ -61,38 +61,43 @@ func (s *Server) handleRefresh(w http.ResponseWriter, r *http.Request) {
 		http.Error(w, "no refresh token", http.StatusUnauthorized)
 		return
 	}
-	raw := c.Value
-	found, err := s.store.FindRefreshToken(r.Context(), raw)
-	if err != nil {
-		http.Error(w, "invalid refresh token", http.StatusUnauthorized)
+	rotated, err := s.store.RotateRefreshToken(r.Context(), c.Value, r.RemoteAddr, r.UserAgent(), RefreshTokenDuration)
+	switch err {
+	case nil:
+	case errRefreshConflict:
+		// A concurrent refresh (another tab) already rotated this token and
+		// its response carries the new cookie.
+		w.Header().Set("Retry-After", "1")
+		http.Error(w, "refresh in progress", http.StatusConflict)
 		return
-	}
-	if found.Revoked {
+	case errRefreshReplayed:
+		s.auth.RevokeSessions(rotated.RevokedIDs...)
+		fmt.Printf("refresh token replay from %s, revoked %d sessions\n", r.RemoteAddr, len(rotated.RevokedIDs))
+		clearRefreshCookie(w)
 		http.Error(w, "token revoked", http.StatusUnauthorized)
 		return
-	}
-	if found.ExpiresAt.Valid && time.Now().After(found.ExpiresAt.Time) {
+	case errRefreshRevoked:
+		http.Error(w, "token revoked", http.StatusUnauthorized)
+		return
+	case errRefreshExpired:
 		http.Error(w, "token expired", http.StatusUnauthorized)
 		return
-	}
-	admin, err := s.store.GetAdminByEmail(r.Context(), found.RestaurantID, found.Email)
-	if err != nil {
-		http.Error(w, "admin not found", http.StatusUnauthorized)
+	case errRefreshInvalid:
+		http.Error(w, "invalid refresh token", http.StatusUnauthorized)
 		return
-	}
-	accessToken, err := createTokenWithTTL(admin, AccessTokenTTL)
-	if err != nil {
-		http.Error(w, "failed to create access token", http.StatusInternalServerError)
+	default:
+		fmt.Println("refresh rotation failed:", err)
+		http.Error(w, "server error", http.StatusInternalServerError)
 		return
 	}
-	newRaw, newID, err := s.store.RotateRefreshToken(r.Context(), raw, r.RemoteAddr, r.UserAgent(), RefreshTokenDuration)
+	admin := AdminUser{RestaurantID: rotated.RestaurantID, Email: rotated.Email, Role: rotated.Role}
+	accessToken, err := createTokenWithTTL(admin, rotated.ID, AccessTokenTTL)
 	if err != nil {
-		fmt.Println("refresh rotation failed:", err)
-		writeJSON(w, map[string]any{"accessToken": accessToken, "role": admin.Role, "expiresIn": int(AccessTokenTTL.Seconds()), "currentSessionId": found.ID})
+		http.Error(w, "failed to create access token", http.StatusInternalServerError)
 		return
 	}
-	setRefreshCookie(w, newRaw, time.Now().Add(RefreshTokenDuration))
-	writeJSON(w, map[string]any{"accessToken": accessToken, "role": admin.Role, "expiresIn": int(AccessTokenTTL.Seconds()), "currentSessionId": newID})
+	setRefreshCookie(w, rotated.RawToken, time.Now().Add(RefreshTokenDuration))
+	writeJSON(w, map[string]any{"accessToken": accessToken, "role": admin.Role, "expiresIn": int(AccessTokenTTL.Seconds()), "currentSessionId": rotated.ID})
 }
 
 func (s *Server) handleLogout(w http.ResponseWriter, r *http.Request) {
@@ -105,7 +110,8 @@ func (s *Server) handleLogout(w http.ResponseWriter, r *http.Request) {
 		found, errFind := s.store.FindRefreshToken(r.Context(), c.Value)
 		if errFind == nil {
 			_ = s.store.RevokeRefreshTokenByID(r.Context(), found.ID)
-			_ = insertAuditLog(r.Context(), s.store.DB, found.RestaurantID, found.Email, "session_revoked_by_user", map[string]any{"session_id": found.ID}, r.RemoteAddr)
+			s.auth.RevokeSessions(found.ID)
+			s.audit.Log(found.RestaurantID, found.Email, "session_revoked_by_user", map[string]any{"session_id": found.ID}, r.RemoteAddr)
 		} else {
 			_ = s.store.RevokeRefreshTokenByRaw(r.Context(), c.Value)
 		}
@@ -114,18 +120,16 @@ func (s *Server) handleLogout(w http.ResponseWriter, r *http.Request) {
 	writeJSON(w, map[string]any{"ok": true})
 }
 
-func createTokenWithTTL(admin AdminUser, ttl time.Duration) (string, error) {
-	secret := os.Getenv("JWT_SECRET")
-	if secret == "" {
-		secret = "dev-secret"
-	}
+// createTokenWithTTL issues an access token for admin bound to the refresh
+// token session sessionID, signed with the active JWT key.
+func createTokenWithTTL(admin AdminUser, sessionID int, ttl time.Duration) (string, error) {
 	claims := jwt.MapClaims{
 		"restaurantId": admin.RestaurantID,
 		"email":        admin.Email,
 		"role":         admin.Role,
+		"sid":          sessionID,
 		"exp":          time.Now().Add(ttl).Unix(),
 		"iat":          time.Now().Unix(),
 	}
-	token := jwt.NewWithClaims(jwt.SigningMethodHS256, claims)
-	return token.SignedString([]byte(secret))
+	return jwtKeys.sign(claims)
 }
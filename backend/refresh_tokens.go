@@ -6,6 +6,7 @@ import (
 	"crypto/sha256"
 	"database/sql"
 	"encoding/hex"
+	"errors"
 	"time"
 )
 
@@ -31,9 +32,12 @@ func (s *Store) CreateRefreshToken(ctx context.Context, restaurantID int, email,
 	hash := hashToken(raw)
 	expires := time.Now().Add(expiresIn)
 
+	stmt, err := s.prepared(ctx, createRefreshTokenSQL)
+	if err != nil {
+		return "", 0, err
+	}
 	var id int
-	err = s.DB.QueryRowContext(ctx, "INSERT INTO refresh_tokens (restaurant_id, admin_email, token_hash, created_at, expires_at, ip, user_agent, revoked) VALUES ($1,$2,$3,$4,$5,$6,$7,false) RETURNING id",
-		restaurantID, email, hash, time.Now(), expires, ip, ua).Scan(&id)
+	err = stmt.QueryRowContext(ctx, restaurantID, email, hash, time.Now(), expires, ip, ua).Scan(&id)
 	if err != nil {
 		return "", 0, err
 	}
@@ -54,7 +58,11 @@ type RefreshRow struct {
 func (s *Store) FindRefreshToken(ctx context.Context, raw string) (RefreshRow, error) {
 	var out RefreshRow
 	hash := hashToken(raw)
-	row := s.DB.QueryRowContext(ctx, "SELECT id, restaurant_id, admin_email, created_at, expires_at, revoked, ip, user_agent FROM refresh_tokens WHERE token_hash=$1", hash)
+	stmt, err := s.prepared(ctx, findRefreshTokenSQL)
+	if err != nil {
+		return out, err
+	}
+	row := stmt.QueryRowContext(ctx, hash)
 	if err := row.Scan(&out.ID, &out.RestaurantID, &out.Email, &out.CreatedAt, &out.ExpiresAt, &out.Revoked, &out.IP, &out.UserAgent); err != nil {
 		return out, err
 	}
@@ -62,40 +70,163 @@ func (s *Store) FindRefreshToken(ctx context.Context, raw string) (RefreshRow, e
 }
 
 func (s *Store) RevokeRefreshTokenByID(ctx context.Context, id int) error {
-	_, err := s.DB.ExecContext(ctx, "UPDATE refresh_tokens SET revoked=true WHERE id=$1", id)
+	stmt, err := s.prepared(ctx, revokeRefreshByIDSQL)
+	if err != nil {
+		return err
+	}
+	_, err = stmt.ExecContext(ctx, id)
 	return err
 }
 
 func (s *Store) RevokeRefreshTokenByRaw(ctx context.Context, raw string) error {
 	hash := hashToken(raw)
-	_, err := s.DB.ExecContext(ctx, "UPDATE refresh_tokens SET revoked=true WHERE token_hash=$1", hash)
+	stmt, err := s.prepared(ctx, revokeRefreshByRawSQL)
+	if err != nil {
+		return err
+	}
+	_, err = stmt.ExecContext(ctx, hash)
 	return err
 }
 
-func (s *Store) RotateRefreshToken(ctx context.Context, oldRaw string, ip, ua string, expiresIn time.Duration) (newRaw string, newID int, err error) {
-	found, err := s.FindRefreshToken(ctx, oldRaw)
+var (
+	errRefreshInvalid  = errors.New("invalid refresh token")
+	errRefreshRevoked  = errors.New("refresh token revoked")
+	errRefreshExpired  = errors.New("refresh token expired")
+	errRefreshReplayed = errors.New("refresh token reused")
+	errRefreshConflict = errors.New("refresh token rotated concurrently")
+)
+
+// refreshReuseGrace is how long after a rotation the old token may still be
+// presented (by a second tab racing the first) without counting as replay.
+const refreshReuseGrace = 10 * time.Second
+
+// rotateRefreshSQL revokes the presented token and inserts its successor in
+// one statement, only if the token is live and its admin still exists. The
+// final SELECT reads the presented row as of the statement start, so on
+// failure it also tells why: unknown, revoked, expired or already rotated.
+const rotateRefreshSQL = `
+WITH old AS (
+	UPDATE refresh_tokens SET revoked = true, rotated_at = now()
+	WHERE token_hash = $1 AND revoked = false AND (expires_at IS NULL OR expires_at > now())
+	RETURNING id, restaurant_id, admin_email, COALESCE(family_id, id) AS family_id
+), ins AS (
+	INSERT INTO refresh_tokens (restaurant_id, admin_email, token_hash, created_at, expires_at, ip, user_agent, revoked, rotated_from, family_id)
+	SELECT old.restaurant_id, old.admin_email, $2, now(), $3, $4, $5, false, old.id, old.family_id
+	FROM old JOIN admins a ON a.restaurant_id = old.restaurant_id AND a.email = old.admin_email
+	RETURNING id, restaurant_id, admin_email
+)
+SELECT ins.id, ins.restaurant_id, ins.admin_email, a.role,
+	p.revoked, p.expires_at IS NOT NULL AND p.expires_at <= now(), p.rotated_at, COALESCE(p.family_id, p.id),
+	EXISTS (SELECT 1 FROM refresh_tokens c WHERE c.rotated_from = p.id),
+	EXISTS (SELECT 1 FROM old)
+FROM refresh_tokens p
+LEFT JOIN ins ON true
+LEFT JOIN admins a ON a.restaurant_id = ins.restaurant_id AND a.email = ins.admin_email
+WHERE p.token_hash = $1`
+
+// RotatedSession is the session created by RotateRefreshToken.
+type RotatedSession struct {
+	ID           int
+	RawToken     string
+	RestaurantID int
+	Email        string
+	Role         string
+	// RevokedIDs lists the sessions revoked after a replay.
+	RevokedIDs []int
+}
+
+// RotateRefreshToken exchanges a live refresh token for a new one in a
+// single round-trip. Presenting a token that was already rotated (outside
+// refreshReuseGrace) is treated as theft: the token's whole family is
+// revoked and errRefreshReplayed returned.
+func (s *Store) RotateRefreshToken(ctx context.Context, oldRaw string, ip, ua string, expiresIn time.Duration) (RotatedSession, error) {
+	newRaw, err := generateRandomToken(32)
 	if err != nil {
-		return "", 0, err
+		return RotatedSession{}, err
 	}
-	_ = s.RevokeRefreshTokenByID(ctx, found.ID)
-	newRaw, newID, err = s.CreateRefreshToken(ctx, found.RestaurantID, found.Email, ip, ua, expiresIn)
+	stmt, err := s.prepared(ctx, rotateRefreshSQL)
 	if err != nil {
-		return "", 0, err
+		return RotatedSession{}, err
+	}
+
+	var (
+		newID, restaurantID sql.NullInt64
+		email, role         sql.NullString
+		revoked, expired    bool
+		rotatedAt           sql.NullTime
+		familyID            int
+		rotated, consumed   bool
+	)
+	err = stmt.QueryRowContext(ctx, hashToken(oldRaw), hashToken(newRaw), time.Now().Add(expiresIn), ip, ua).
+		Scan(&newID, &restaurantID, &email, &role, &revoked, &expired, &rotatedAt, &familyID, &rotated, &consumed)
+	if err == sql.ErrNoRows {
+		return RotatedSession{}, errRefreshInvalid
+	}
+	if err != nil {
+		return RotatedSession{}, err
+	}
+	if newID.Valid {
+		return RotatedSession{ID: int(newID.Int64), RawToken: newRaw, RestaurantID: int(restaurantID.Int64), Email: email.String, Role: role.String}, nil
 	}
-	return newRaw, newID, nil
+
+	switch {
+	case consumed:
+		// Revoked, but its admin no longer exists.
+		return RotatedSession{}, errRefreshInvalid
+	case rotated && rotatedAt.Valid && time.Since(rotatedAt.Time) < refreshReuseGrace:
+		return RotatedSession{}, errRefreshConflict
+	case rotated:
+		revoke, err := s.prepared(ctx, revokeFamilySQL)
+		if err != nil {
+			return RotatedSession{}, err
+		}
+		rows, err := revoke.QueryContext(ctx, familyID)
+		if err != nil {
+			return RotatedSession{}, err
+		}
+		defer rows.Close()
+		var out RotatedSession
+		for rows.Next() {
+			var id int
+			if err := rows.Scan(&id); err != nil {
+				return RotatedSession{}, err
+			}
+			out.RevokedIDs = append(out.RevokedIDs, id)
+		}
+		return out, errRefreshReplayed
+	case revoked:
+		return RotatedSession{}, errRefreshRevoked
+	case expired:
+		return RotatedSession{}, errRefreshExpired
+	}
+	// Live when the statement started, but another request rotated it first.
+	return RotatedSession{}, errRefreshConflict
 }
 
-func (s *Store) ListRefreshTokens(ctx context.Context, restaurantID int, emailFilter *string, limit int) ([]RefreshRow, error) {
-	if limit <= 0 {
-		limit = 200
+// RefreshTokenFilter narrows ListRefreshTokens; After continues from a
+// previous page.
+type RefreshTokenFilter struct {
+	Email *string
+	From  *time.Time
+	To    *time.Time
+	After *pageCursor
+	Limit int
+}
+
+// ListRefreshTokens returns sessions newest first using keyset pagination
+// over (created_at, id).
+func (s *Store) ListRefreshTokens(ctx context.Context, restaurantID int, f RefreshTokenFilter) ([]RefreshRow, error) {
+	if f.Limit <= 0 {
+		f.Limit = 200
 	}
-	var rows *sql.Rows
-	var err error
-	if emailFilter == nil {
-		rows, err = s.DB.QueryContext(ctx, "SELECT id, restaurant_id, admin_email, created_at, expires_at, revoked, ip, user_agent FROM refresh_tokens WHERE restaurant_id=$1 ORDER BY created_at DESC LIMIT $2", restaurantID, limit)
-	} else {
-		rows, err = s.DB.QueryContext(ctx, "SELECT id, restaurant_id, admin_email, created_at, expires_at, revoked, ip, user_agent FROM refresh_tokens WHERE restaurant_id=$1 AND admin_email=$2 ORDER BY created_at DESC LIMIT $3", restaurantID, *emailFilter, limit)
+	var q listQuery
+	q.where("restaurant_id = %s", restaurantID)
+	if f.Email != nil {
+		q.where("admin_email = %s", *f.Email)
 	}
+	q.timeRange(f.From, f.To)
+	q.after(f.After)
+	rows, err := s.DB.QueryContext(ctx, q.sql("id, restaurant_id, admin_email, created_at, expires_at, revoked, ip, user_agent", "refresh_tokens", f.Limit), q.args...)
 	if err != nil {
 		return nil, err
 	}
@@ -103,17 +234,10 @@ func (s *Store) ListRefreshTokens(ctx context.Context, restaurantID int, emailFi
 	var out []RefreshRow
 	for rows.Next() {
 		var r RefreshRow
-		_ = rows.Scan(&r.ID, &r.RestaurantID, &r.Email, &r.CreatedAt, &r.ExpiresAt, &r.Revoked, &r.IP, &r.UserAgent)
+		if err := rows.Scan(&r.ID, &r.RestaurantID, &r.Email, &r.CreatedAt, &r.ExpiresAt, &r.Revoked, &r.IP, &r.UserAgent); err != nil {
+			return nil, err
+		}
 		out = append(out, r)
 	}
-	return out, nil
-}
-
-func (s *Store) CleanupExpiredRevokedTokens(ctx context.Context, retentionDays int) (int64, error) {
-	threshold := time.Now().AddDate(0, 0, -retentionDays)
-	res, err := s.DB.ExecContext(ctx, "DELETE FROM refresh_tokens WHERE (revoked = true AND created_at < $1) OR (expires_at IS NOT NULL AND expires_at < $1)", threshold)
-	if err != nil {
-		return 0, err
-	}
-	return res.RowsAffected()
+	return out, rows.Err()
 }
@@ -0,0 +1,236 @@
+package main
+
+import (
+	"container/list"
+	"crypto/sha256"
+	"encoding/hex"
+	"net/http"
+	"os"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// cachedResponse is a fully encoded public response body and its strong
+// ETag. Once the entry is admitted to the cache its gzip and brotli
+// variants are compressed in the background and attached to it.
+type cachedResponse struct {
+	id      int
+	body    []byte
+	etag    string
+	expires time.Time
+
+	variants atomic.Pointer[cachedVariants]
+}
+
+// cachedVariants holds the precompressed bodies of a cachedResponse.
+type cachedVariants struct {
+	gzip, br []byte
+}
+
+// variant returns the precompressed body for encoding, if it is ready.
+func (e *cachedResponse) variant(encoding string) ([]byte, bool) {
+	v := e.variants.Load()
+	if v == nil {
+		return nil, false
+	}
+	switch encoding {
+	case "gzip":
+		return v.gzip, true
+	case "br":
+		return v.br, true
+	}
+	return nil, false
+}
+
+// footprint is the memory held by the entry including its variants.
+func (e *cachedResponse) footprint() int {
+	n := len(e.body)
+	if v := e.variants.Load(); v != nil {
+		n += len(v.gzip) + len(v.br)
+	}
+	return n
+}
+
+func newCachedResponse(id int, body []byte) *cachedResponse {
+	sum := sha256.Sum256(body)
+	return &cachedResponse{id: id, body: body, etag: `"` + hex.EncodeToString(sum[:16]) + `"`}
+}
+
+// restaurantCache keeps the encoded GET /api/restaurants/:id body per
+// restaurant, bounded by total body size (LRU) and a TTL. Writers call
+// Invalidate; the generation counter stops a load that raced with a write
+// from re-populating the cache with stale data.
+type restaurantCache struct {
+	mu       sync.Mutex
+	maxBytes int
+	ttl      time.Duration
+	size     int
+	lru      *list.List
+	entries  map[int]*list.Element
+	gens     map[int]uint64
+}
+
+func newRestaurantCache(maxBytes int, ttl time.Duration) *restaurantCache {
+	return &restaurantCache{
+		maxBytes: maxBytes,
+		ttl:      ttl,
+		lru:      list.New(),
+		entries:  map[int]*list.Element{},
+		gens:     map[int]uint64{},
+	}
+}
+
+// newRestaurantCacheFromEnv reads RESTAURANT_CACHE_MAX_BYTES (default 32MB,
+// 0 disables caching) and RESTAURANT_CACHE_TTL (default 60s).
+func newRestaurantCacheFromEnv() *restaurantCache {
+	maxBytes := 32 << 20
+	if v := os.Getenv("RESTAURANT_CACHE_MAX_BYTES"); v != "" {
+		if n, err := strconv.Atoi(v); err == nil && n >= 0 {
+			maxBytes = n
+		}
+	}
+	ttl := 60 * time.Second
+	if v := os.Getenv("RESTAURANT_CACHE_TTL"); v != "" {
+		if d, err := time.ParseDuration(v); err == nil && d > 0 {
+			ttl = d
+		}
+	}
+	return newRestaurantCache(maxBytes, ttl)
+}
+
+func (c *restaurantCache) Get(id int) (*cachedResponse, bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	el, ok := c.entries[id]
+	if !ok {
+		return nil, false
+	}
+	entry := el.Value.(*cachedResponse)
+	if time.Now().After(entry.expires) {
+		c.removeLocked(el)
+		return nil, false
+	}
+	c.lru.MoveToFront(el)
+	return entry, true
+}
+
+// Generation returns the invalidation generation to pass to Put.
+func (c *restaurantCache) Generation(id int) uint64 {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	return c.gens[id]
+}
+
+// Put stores body for id unless the restaurant was invalidated after gen
+// was read. The returned entry is usable either way.
+func (c *restaurantCache) Put(id int, gen uint64, body []byte) *cachedResponse {
+	entry := newCachedResponse(id, body)
+	if len(body) > c.maxBytes {
+		return entry
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if c.gens[id] != gen {
+		return entry
+	}
+	if el, ok := c.entries[id]; ok {
+		c.removeLocked(el)
+	}
+	entry.expires = time.Now().Add(c.ttl)
+	c.entries[id] = c.lru.PushFront(entry)
+	c.size += entry.footprint()
+	c.evictLocked()
+	if len(body) >= compressMinBytes {
+		go c.precompress(entry)
+	}
+	return entry
+}
+
+// precompress compresses an admitted entry at the highest levels, off the
+// request path, and attaches the variants if the entry is still cached.
+// Until then, requests are compressed by compressHandler.
+func (c *restaurantCache) precompress(entry *cachedResponse) {
+	v := &cachedVariants{gzip: compressBytes("gzip", entry.body), br: compressBytes("br", entry.body)}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if el, ok := c.entries[entry.id]; !ok || el.Value != entry {
+		return
+	}
+	entry.variants.Store(v)
+	c.size += len(v.gzip) + len(v.br)
+	c.evictLocked()
+}
+
+func (c *restaurantCache) evictLocked() {
+	for c.size > c.maxBytes {
+		c.removeLocked(c.lru.Back())
+	}
+}
+
+// Invalidate drops the cached response for a restaurant after a write.
+func (c *restaurantCache) Invalidate(id int) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	c.gens[id]++
+	if el, ok := c.entries[id]; ok {
+		c.removeLocked(el)
+	}
+}
+
+func (c *restaurantCache) removeLocked(el *list.Element) {
+	entry := c.lru.Remove(el).(*cachedResponse)
+	delete(c.entries, entry.id)
+	c.size -= entry.footprint()
+}
+
+// etagMatches reports whether an If-None-Match header matches etag, using
+// the weak comparison RFC 7232 prescribes for If-None-Match. Tags of the
+// compressed variants ("<etag>-gzip", "<etag>-br") match as well.
+func etagMatches(header, etag string) bool {
+	base := strings.TrimSuffix(etag, `"`)
+	for _, tag := range strings.Split(header, ",") {
+		tag = strings.TrimPrefix(strings.TrimSpace(tag), "W/")
+		if tag == "*" || tag == etag || tag == base+`-gzip"` || tag == base+`-br"` {
+			return true
+		}
+	}
+	return false
+}
+
+// writeCachedResponse serves an encoded JSON body with its ETag, answering
+// 304 Not Modified when the client already holds it. Clients that accept
+// gzip or brotli get the precompressed variant when it is ready; otherwise
+// compressHandler compresses the body at its default level.
+func writeCachedResponse(w http.ResponseWriter, r *http.Request, entry *cachedResponse) {
+	h := w.Header()
+	h.Set("Cache-Control", "no-cache")
+	enc := ""
+	if len(entry.body) >= compressMinBytes {
+		h.Add("Vary", "Accept-Encoding")
+		enc = negotiateEncoding(r.Header.Get("Accept-Encoding"))
+	}
+	encodedTag := entry.etag
+	if enc != "" {
+		encodedTag = strings.TrimSuffix(entry.etag, `"`) + "-" + enc + `"`
+	}
+	if inm := r.Header.Get("If-None-Match"); inm != "" && etagMatches(inm, entry.etag) {
+		h.Set("ETag", encodedTag)
+		w.WriteHeader(http.StatusNotModified)
+		return
+	}
+	body := entry.body
+	if variant, ok := entry.variant(enc); ok {
+		body = variant
+		h.Set("ETag", encodedTag)
+		h.Set("Content-Encoding", enc)
+	} else {
+		// compressHandler appends the encoding to the tag if it compresses.
+		h.Set("ETag", entry.etag)
+	}
+	h.Set("Content-Type", "application/json")
+	h.Set("Content-Length", strconv.Itoa(len(body)))
+	w.Write(body)
+}
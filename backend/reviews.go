@@ -0,0 +1,212 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"encoding/json"
+	"net/http"
+	"strings"
+	"time"
+	"unicode/utf8"
+)
+
+// Reviews are rows of restaurant_reviews; review_stats holds each
+// restaurant's count, rating sum and histogram, updated by the same
+// statement that inserts a review (see review_rows_migration.sql). The
+// public document embeds the stats and the newest reviews only.
+
+const (
+	reviewColumns = "id, name, rating, comment, created_at"
+
+	newestReviewsSQL = "SELECT " + reviewColumns + " FROM restaurant_reviews WHERE restaurant_id=$1 ORDER BY created_at DESC, id DESC LIMIT $2"
+	reviewStatsSQL   = "SELECT review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5 FROM review_stats WHERE restaurant_id=$1"
+
+	addReviewSQL = `
+WITH ins AS (
+  INSERT INTO restaurant_reviews (restaurant_id, name, rating, comment) VALUES ($1, $2, $3, $4)
+  RETURNING id, rating
+), stats AS (
+  INSERT INTO review_stats (restaurant_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+  SELECT $1, 1, rating, (rating = 1)::int, (rating = 2)::int, (rating = 3)::int, (rating = 4)::int, (rating = 5)::int FROM ins
+  ON CONFLICT (restaurant_id) DO UPDATE SET
+    review_count = review_stats.review_count + 1,
+    rating_sum = review_stats.rating_sum + EXCLUDED.rating_sum,
+    rating_1 = review_stats.rating_1 + EXCLUDED.rating_1,
+    rating_2 = review_stats.rating_2 + EXCLUDED.rating_2,
+    rating_3 = review_stats.rating_3 + EXCLUDED.rating_3,
+    rating_4 = review_stats.rating_4 + EXCLUDED.rating_4,
+    rating_5 = review_stats.rating_5 + EXCLUDED.rating_5
+)
+SELECT id FROM ins`
+)
+
+// ReviewStats summarizes all of a restaurant's reviews. Histogram[i]
+// counts the reviews rated i+1.
+type ReviewStats struct {
+	Count     int64    `json:"count"`
+	Average   float64  `json:"average"`
+	Histogram [5]int64 `json:"histogram"`
+}
+
+// reviewsInDocument is how many of the newest reviews the public document
+// embeds (REVIEWS_IN_DOCUMENT, default 10).
+func (s *Store) reviewsInDocument() int {
+	if s.ReviewsInDocument > 0 {
+		return s.ReviewsInDocument
+	}
+	return 10
+}
+
+func scanReview(rows *sql.Rows) (Review, error) {
+	var rv Review
+	if err := rows.Scan(&rv.ID, &rv.Name, &rv.Rating, &rv.Comment, &rv.createdAt); err != nil {
+		return rv, err
+	}
+	rv.Date = rv.createdAt.UTC().Format(time.RFC3339)
+	return rv, nil
+}
+
+// NewestReviews returns up to n reviews, newest first.
+func (s *Store) NewestReviews(ctx context.Context, restaurantID, n int) ([]Review, error) {
+	stmt, err := s.prepared(ctx, newestReviewsSQL)
+	if err != nil {
+		return nil, err
+	}
+	rows, err := stmt.QueryContext(ctx, restaurantID, n)
+	if err != nil {
+		return nil, err
+	}
+	defer rows.Close()
+	reviews := []Review{}
+	for rows.Next() {
+		rv, err := scanReview(rows)
+		if err != nil {
+			return nil, err
+		}
+		reviews = append(reviews, rv)
+	}
+	return reviews, rows.Err()
+}
+
+// ReviewStats returns the maintained aggregate; a restaurant without
+// reviews has zero stats.
+func (s *Store) ReviewStats(ctx context.Context, restaurantID int) (ReviewStats, error) {
+	var st ReviewStats
+	stmt, err := s.prepared(ctx, reviewStatsSQL)
+	if err != nil {
+		return st, err
+	}
+	var sum int64
+	h := &st.Histogram
+	err = stmt.QueryRowContext(ctx, restaurantID).Scan(&st.Count, &sum, &h[0], &h[1], &h[2], &h[3], &h[4])
+	if err == sql.ErrNoRows {
+		return st, nil
+	}
+	if err != nil {
+		return st, err
+	}
+	if st.Count > 0 {
+		// Rounded half up to two decimals, as round() does in restaurantDocumentSQL.
+		st.Average = float64((sum*200+st.Count)/(2*st.Count)) / 100
+	}
+	return st, nil
+}
+
+// AddReview stores a review and folds it into review_stats in one
+// statement, returning its id.
+func (s *Store) AddReview(ctx context.Context, restaurantID int, name string, rating int, comment string) (int64, error) {
+	var id int64
+	err := s.DB.QueryRowContext(ctx, addReviewSQL, restaurantID, name, rating, comment).Scan(&id)
+	return id, err
+}
+
+// handleReviews serves /api/reviews/:id. GET pages through the reviews,
+// newest first (limit, cursor); POST submits one.
+func (s *Server) handleReviews(w http.ResponseWriter, r *http.Request) {
+	id, err := getIDFromPath("/api/reviews/", r.URL.Path)
+	if err != nil {
+		http.Error(w, "invalid id", http.StatusBadRequest)
+		return
+	}
+
+	switch r.Method {
+	case http.MethodGet:
+		s.listReviews(w, r, id)
+	case http.MethodPost:
+		if ok, retry := s.throttle.AllowReview(r, id); !ok {
+			writeThrottled(w, retry)
+			return
+		}
+		var review struct {
+			Name    string `json:"name"`
+			Rating  int    `json:"rating"`
+			Comment string `json:"comment"`
+		}
+		if err := json.NewDecoder(r.Body).Decode(&review); err != nil {
+			http.Error(w, "invalid payload", http.StatusBadRequest)
+			return
+		}
+		review.Name = strings.TrimSpace(review.Name)
+		review.Comment = strings.TrimSpace(review.Comment)
+		if review.Rating < 1 || review.Rating > 5 {
+			http.Error(w, "rating must be between 1 and 5", http.StatusBadRequest)
+			return
+		}
+		if review.Name == "" || utf8.RuneCountInString(review.Name) > 100 || utf8.RuneCountInString(review.Comment) > 2000 {
+			http.Error(w, "name (up to 100 characters) and comment (up to 2000) required", http.StatusBadRequest)
+			return
+		}
+
+		reviewID, err := s.store.AddReview(r.Context(), id, review.Name, review.Rating, review.Comment)
+		if err != nil {
+			http.Error(w, "failed to save review", http.StatusInternalServerError)
+			return
+		}
+		s.cache.Invalidate(id)
+		writeJSON(w, map[string]interface{}{"ok": true, "id": reviewID})
+	default:
+		http.Error(w, "only GET/POST allowed", http.StatusMethodNotAllowed)
+	}
+}
+
+func (s *Server) listReviews(w http.ResponseWriter, r *http.Request, id int) {
+	limit, err := parseLimit(r, 20, 100)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	cursor, err := parseCursorParam(r)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	var q listQuery
+	q.where("restaurant_id = %s", id)
+	q.after(cursor)
+	rows, err := s.store.DB.QueryContext(r.Context(), q.sql(reviewColumns, "restaurant_reviews", limit+1), q.args...)
+	if err != nil {
+		http.Error(w, "failed to list reviews", http.StatusInternalServerError)
+		return
+	}
+	defer rows.Close()
+	items := []Review{}
+	for rows.Next() {
+		rv, err := scanReview(rows)
+		if err != nil {
+			http.Error(w, "failed to list reviews", http.StatusInternalServerError)
+			return
+		}
+		items = append(items, rv)
+	}
+	if err := rows.Err(); err != nil {
+		http.Error(w, "failed to list reviews", http.StatusInternalServerError)
+		return
+	}
+	out := page{Items: items}
+	if len(items) > limit {
+		last := items[limit-1]
+		out.Items = items[:limit]
+		out.NextCursor = encodeCursor(pageCursor{CreatedAt: last.createdAt, ID: int(last.ID)})
+	}
+	writeJSON(w, out)
+}
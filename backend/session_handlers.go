@@ -23,17 +23,36 @@ func (s *Server) handleGetSessions(w http.ResponseWriter, r *http.Request, claim
 	role, _ := claims["role"].(string)
 	requesterEmail, _ := claims["email"].(string)
 
-	var rows *sql.Rows
-	if role == "owner" {
-		rows, err = s.store.DB.QueryContext(r.Context(), "SELECT id, admin_email, created_at, expires_at, revoked, ip, user_agent FROM refresh_tokens WHERE restaurant_id=$1 ORDER BY created_at DESC LIMIT 200", restaurantID)
-	} else {
-		rows, err = s.store.DB.QueryContext(r.Context(), "SELECT id, admin_email, created_at, expires_at, revoked, ip, user_agent FROM refresh_tokens WHERE restaurant_id=$1 AND admin_email=$2 ORDER BY created_at DESC LIMIT 200", restaurantID, requesterEmail)
+	filter := RefreshTokenFilter{}
+	if filter.Limit, err = parseLimit(r, 50, 200); err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
 	}
+	if filter.After, err = parseCursorParam(r); err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	if filter.From, err = parseTimeParam(r, "from"); err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	if filter.To, err = parseTimeParam(r, "to"); err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	if role != "owner" {
+		filter.Email = &requesterEmail
+	} else if email := r.URL.Query().Get("email"); email != "" {
+		filter.Email = &email
+	}
+	limit := filter.Limit
+	filter.Limit++
+
+	rows, err := s.store.ListRefreshTokens(r.Context(), restaurantID, filter)
 	if err != nil {
 		http.Error(w, "failed to query sessions", http.StatusInternalServerError)
 		return
 	}
-	defer rows.Close()
 
 	type Sess struct {
 		ID        int        `json:"id"`
@@ -45,20 +64,22 @@ func (s *Server) handleGetSessions(w http.ResponseWriter, r *http.Request, claim
 		UserAgent string     `json:"userAgent"`
 	}
 
-	var out []Sess
-	for rows.Next() {
-		var srec Sess
-		var expires sql.NullTime
-		if err := rows.Scan(&srec.ID, &srec.Email, &srec.CreatedAt, &expires, &srec.Revoked, &srec.IP, &srec.UserAgent); err != nil {
-			http.Error(w, "failed to read row", http.StatusInternalServerError)
-			return
-		}
-		if expires.Valid {
-			srec.ExpiresAt = &expires.Time
+	var next string
+	if len(rows) > limit {
+		rows = rows[:limit]
+		last := rows[limit-1]
+		next = encodeCursor(pageCursor{CreatedAt: last.CreatedAt, ID: last.ID})
+	}
+	out := make([]Sess, 0, len(rows))
+	for _, rec := range rows {
+		srec := Sess{ID: rec.ID, Email: rec.Email, CreatedAt: rec.CreatedAt, Revoked: rec.Revoked, IP: rec.IP, UserAgent: rec.UserAgent}
+		if rec.ExpiresAt.Valid {
+			expires := rec.ExpiresAt.Time
+			srec.ExpiresAt = &expires
 		}
 		out = append(out, srec)
 	}
-	writeJSON(w, out)
+	writeJSON(w, page{Items: out, NextCursor: next})
 }
 
 func (s *Server) handleRevokeSession(w http.ResponseWriter, r *http.Request, claims jwt.MapClaims) {
@@ -102,8 +123,9 @@ func (s *Server) handleRevokeSession(w http.ResponseWriter, r *http.Request, cla
 		http.Error(w, "failed to revoke", http.StatusInternalServerError)
 		return
 	}
+	s.auth.RevokeSessions(rec.ID)
 
-	_ = insertAuditLog(r.Context(), s.store.DB, rec.RestaurantID, requesterEmail, "session_revoked", map[string]any{"revoked_session_id": rec.ID, "revoked_for": rec.Email}, r.RemoteAddr)
+	s.audit.Log(rec.RestaurantID, requesterEmail, "session_revoked", map[string]any{"revoked_session_id": rec.ID, "revoked_for": rec.Email}, r.RemoteAddr)
 
 	writeJSON(w, map[string]any{"ok": true})
 }
@@ -138,19 +160,32 @@ func (s *Server) handleRevokeAllOtherSessions(w http.ResponseWriter, r *http.Req
 		}
 	}
 
-	var res sql.Result
+	var rows *sql.Rows
 	if currentID > 0 {
-		res, err = s.store.DB.ExecContext(r.Context(), "UPDATE refresh_tokens SET revoked=true WHERE restaurant_id=$1 AND admin_email=$2 AND id<>$3 AND revoked=false", restaurantID, email, currentID)
+		rows, err = s.store.DB.QueryContext(r.Context(), "UPDATE refresh_tokens SET revoked=true WHERE restaurant_id=$1 AND admin_email=$2 AND id<>$3 AND revoked=false RETURNING id", restaurantID, email, currentID)
 	} else {
-		res, err = s.store.DB.ExecContext(r.Context(), "UPDATE refresh_tokens SET revoked=true WHERE restaurant_id=$1 AND admin_email=$2 AND revoked=false", restaurantID, email)
+		rows, err = s.store.DB.QueryContext(r.Context(), "UPDATE refresh_tokens SET revoked=true WHERE restaurant_id=$1 AND admin_email=$2 AND revoked=false RETURNING id", restaurantID, email)
 	}
 	if err != nil {
 		http.Error(w, "failed to revoke sessions", http.StatusInternalServerError)
 		return
 	}
-	affected, _ := res.RowsAffected()
+	var revokedIDs []int
+	for rows.Next() {
+		var id int
+		if err := rows.Scan(&id); err == nil {
+			revokedIDs = append(revokedIDs, id)
+		}
+	}
+	rows.Close()
+	if err := rows.Err(); err != nil {
+		http.Error(w, "failed to revoke sessions", http.StatusInternalServerError)
+		return
+	}
+	s.auth.RevokeSessions(revokedIDs...)
+	affected := len(revokedIDs)
 
-	_ = insertAuditLog(r.Context(), s.store.DB, restaurantID, email, "session_revoke_other", map[string]any{"revoked_count": affected}, r.RemoteAddr)
+	s.audit.Log(restaurantID, email, "session_revoke_other", map[string]any{"revoked_count": affected}, r.RemoteAddr)
 
 	writeJSON(w, map[string]any{"ok": true, "revoked": affected})
 }
@@ -4,10 +4,91 @@ import (
 	"context"
 	"database/sql"
 	"encoding/json"
+	"fmt"
+	"sync"
+	"time"
 )
 
 type Store struct {
 	DB *sql.DB
+	// SingleQueryDocument makes RestaurantDocument build the public
+	// document inside Postgres in one round-trip.
+	SingleQueryDocument bool
+	// ReviewsInDocument is how many of the newest reviews the public
+	// document embeds next to the review stats.
+	ReviewsInDocument int
+
+	stmts sync.Map // query -> *sql.Stmt
+}
+
+// Hot read and session queries. They run through prepared statements so
+// Postgres parses and plans them once per pooled connection instead of on
+// every request.
+const (
+	getRestaurantSQL      = "SELECT id, name, story, address, phone, email, hours, social_links, offerings, site_config, menu_version FROM restaurants WHERE id=$1"
+	listMenusSQL          = "SELECT category, items_json FROM menus WHERE restaurant_id=$1 ORDER BY id"
+	getGallerySQL         = "SELECT images, captions FROM galleries WHERE restaurant_id=$1"
+	getAdminByEmailSQL    = "SELECT id, restaurant_id, email, password_hash, role, permissions FROM admins WHERE restaurant_id=$1 AND email=$2"
+	createRefreshTokenSQL = "INSERT INTO refresh_tokens (restaurant_id, admin_email, token_hash, created_at, expires_at, ip, user_agent, revoked) VALUES ($1,$2,$3,$4,$5,$6,$7,false) RETURNING id"
+	findRefreshTokenSQL   = "SELECT id, restaurant_id, admin_email, created_at, expires_at, revoked, ip, user_agent FROM refresh_tokens WHERE token_hash=$1"
+	revokeRefreshByIDSQL  = "UPDATE refresh_tokens SET revoked=true WHERE id=$1"
+	revokeRefreshByRawSQL = "UPDATE refresh_tokens SET revoked=true WHERE token_hash=$1"
+	revokeFamilySQL       = "UPDATE refresh_tokens SET revoked=true WHERE (family_id=$1 OR id=$1) AND revoked=false RETURNING id"
+)
+
+// hotQueries are registered by Prepare at startup so a broken one fails the
+// boot instead of the first request that needs it.
+var hotQueries = []string{
+	getRestaurantSQL, listMenusSQL, getGallerySQL, newestReviewsSQL, reviewStatsSQL, restaurantDocumentSQL,
+	getAdminByEmailSQL, createRefreshTokenSQL, findRefreshTokenSQL,
+	revokeRefreshByIDSQL, revokeRefreshByRawSQL, rotateRefreshSQL, revokeFamilySQL,
+}
+
+// Prepare registers every hot query.
+func (s *Store) Prepare(ctx context.Context) error {
+	for _, q := range hotQueries {
+		if _, err := s.prepared(ctx, q); err != nil {
+			return fmt.Errorf("prepare %.60q: %w", q, err)
+		}
+	}
+	return nil
+}
+
+// PreparedCount reports how many statements are registered.
+func (s *Store) PreparedCount() int {
+	n := 0
+	s.stmts.Range(func(_, _ any) bool {
+		n++
+		return true
+	})
+	return n
+}
+
+// Close closes the registered statements; call it before closing s.DB.
+func (s *Store) Close() {
+	s.stmts.Range(func(k, v any) bool {
+		v.(*sql.Stmt).Close()
+		s.stmts.Delete(k)
+		return true
+	})
+}
+
+// prepared returns query as a statement prepared on s.DB. database/sql
+// prepares it once on each pooled connection that runs it, and again
+// transparently when a connection is replaced.
+func (s *Store) prepared(ctx context.Context, query string) (*sql.Stmt, error) {
+	if st, ok := s.stmts.Load(query); ok {
+		return st.(*sql.Stmt), nil
+	}
+	st, err := s.DB.PrepareContext(ctx, query)
+	if err != nil {
+		return nil, err
+	}
+	if prev, loaded := s.stmts.LoadOrStore(query, st); loaded {
+		st.Close()
+		return prev.(*sql.Stmt), nil
+	}
+	return st, nil
 }
 
 type Restaurant struct {
@@ -21,9 +102,11 @@ type Restaurant struct {
 	SocialLinks []string               `json:"socialLinks"`
 	Offerings   []string               `json:"offerings"`
 	SiteConfig  map[string]interface{} `json:"siteConfig"`
+	MenuVersion int64                  `json:"menuVersion"`
 }
 
 type MenuItem struct {
+	ID        int64   `json:"id,omitempty"`
 	Name      string  `json:"name"`
 	Desc      string  `json:"desc"`
 	Price     float64 `json:"price"`
@@ -42,27 +125,34 @@ type Gallery struct {
 }
 
 type Review struct {
+	ID      int64  `json:"id"`
 	Name    string `json:"name"`
 	Rating  int    `json:"rating"`
 	Comment string `json:"comment"`
 	Date    string `json:"date"`
+
+	createdAt time.Time
 }
 
 type RestaurantData struct {
-	Restaurant Restaurant     `json:"restaurant"`
-	Menus      []MenuCategory `json:"menus"`
-	Galleries  Gallery        `json:"galleries"`
-	Reviews    []Review       `json:"reviews"`
+	Restaurant  Restaurant     `json:"restaurant"`
+	Menus       []MenuCategory `json:"menus"`
+	Galleries   Gallery        `json:"galleries"`
+	Reviews     []Review       `json:"reviews"`
+	ReviewStats ReviewStats    `json:"reviewStats"`
 }
 
 func (s *Store) GetRestaurant(ctx context.Context, id int) (Restaurant, error) {
 	var r Restaurant
 	var socialJSON, offeringsJSON, configJSON []byte
 	
-	row := s.DB.QueryRowContext(ctx, 
-		"SELECT id, name, story, address, phone, email, hours, social_links, offerings, site_config FROM restaurants WHERE id=$1", id)
+	stmt, err := s.prepared(ctx, getRestaurantSQL)
+	if err != nil {
+		return r, err
+	}
+	row := stmt.QueryRowContext(ctx, id)
 	
-	err := row.Scan(&r.ID, &r.Name, &r.Story, &r.Address, &r.Phone, &r.Email, &r.Hours, &socialJSON, &offeringsJSON, &configJSON)
+	err = row.Scan(&r.ID, &r.Name, &r.Story, &r.Address, &r.Phone, &r.Email, &r.Hours, &socialJSON, &offeringsJSON, &configJSON, &r.MenuVersion)
 	if err != nil {
 		return r, err
 	}
@@ -84,7 +174,11 @@ func (s *Store) LoadRestaurantData(ctx context.Context, id int) (RestaurantData,
 	data.Restaurant = rest
 	
 	// Get menus
-	rows, err := s.DB.QueryContext(ctx, "SELECT category, items_json FROM menus WHERE restaurant_id=$1", id)
+	stmt, err := s.prepared(ctx, listMenusSQL)
+	if err != nil {
+		return data, err
+	}
+	rows, err := stmt.QueryContext(ctx, id)
 	if err != nil {
 		return data, err
 	}
@@ -93,29 +187,95 @@ func (s *Store) LoadRestaurantData(ctx context.Context, id int) (RestaurantData,
 	for rows.Next() {
 		var cat MenuCategory
 		var itemsJSON []byte
-		rows.Scan(&cat.Category, &itemsJSON)
+		if err := rows.Scan(&cat.Category, &itemsJSON); err != nil {
+			return data, err
+		}
 		json.Unmarshal(itemsJSON, &cat.Items)
 		data.Menus = append(data.Menus, cat)
 	}
+	if err := rows.Err(); err != nil {
+		return data, err
+	}
 	
 	// Get gallery
 	var imgJSON, capJSON []byte
-	row := s.DB.QueryRowContext(ctx, "SELECT images, captions FROM galleries WHERE restaurant_id=$1", id)
-	if err := row.Scan(&imgJSON, &capJSON); err == nil {
+	if stmt, err = s.prepared(ctx, getGallerySQL); err != nil {
+		return data, err
+	}
+	if err := stmt.QueryRowContext(ctx, id).Scan(&imgJSON, &capJSON); err == nil {
 		json.Unmarshal(imgJSON, &data.Galleries.Images)
 		json.Unmarshal(capJSON, &data.Galleries.Captions)
 	}
 	
-	// Get reviews
-	var revJSON []byte
-	row = s.DB.QueryRowContext(ctx, "SELECT testimonials FROM reviews WHERE restaurant_id=$1", id)
-	if err := row.Scan(&revJSON); err == nil {
-		json.Unmarshal(revJSON, &data.Reviews)
+	// Get the newest reviews and the stats over all of them
+	if data.Reviews, err = s.NewestReviews(ctx, id, s.reviewsInDocument()); err != nil {
+		return data, err
+	}
+	if data.ReviewStats, err = s.ReviewStats(ctx, id); err != nil {
+		return data, err
 	}
 	
 	return data, nil
 }
 
+// restaurantDocumentSQL assembles the same JSON shape as RestaurantData in
+// a single statement. JSONB columns are embedded as stored; $2 is the
+// number of newest reviews to embed.
+const restaurantDocumentSQL = `
+SELECT json_build_object(
+  'restaurant', json_build_object(
+    'id', r.id, 'name', r.name, 'story', r.story, 'address', r.address,
+    'phone', r.phone, 'email', r.email, 'hours', r.hours,
+    'socialLinks', r.social_links, 'offerings', r.offerings, 'siteConfig', r.site_config,
+    'menuVersion', r.menu_version),
+  'menus', (SELECT json_agg(json_build_object('category', m.category, 'items', m.items_json) ORDER BY m.id)
+            FROM menus m WHERE m.restaurant_id = r.id),
+  'galleries', json_build_object('images', g.images, 'captions', g.captions),
+  'reviews', (SELECT COALESCE(json_agg(json_build_object('id', v.id, 'name', v.name, 'rating', v.rating, 'comment', v.comment,
+                'date', to_char(v.created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"Z"')) ORDER BY v.created_at DESC, v.id DESC), '[]')
+              FROM (SELECT * FROM restaurant_reviews WHERE restaurant_id = r.id ORDER BY created_at DESC, id DESC LIMIT $2) v),
+  'reviewStats', json_build_object(
+    'count', COALESCE(rs.review_count, 0),
+    'average', COALESCE(round(rs.rating_sum::numeric / NULLIF(rs.review_count, 0), 2), 0),
+    'histogram', json_build_array(COALESCE(rs.rating_1, 0), COALESCE(rs.rating_2, 0), COALESCE(rs.rating_3, 0),
+                                  COALESCE(rs.rating_4, 0), COALESCE(rs.rating_5, 0)))
+)::text
+FROM restaurants r
+LEFT JOIN galleries g ON g.restaurant_id = r.id
+LEFT JOIN review_stats rs ON rs.restaurant_id = r.id
+WHERE r.id = $1`
+
+// LoadRestaurantDocument returns the encoded public document built by
+// Postgres, without decoding it into RestaurantData.
+func (s *Store) LoadRestaurantDocument(ctx context.Context, id int) ([]byte, error) {
+	stmt, err := s.prepared(ctx, restaurantDocumentSQL)
+	if err != nil {
+		return nil, err
+	}
+	var doc []byte
+	if err := stmt.QueryRowContext(ctx, id, s.reviewsInDocument()).Scan(&doc); err != nil {
+		return nil, err
+	}
+	return append(doc, '\n'), nil
+}
+
+// RestaurantDocument returns the encoded GET /api/restaurants/:id body
+// using the configured storage mode.
+func (s *Store) RestaurantDocument(ctx context.Context, id int) ([]byte, error) {
+	if s.SingleQueryDocument {
+		return s.LoadRestaurantDocument(ctx, id)
+	}
+	data, err := s.LoadRestaurantData(ctx, id)
+	if err != nil {
+		return nil, err
+	}
+	body, err := json.Marshal(data)
+	if err != nil {
+		return nil, err
+	}
+	return append(body, '\n'), nil
+}
+
 type AdminUser struct {
 	ID           int      `json:"id"`
 	RestaurantID int      `json:"restaurantId"`
@@ -129,11 +289,13 @@ func (s *Store) GetAdminByEmail(ctx context.Context, restaurantID int, email str
 	var admin AdminUser
 	var permsJSON []byte
 	
-	row := s.DB.QueryRowContext(ctx, 
-		"SELECT id, restaurant_id, email, password_hash, role, permissions FROM admins WHERE restaurant_id=$1 AND email=$2",
-		restaurantID, email)
+	stmt, err := s.prepared(ctx, getAdminByEmailSQL)
+	if err != nil {
+		return admin, err
+	}
+	row := stmt.QueryRowContext(ctx, restaurantID, email)
 	
-	err := row.Scan(&admin.ID, &admin.RestaurantID, &admin.Email, &admin.PasswordHash, &admin.Role, &permsJSON)
+	err = row.Scan(&admin.ID, &admin.RestaurantID, &admin.Email, &admin.PasswordHash, &admin.Role, &permsJSON)
 	if err != nil {
 		return admin, err
 	}
@@ -141,3 +303,10 @@ func (s *Store) GetAdminByEmail(ctx context.Context, restaurantID int, email str
 	json.Unmarshal(permsJSON, &admin.Permissions)
 	return admin, nil
 }
+
+// UpdateAdminPasswordHash replaces oldHash with newHash, leaving the row
+// alone if the password changed in the meantime.
+func (s *Store) UpdateAdminPasswordHash(ctx context.Context, id int, oldHash, newHash string) error {
+	_, err := s.DB.ExecContext(ctx, "UPDATE admins SET password_hash=$1 WHERE id=$2 AND password_hash=$3", newHash, id, oldHash)
+	return err
+}
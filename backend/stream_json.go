@@ -0,0 +1,183 @@
+package main
+
+import (
+	"bufio"
+	"database/sql"
+	"encoding/json"
+	"net/http"
+	"strings"
+	"sync"
+	"time"
+)
+
+// Rows are flushed to the client every streamFlushRows rows.
+const streamFlushRows = 200
+
+var streamBufPool = sync.Pool{New: func() any { return bufio.NewWriterSize(nil, 32<<10) }}
+
+// wantsNDJSON reports whether the client asked for newline-delimited JSON
+// via ?format=ndjson or the Accept header.
+func wantsNDJSON(r *http.Request) bool {
+	return r.URL.Query().Get("format") == "ndjson" || strings.Contains(r.Header.Get("Accept"), "application/x-ndjson")
+}
+
+// rowStream writes rows to the response as they are read from sql.Rows,
+// either inside the {"items": [...], "nextCursor": ...} page envelope or as
+// NDJSON, where the next cursor follows the rows as a final
+// {"nextCursor": ...} line (and in the X-Next-Cursor trailer).
+type rowStream struct {
+	w       http.ResponseWriter
+	bw      *bufio.Writer
+	enc     *json.Encoder
+	ndjson  bool
+	rows    int
+	flusher http.Flusher
+}
+
+func newRowStream(w http.ResponseWriter, ndjson bool) *rowStream {
+	bw := streamBufPool.Get().(*bufio.Writer)
+	bw.Reset(w)
+	s := &rowStream{w: w, bw: bw, enc: json.NewEncoder(bw), ndjson: ndjson}
+	s.flusher, _ = w.(http.Flusher)
+	if ndjson {
+		w.Header().Set("Content-Type", "application/x-ndjson")
+		w.Header().Set("Trailer", "X-Next-Cursor")
+	} else {
+		w.Header().Set("Content-Type", "application/json")
+	}
+	return s
+}
+
+// Begin writes raw JSON that precedes the rows. prefix must end where an
+// array value can start; for the page envelope pass "".
+func (s *rowStream) Begin(prefix string) {
+	if s.ndjson {
+		s.bw.WriteString(prefix)
+		return
+	}
+	if prefix == "" {
+		prefix = `{"items":`
+	}
+	s.bw.WriteString(prefix)
+	s.bw.WriteByte('[')
+}
+
+// Row encodes one row.
+func (s *rowStream) Row(v any) error {
+	if !s.ndjson && s.rows > 0 {
+		s.bw.WriteByte(',')
+	}
+	if err := s.enc.Encode(v); err != nil {
+		return err
+	}
+	s.rows++
+	if s.rows%streamFlushRows == 0 {
+		s.Flush()
+	}
+	return nil
+}
+
+func (s *rowStream) Flush() {
+	s.bw.Flush()
+	if s.flusher != nil {
+		s.flusher.Flush()
+	}
+}
+
+// End closes the array, writing suffix (for the page envelope, the
+// nextCursor field) and releases the buffer.
+func (s *rowStream) End(suffix string, nextCursor string) error {
+	if s.ndjson {
+		s.bw.WriteString(suffix)
+		if nextCursor != "" {
+			s.enc.Encode(map[string]string{"nextCursor": nextCursor})
+			s.w.Header().Set("X-Next-Cursor", nextCursor)
+		}
+	} else {
+		s.bw.WriteByte(']')
+		if suffix != "" {
+			s.bw.WriteString(suffix)
+		} else {
+			if nextCursor != "" {
+				s.bw.WriteString(`,"nextCursor":`)
+				s.enc.Encode(nextCursor)
+			}
+			s.bw.WriteByte('}')
+		}
+	}
+	err := s.bw.Flush()
+	s.bw.Reset(nil)
+	streamBufPool.Put(s.bw)
+	s.bw = nil
+	return err
+}
+
+// orderRow is one order as returned by the admin list and export endpoints.
+// JSONB columns pass through as raw JSON. Nullable columns are coalesced in
+// the select list, since a NULL would fail the scan mid-stream.
+type orderRow struct {
+	ID            int             `json:"id"`
+	Items         json.RawMessage `json:"items"`
+	Total         float64         `json:"total"`
+	Status        string          `json:"status"`
+	CreatedAt     time.Time       `json:"createdAt"`
+	CustomerName  string          `json:"customerName"`
+	CustomerPhone string          `json:"customerPhone"`
+	CustomerEmail string          `json:"customerEmail"`
+	Notes         string          `json:"notes"`
+}
+
+const orderRowColumns = "id, COALESCE(items_json, '[]'::jsonb), COALESCE(total, 0), COALESCE(status, ''), created_at, " +
+	"COALESCE(customer_name, ''), COALESCE(customer_phone, ''), COALESCE(customer_email, ''), COALESCE(notes, '')"
+
+// auditRow is one audit_log entry.
+type auditRow struct {
+	ID        int             `json:"id"`
+	Email     string          `json:"email"`
+	Action    string          `json:"action"`
+	Payload   json.RawMessage `json:"payload"`
+	IP        string          `json:"ip"`
+	CreatedAt time.Time       `json:"createdAt"`
+}
+
+const auditRowColumns = "id, COALESCE(admin_email, ''), action, COALESCE(payload, 'null'::jsonb), COALESCE(ip, ''), created_at"
+
+// streamOrders writes each order row to stream. With limit > 0 the query is
+// expected to fetch limit+1 rows; the extra row only signals that another
+// page exists and the returned cursor points past the last row written.
+func streamOrders(rows *sql.Rows, stream *rowStream, limit int) (string, error) {
+	var row orderRow
+	var items sql.RawBytes
+	for rows.Next() {
+		if limit > 0 && stream.rows == limit {
+			return encodeCursor(pageCursor{CreatedAt: row.CreatedAt, ID: row.ID}), nil
+		}
+		if err := rows.Scan(&row.ID, &items, &row.Total, &row.Status, &row.CreatedAt, &row.CustomerName, &row.CustomerPhone, &row.CustomerEmail, &row.Notes); err != nil {
+			return "", err
+		}
+		row.Items = json.RawMessage(items)
+		if err := stream.Row(&row); err != nil {
+			return "", err
+		}
+	}
+	return "", rows.Err()
+}
+
+// streamAuditRows is streamOrders for audit_log rows.
+func streamAuditRows(rows *sql.Rows, stream *rowStream, limit int) (string, error) {
+	var row auditRow
+	var payload sql.RawBytes
+	for rows.Next() {
+		if limit > 0 && stream.rows == limit {
+			return encodeCursor(pageCursor{CreatedAt: row.CreatedAt, ID: row.ID}), nil
+		}
+		if err := rows.Scan(&row.ID, &row.Email, &row.Action, &payload, &row.IP, &row.CreatedAt); err != nil {
+			return "", err
+		}
+		row.Payload = json.RawMessage(payload)
+		if err := stream.Row(&row); err != nil {
+			return "", err
+		}
+	}
+	return "", rows.Err()
+}
@@ -0,0 +1,75 @@
+package main
+
+import (
+	"context"
+	"fmt"
+	"time"
+)
+
+// tokenCleanupRule is one condition under which rows of a token table are
+// deleted. Every rule matches a partial index from
+// token_cleanup_indexes_migration.sql.
+type tokenCleanupRule struct {
+	Name  string
+	Table string
+	Where string // $1 is the retention threshold
+}
+
+var tokenCleanupRules = []tokenCleanupRule{
+	{"refresh_tokens expired", "refresh_tokens", "expires_at IS NOT NULL AND expires_at < $1"},
+	{"refresh_tokens revoked", "refresh_tokens", "revoked = true AND created_at < $1"},
+	{"password_resets expired", "password_resets", "expires_at IS NOT NULL AND expires_at < $1"},
+	{"password_resets used", "password_resets", "used_at IS NOT NULL AND used_at < $1"},
+	{"admin_invitations expired", "admin_invitations", "accepted_at IS NULL AND expires_at IS NOT NULL AND expires_at < $1"},
+	{"admin_invitations accepted", "admin_invitations", "accepted_at IS NOT NULL AND accepted_at < $1"},
+	{"outbound_emails sent", "outbound_emails", "status = 'sent' AND sent_at < $1"},
+	{"outbound_emails failed", "outbound_emails", "status = 'failed' AND created_at < $1"},
+}
+
+// deleteSQL removes up to $2 matching rows, skipping rows another
+// transaction holds (a refresh being rotated, say) instead of waiting.
+func (c tokenCleanupRule) deleteSQL() string {
+	return fmt.Sprintf("DELETE FROM %[1]s WHERE id IN (SELECT id FROM %[1]s WHERE %[2]s LIMIT $2 FOR UPDATE SKIP LOCKED)", c.Table, c.Where)
+}
+
+// cleanupBatched deletes the rows matching rule in batches of batch,
+// pausing between them so each lock is short and the index and WAL load
+// is spread out.
+func (s *Store) cleanupBatched(ctx context.Context, rule tokenCleanupRule, threshold time.Time, batch int, pause time.Duration) (int64, error) {
+	query := rule.deleteSQL()
+	var total int64
+	for {
+		res, err := s.DB.ExecContext(ctx, query, threshold, batch)
+		if err != nil {
+			return total, err
+		}
+		n, _ := res.RowsAffected()
+		total += n
+		if n < int64(batch) {
+			return total, nil
+		}
+		select {
+		case <-ctx.Done():
+			return total, ctx.Err()
+		case <-time.After(pause):
+		}
+	}
+}
+
+// CleanupExpiredRevokedTokens deletes refresh tokens that are revoked or
+// expired and older than retentionDays, 1000 rows at a time.
+func (s *Store) CleanupExpiredRevokedTokens(ctx context.Context, retentionDays int) (int64, error) {
+	threshold := time.Now().AddDate(0, 0, -retentionDays)
+	var total int64
+	for _, rule := range tokenCleanupRules {
+		if rule.Table != "refresh_tokens" {
+			continue
+		}
+		n, err := s.cleanupBatched(ctx, rule, threshold, 1000, 50*time.Millisecond)
+		total += n
+		if err != nil {
+			return total, err
+		}
+	}
+	return total, nil
+}
@@ -0,0 +1,42 @@
+-- Newsletters composed by owners and their per-recipient delivery state.
+-- A send snapshots the subscriber list at compose time (max_subscriber_id)
+-- and walks it by id: each chunk is copied into newsletter_deliveries and
+-- cursor_subscriber_id advanced in one statement, so a restarted backend
+-- resumes with the pending rows and the rest of the list. locked_until is
+-- the sending replica's lease.
+CREATE TABLE IF NOT EXISTS newsletters (
+  id SERIAL PRIMARY KEY,
+  restaurant_id INT NOT NULL REFERENCES restaurants(id) ON DELETE CASCADE,
+  subject TEXT NOT NULL,
+  body TEXT NOT NULL,
+  created_by TEXT,
+  status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'sending', 'done', 'cancelled')),
+  max_subscriber_id INT NOT NULL DEFAULT 0,
+  cursor_subscriber_id INT NOT NULL DEFAULT 0,
+  total INT NOT NULL DEFAULT 0,
+  sent INT NOT NULL DEFAULT 0,
+  failed INT NOT NULL DEFAULT 0,
+  locked_until TIMESTAMP WITH TIME ZONE,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  started_at TIMESTAMP WITH TIME ZONE,
+  finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_newsletters_restaurant_created ON newsletters(restaurant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_newsletters_active ON newsletters(created_at, id) WHERE status IN ('queued', 'sending');
+
+CREATE TABLE IF NOT EXISTS newsletter_deliveries (
+  newsletter_id INT NOT NULL REFERENCES newsletters(id) ON DELETE CASCADE,
+  subscriber_id INT NOT NULL,
+  email TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  last_error TEXT,
+  sent_at TIMESTAMP WITH TIME ZONE,
+  PRIMARY KEY (newsletter_id, subscriber_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_newsletter_deliveries_pending ON newsletter_deliveries(newsletter_id, subscriber_id) WHERE status = 'pending';
+
+-- Keyset walk over one restaurant's subscribers.
+CREATE INDEX IF NOT EXISTS idx_subscribers_restaurant_id ON subscribers(restaurant_id, id);
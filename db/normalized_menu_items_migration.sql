@@ -0,0 +1,41 @@
+-- One row per menu item with a stable id and position within its category.
+--
+-- menus keeps one row per (restaurant_id, category); its items_json becomes
+-- a projection rebuilt from menu_items by the backend whenever a category's
+-- items change, so the public restaurant document reads it as before.
+-- restaurants.menu_version is bumped on every menu change.
+
+CREATE TABLE IF NOT EXISTS menu_items (
+  id BIGSERIAL PRIMARY KEY,
+  restaurant_id INT NOT NULL REFERENCES restaurants(id),
+  category TEXT NOT NULL,
+  position INT NOT NULL,
+  name TEXT NOT NULL DEFAULT '',
+  description TEXT NOT NULL DEFAULT '',
+  price NUMERIC(10,2) NOT NULL DEFAULT 0,
+  img TEXT NOT NULL DEFAULT '',
+  available BOOLEAN NOT NULL DEFAULT false,
+  updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_menu_items_restaurant_category ON menu_items(restaurant_id, category, position);
+
+ALTER TABLE restaurants ADD COLUMN IF NOT EXISTS menu_version BIGINT NOT NULL DEFAULT 0;
+
+-- Backfill categories that have no rows yet from their items_json.
+INSERT INTO menu_items (restaurant_id, category, position, name, description, price, img, available)
+SELECT m.restaurant_id, m.category, e.ord,
+       COALESCE(e.item->>'name', ''), COALESCE(e.item->>'desc', ''),
+       COALESCE((e.item->>'price')::numeric, 0), COALESCE(e.item->>'img', ''),
+       COALESCE((e.item->>'available')::boolean, false)
+FROM menus m
+CROSS JOIN LATERAL jsonb_array_elements(COALESCE(m.items_json, '[]'::jsonb)) WITH ORDINALITY AS e(item, ord)
+WHERE m.restaurant_id IS NOT NULL AND m.category IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM menu_items i WHERE i.restaurant_id = m.restaurant_id AND i.category = m.category);
+
+-- Re-project items_json so every item carries its id.
+UPDATE menus m SET items_json = (
+  SELECT COALESCE(jsonb_agg(jsonb_build_object('id', i.id, 'name', i.name, 'desc', i.description, 'price', i.price,
+                                               'img', i.img, 'available', i.available) ORDER BY i.position, i.id), '[]'::jsonb)
+  FROM menu_items i WHERE i.restaurant_id = m.restaurant_id AND i.category = m.category)
+WHERE m.restaurant_id IS NOT NULL AND m.category IS NOT NULL;
@@ -0,0 +1,21 @@
+-- Durable outbound email queue. Handlers insert a row and return; the
+-- backend's email workers claim due rows with FOR UPDATE SKIP LOCKED, send
+-- them over pooled SMTP sessions and reschedule failures with backoff.
+-- A 'sending' row whose locked_until has passed belongs to a crashed
+-- worker and is claimed again.
+CREATE TABLE IF NOT EXISTS outbound_emails (
+  id BIGSERIAL PRIMARY KEY,
+  recipient TEXT NOT NULL,
+  subject TEXT NOT NULL,
+  body TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sending', 'sent', 'failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  locked_until TIMESTAMP WITH TIME ZONE,
+  last_error TEXT,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbound_emails_due ON outbound_emails(next_attempt_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_outbound_emails_sending ON outbound_emails(locked_until) WHERE status = 'sending';
@@ -0,0 +1,9 @@
+-- Last media export manifest per restaurant and target, used as the
+-- baseline for delta exports (handleExportMedia with mode=delta).
+CREATE TABLE IF NOT EXISTS media_export_manifests (
+  restaurant_id INT NOT NULL REFERENCES restaurants(id) ON DELETE CASCADE,
+  target TEXT NOT NULL,
+  manifest JSONB NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+  PRIMARY KEY (restaurant_id, target)
+);
@@ -0,0 +1,67 @@
+-- One row per review plus a per-restaurant aggregate.
+--
+-- review_stats is updated by the statement that inserts a review (see
+-- addReviewSQL in backend/reviews.go), so the public document reads the
+-- count, average and histogram without scanning reviews. The legacy
+-- reviews.testimonials arrays are copied once and no longer read.
+
+CREATE TABLE IF NOT EXISTS restaurant_reviews (
+  id BIGSERIAL PRIMARY KEY,
+  restaurant_id INT NOT NULL REFERENCES restaurants(id),
+  name TEXT NOT NULL,
+  rating SMALLINT NOT NULL CHECK (rating BETWEEN 1 AND 5),
+  comment TEXT NOT NULL DEFAULT '',
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_restaurant_reviews_restaurant_created ON restaurant_reviews(restaurant_id, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS review_stats (
+  restaurant_id INT PRIMARY KEY REFERENCES restaurants(id),
+  review_count BIGINT NOT NULL DEFAULT 0,
+  rating_sum BIGINT NOT NULL DEFAULT 0,
+  rating_1 BIGINT NOT NULL DEFAULT 0,
+  rating_2 BIGINT NOT NULL DEFAULT 0,
+  rating_3 BIGINT NOT NULL DEFAULT 0,
+  rating_4 BIGINT NOT NULL DEFAULT 0,
+  rating_5 BIGINT NOT NULL DEFAULT 0
+);
+
+-- Legacy dates are free text; one that looks like a date but is not valid
+-- ("2023-13-45") must not abort the copy.
+CREATE OR REPLACE FUNCTION pg_temp.legacy_review_date(v TEXT) RETURNS TIMESTAMPTZ AS $$
+BEGIN
+  RETURN v::timestamptz;
+EXCEPTION WHEN others THEN
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Copy testimonials of restaurants that have no review rows yet. Numeric
+-- ratings are rounded and clamped to 1..5, anything else ("5 stars") counts
+-- as 5; entries without a valid date get the migration time.
+INSERT INTO restaurant_reviews (restaurant_id, name, rating, comment, created_at)
+SELECT rv.restaurant_id,
+       COALESCE(NULLIF(t.item->>'name', ''), 'Guest'),
+       CASE WHEN t.item->>'rating' ~ '^\s*[-+]?[0-9]+(\.[0-9]+)?\s*$'
+            THEN LEAST(5, GREATEST(1, round((t.item->>'rating')::numeric)))
+            ELSE 5 END::smallint,
+       COALESCE(t.item->>'comment', ''),
+       COALESCE(CASE WHEN t.item->>'date' ~ '^\d{4}-\d{2}-\d{2}' THEN pg_temp.legacy_review_date(t.item->>'date') END, now())
+FROM reviews rv
+CROSS JOIN LATERAL jsonb_array_elements(COALESCE(rv.testimonials, '[]'::jsonb)) WITH ORDINALITY AS t(item, ord)
+WHERE rv.restaurant_id IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM restaurant_reviews x WHERE x.restaurant_id = rv.restaurant_id)
+ORDER BY rv.restaurant_id, t.ord;
+
+-- Rebuild the aggregate from the rows.
+INSERT INTO review_stats (restaurant_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+SELECT restaurant_id, count(*), sum(rating),
+       count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2), count(*) FILTER (WHERE rating = 3),
+       count(*) FILTER (WHERE rating = 4), count(*) FILTER (WHERE rating = 5)
+FROM restaurant_reviews
+GROUP BY restaurant_id
+ON CONFLICT (restaurant_id) DO UPDATE SET
+  review_count = EXCLUDED.review_count, rating_sum = EXCLUDED.rating_sum,
+  rating_1 = EXCLUDED.rating_1, rating_2 = EXCLUDED.rating_2, rating_3 = EXCLUDED.rating_3,
+  rating_4 = EXCLUDED.rating_4, rating_5 = EXCLUDED.rating_5;
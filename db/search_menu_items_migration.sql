@@ -0,0 +1,17 @@
+-- Indexes for GET /api/menus/:id/search over menu_items.
+--
+-- search is a generated tsvector (name weighted above description), so it
+-- is kept current by every menu write without backend changes. Trigram
+-- indexes serve substring and fuzzy matches (ILIKE '%...%', similarity),
+-- and the btree index serves price filters within a restaurant.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS search tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', name), 'A') || setweight(to_tsvector('english', description), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_menu_items_search ON menu_items USING gin (search);
+CREATE INDEX IF NOT EXISTS idx_menu_items_name_trgm ON menu_items USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_menu_items_description_trgm ON menu_items USING gin (description gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_menu_items_restaurant_price ON menu_items(restaurant_id, price, id);
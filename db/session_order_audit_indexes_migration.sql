@@ -0,0 +1,10 @@
+-- Composite indexes backing the keyset-paginated admin lists
+-- (ORDER BY created_at DESC, id DESC per restaurant) and their filters.
+CREATE INDEX IF NOT EXISTS idx_orders_restaurant_created ON orders(restaurant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_restaurant_status_created ON orders(restaurant_id, status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_restaurant_created ON audit_log(restaurant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_restaurant_email_created ON audit_log(restaurant_id, admin_email, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_restaurant_created ON refresh_tokens(restaurant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_restaurant_email_created ON refresh_tokens(restaurant_id, admin_email, created_at DESC, id DESC);
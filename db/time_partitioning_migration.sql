@@ -0,0 +1,110 @@
+-- Monthly range partitioning of orders and audit_log by created_at.
+--
+-- Partitions are named <table>_pYYYYMM and cover one UTC calendar month;
+-- rows outside every monthly partition land in <table>_default. The
+-- backend calls ensure_monthly_partitions daily to create upcoming months,
+-- and scripts/archive_partitions.go detaches, archives and drops months past
+-- retention, recording them in archived_partitions.
+--
+-- Partitioned tables need the partition key in the primary key, so the key
+-- becomes (id, created_at) and created_at NOT NULL. The id sequences are
+-- kept and re-owned by the new tables, so pg_get_serial_sequence (used by
+-- the order ingester) and existing ids carry over.
+
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent TEXT, from_month DATE, months_ahead INT) RETURNS INT AS $$
+DECLARE
+  m DATE := date_trunc('month', from_month)::date;
+  last_month DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => months_ahead))::date;
+  part TEXT;
+  created INT := 0;
+BEGIN
+  WHILE m <= last_month LOOP
+    part := format('%s_p%s', parent, to_char(m, 'YYYYMM'));
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        part, parent, m::timestamp AT TIME ZONE 'UTC', (m + interval '1 month')::timestamp AT TIME ZONE 'UTC');
+      created := created + 1;
+    END IF;
+    m := (m + interval '1 month')::date;
+  END LOOP;
+  RETURN created;
+END
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  first_month DATE;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('orders')) = 'r' THEN
+    ALTER TABLE orders RENAME TO orders_unpartitioned;
+    ALTER INDEX IF EXISTS orders_pkey RENAME TO orders_unpartitioned_pkey;
+    CREATE TABLE orders (
+      id INT NOT NULL DEFAULT nextval('orders_id_seq'),
+      restaurant_id INT REFERENCES restaurants(id),
+      items_json JSONB,
+      total NUMERIC(10,2),
+      status TEXT,
+      created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+      customer_name TEXT,
+      customer_phone TEXT,
+      customer_address TEXT,
+      customer_email TEXT,
+      notes TEXT,
+      PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE orders_id_seq OWNED BY orders.id;
+    CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+
+    SELECT COALESCE(min(created_at AT TIME ZONE 'UTC')::date, (now() AT TIME ZONE 'UTC')::date) INTO first_month FROM orders_unpartitioned;
+    PERFORM ensure_monthly_partitions('orders', first_month, 3);
+    -- Rows without a timestamp predate ingestion setting one; keep them at the epoch.
+    INSERT INTO orders (id, restaurant_id, items_json, total, status, created_at, customer_name, customer_phone, customer_address, customer_email, notes)
+      SELECT id, restaurant_id, items_json, total, status, COALESCE(created_at, 'epoch'), customer_name, customer_phone, customer_address, customer_email, notes
+      FROM orders_unpartitioned;
+    DROP TABLE orders_unpartitioned;
+  END IF;
+
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_log')) = 'r' THEN
+    ALTER TABLE audit_log RENAME TO audit_log_unpartitioned;
+    ALTER INDEX IF EXISTS audit_log_pkey RENAME TO audit_log_unpartitioned_pkey;
+    CREATE TABLE audit_log (
+      id INT NOT NULL DEFAULT nextval('audit_log_id_seq'),
+      restaurant_id INT REFERENCES restaurants(id),
+      admin_email TEXT,
+      action TEXT NOT NULL,
+      payload JSONB,
+      ip TEXT,
+      created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+      PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id;
+    CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT;
+
+    SELECT COALESCE(min(created_at AT TIME ZONE 'UTC')::date, (now() AT TIME ZONE 'UTC')::date) INTO first_month FROM audit_log_unpartitioned;
+    PERFORM ensure_monthly_partitions('audit_log', first_month, 3);
+    INSERT INTO audit_log (id, restaurant_id, admin_email, action, payload, ip, created_at)
+      SELECT id, restaurant_id, admin_email, action, payload, ip, COALESCE(created_at, 'epoch')
+      FROM audit_log_unpartitioned;
+    DROP TABLE audit_log_unpartitioned;
+  END IF;
+END
+$$;
+
+-- Same names as session_order_audit_indexes_migration.sql; created on the
+-- parents they cascade to every partition.
+CREATE INDEX IF NOT EXISTS idx_orders_restaurant_created ON orders(restaurant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_restaurant_status_created ON orders(restaurant_id, status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_restaurant_created ON audit_log(restaurant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_restaurant_email_created ON audit_log(restaurant_id, admin_email, created_at DESC, id DESC);
+
+-- Months moved out of the database. path is relative to ARCHIVE_DIR.
+CREATE TABLE IF NOT EXISTS archived_partitions (
+  parent TEXT NOT NULL,
+  month DATE NOT NULL,
+  path TEXT NOT NULL,
+  row_count BIGINT NOT NULL,
+  bytes BIGINT NOT NULL,
+  sha256 TEXT NOT NULL,
+  archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  PRIMARY KEY (parent, month)
+);
@@ -0,0 +1,16 @@
+-- Partial indexes for the batched token cleanup (scripts/cleanup_refresh_tokens.go).
+-- Each cleanup condition has its own index so a batch reads only the rows
+-- it deletes. Built CONCURRENTLY so applying this does not block logins;
+-- psql runs each statement in its own transaction, as CONCURRENTLY needs.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_refresh_tokens_expires ON refresh_tokens(expires_at) WHERE expires_at IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_refresh_tokens_revoked_created ON refresh_tokens(created_at) WHERE revoked = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_password_resets_expires ON password_resets(expires_at) WHERE expires_at IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_password_resets_used ON password_resets(used_at) WHERE used_at IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_admin_invitations_open_expires ON admin_invitations(expires_at) WHERE accepted_at IS NULL AND expires_at IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_admin_invitations_accepted ON admin_invitations(accepted_at) WHERE accepted_at IS NOT NULL;
+
+-- Delivered and failed emails keep reset and invite links in their body.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_outbound_emails_sent ON outbound_emails(sent_at) WHERE status = 'sent';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_outbound_emails_failed ON outbound_emails(created_at) WHERE status = 'failed';
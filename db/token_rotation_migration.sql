@@ -0,0 +1,9 @@
+-- Refresh token rotation lineage for Store.RotateRefreshToken: each rotated
+-- token records the row it replaced and the session family it belongs to,
+-- so presenting an already-rotated token can revoke the whole family.
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS rotated_from INT REFERENCES refresh_tokens(id) ON DELETE SET NULL;
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS rotated_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS family_id INT;
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_rotated_from ON refresh_tokens(rotated_from);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family ON refresh_tokens(family_id) WHERE family_id IS NOT NULL;
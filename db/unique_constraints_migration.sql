@@ -0,0 +1,5 @@
+-- Unique keys targeted by the ON CONFLICT clauses in create_admin.go,
+-- handleInviteAdmin, handleAcceptInvite and handlePasswordResetRequest.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_admins_restaurant_email ON admins(restaurant_id, email);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_admin_invitations_restaurant_email ON admin_invitations(restaurant_id, email);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_password_resets_admin_email_unique ON password_resets(admin_email);
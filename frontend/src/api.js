@@ -20,6 +20,15 @@ export function postSubscribe(restaurantId, email) {
 export function postReview(restaurantId, review) {
   return API.post(`/reviews/${restaurantId}`, review).then(r => r.data);
 }
+// Older reviews than the ones embedded in fetchRestaurant: params { limit, cursor }; returns { items, nextCursor }.
+export function fetchReviews(restaurantId, params = {}) {
+  return API.get(`/reviews/${restaurantId}`, { params }).then(r => r.data);
+}
+
+// Menu search: params { q, category, minPrice, maxPrice, available, limit, cursor }; returns { items, nextCursor }.
+export function searchMenu(restaurantId, params = {}) {
+  return API.get(`/menus/${restaurantId}/search`, { params }).then(r => r.data);
+}
 
 export function login(restaurantId, email, password) {
   return API.post("/login", { restaurantId, email, password }).then(r => r.data);
@@ -29,12 +38,18 @@ export function verify(token) {
   return API.get("/verify", { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
 
-export function adminGetOrders(restaurantId, token) {
-  return API.get(`/admin/orders/${restaurantId}`, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+// List endpoints return { items, nextCursor }; pass nextCursor back as params.cursor for the next page.
+export function adminGetOrders(restaurantId, token, params = {}) {
+  return API.get(`/admin/orders/${restaurantId}`, { params, headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
 export function adminUpdateMenus(restaurantId, payload, token) {
   return API.post(`/menus/${restaurantId}`, payload, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
+// Change single items or toggle availability in bulk without re-posting the menu:
+// { items: [{ id, price }] } or { ids: [...], available: false }. Returns { changed, version }.
+export function adminPatchMenuItems(restaurantId, payload, token) {
+  return API.patch(`/admin/menu_items/${restaurantId}`, payload, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
 export function adminPatchRestaurant(restaurantId, payload, token) {
   return API.post(`/restaurants_patch/${restaurantId}`, payload, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
@@ -60,12 +75,12 @@ export function logout() {
   return API.post("/logout").then(r => r.data);
 }
 
-export function adminGetAudit(restaurantId, token) {
-  return API.get(`/admin/audit/${restaurantId}`, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+export function adminGetAudit(restaurantId, token, params = {}) {
+  return API.get(`/admin/audit/${restaurantId}`, { params, headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
 
-export function adminGetSessions(restaurantId, token) {
-  return API.get(`/admin/sessions/${restaurantId}`, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+export function adminGetSessions(restaurantId, token, params = {}) {
+  return API.get(`/admin/sessions/${restaurantId}`, { params, headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
 export function adminRevokeSession(sessionId, token) {
   return API.post(`/admin/sessions/revoke`, { sessionId }, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
@@ -83,5 +98,30 @@ export function adminExportMedia(restaurantId, token) {
 export function adminExportMediaToS3(restaurantId, payload, token) {
   return API.post(`/admin/export_media/${restaurantId}`, payload, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
 }
+// Background media exports: start returns { id, job }; poll the status until
+// state is "done", then download (supports Range for resuming).
+export function adminStartExportJob(restaurantId, payload, token) {
+  return API.post(`/admin/export_jobs/${restaurantId}`, payload, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
+export function adminGetExportJob(restaurantId, jobId, token) {
+  return API.get(`/admin/export_jobs/${restaurantId}/${jobId}`, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
+export function adminDownloadExportJob(restaurantId, jobId, token) {
+  return API.get(`/admin/export_jobs/${restaurantId}/${jobId}/download`, { headers: { Authorization: "Bearer " + token }, responseType: "blob" }).then(r => r.data);
+}
+
+// Newsletters: send returns { id, recipients }; poll the newsletter for sent/failed counts.
+export function adminSendNewsletter(restaurantId, payload, token) {
+  return API.post(`/admin/newsletters/${restaurantId}`, payload, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
+export function adminGetNewsletters(restaurantId, token, params = {}) {
+  return API.get(`/admin/newsletters/${restaurantId}`, { params, headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
+export function adminGetNewsletter(restaurantId, newsletterId, token) {
+  return API.get(`/admin/newsletters/${restaurantId}/${newsletterId}`, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
+export function adminCancelNewsletter(restaurantId, newsletterId, token) {
+  return API.delete(`/admin/newsletters/${restaurantId}/${newsletterId}`, { headers: { Authorization: "Bearer " + token } }).then(r => r.data);
+}
 
 export default API;
@@ -0,0 +1,63 @@
+package main
+
+// Usage: go run scripts/bcrypt_cost.go --target 250ms --workers 4
+// Times bcrypt at each cost on this host and suggests the highest
+// BCRYPT_COST whose median hash time stays within --target. Also prints the
+// logins per second BCRYPT_WORKERS workers can sustain at each cost, which
+// bounds how much CPU a login burst can take from the rest of the server.
+
+import (
+	"flag"
+	"fmt"
+	"log"
+	"runtime"
+	"sort"
+	"time"
+
+	"golang.org/x/crypto/bcrypt"
+)
+
+func median(d []time.Duration) time.Duration {
+	sort.Slice(d, func(i, j int) bool { return d[i] < d[j] })
+	return d[len(d)/2]
+}
+
+func main() {
+	target := flag.Duration("target", 250*time.Millisecond, "maximum acceptable hash time per login")
+	minCost := flag.Int("min", 8, "lowest cost to try")
+	maxCost := flag.Int("max", 15, "highest cost to try")
+	samples := flag.Int("samples", 5, "hashes per cost")
+	workers := flag.Int("workers", runtime.NumCPU()/2, "BCRYPT_WORKERS to estimate throughput for")
+	flag.Parse()
+	if *workers < 1 {
+		*workers = 1
+	}
+
+	password := []byte("correct horse battery staple")
+	best := 0
+	fmt.Printf("%-6s %12s %16s\n", "cost", "median", "logins/s")
+	for cost := *minCost; cost <= *maxCost; cost++ {
+		times := make([]time.Duration, 0, *samples)
+		for i := 0; i < *samples; i++ {
+			start := time.Now()
+			if _, err := bcrypt.GenerateFromPassword(password, cost); err != nil {
+				log.Fatal(err)
+			}
+			times = append(times, time.Since(start))
+		}
+		m := median(times)
+		fmt.Printf("%-6d %12s %16.1f\n", cost, m.Round(time.Millisecond), float64(*workers)/m.Seconds())
+		if m <= *target {
+			best = cost
+		}
+		// Each step doubles the work; stop once well past the target.
+		if m > 2**target {
+			break
+		}
+	}
+	if best == 0 {
+		fmt.Printf("\nno cost from %d fits %s; use BCRYPT_COST=%d and more CPU\n", *minCost, *target, *minCost)
+		return
+	}
+	fmt.Printf("\nBCRYPT_COST=%d\n", best)
+}
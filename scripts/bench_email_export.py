@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+bench_email_export.py
+
+Local stand-ins for the SMTP server used by sendEmail (implicit TLS, as
+email.go dials with tls.Dial) and for S3 (enough of the API for GetObject,
+PutObject and the multipart uploads done by the export upload manager),
+plus a driver that benchmarks the invite, password-reset and
+export-to-S3 flows against a running backend.
+
+Usage:
+  # 1. start the stand-ins and print the env the backend needs
+  python scripts/bench_email_export.py serve
+
+  # 2. start the backend with that env, then drive the flows
+  python scripts/bench_email_export.py run --api http://localhost:8080/api \\
+      --restaurant 1 --email owner@example.com --password 'StrongPass123' \\
+      --concurrency 8 --requests 50
+
+  # or let the tool start the backend itself with the right env
+  python scripts/bench_email_export.py run --backend-cmd "go run ." \\
+      --backend-dir backend --restaurant 1 --email ... --password ...
+
+Only the Python standard library and the `openssl` CLI (to create the
+self-signed certificate) are needed. The backend trusts the certificate
+through SSL_CERT_FILE, so remote https image sources will not verify
+while it is set.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+# ─── TLS ────────────────────────────────────────────────────────────────
+
+def make_self_signed_cert(workdir):
+    """Create a localhost certificate/key pair with openssl and return their paths."""
+    cert = os.path.join(workdir, "localhost.crt")
+    key = os.path.join(workdir, "localhost.key")
+    if shutil.which("openssl") is None:
+        sys.exit("openssl not found; it is needed to create the SMTP certificate")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2",
+         "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+# ─── SMTP sink ──────────────────────────────────────────────────────────
+
+class SMTPSink:
+    """Implicit-TLS SMTP server that accepts AUTH PLAIN/LOGIN and records every message."""
+
+    def __init__(self, host, port, cert, key):
+        self.host = host
+        self.port = port
+        self.ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.ssl_ctx.load_cert_chain(cert, key)
+        self.lock = threading.Lock()
+        self.messages = []  # (received_at, rcpts, subject, size)
+        self.sessions = 0
+        self.loop = None
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            server = self.loop.run_until_complete(
+                asyncio.start_server(self._session, self.host, self.port, ssl=self.ssl_ctx))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+
+    async def _session(self, reader, writer):
+        with self.lock:
+            self.sessions += 1
+
+        async def reply(line):
+            writer.write((line + "\r\n").encode())
+            await writer.drain()
+
+        await reply("220 localhost ESMTP bench sink")
+        mail_from, rcpts = None, []
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                verb = line.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    writer.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n")
+                    await reply("250 SIZE 52428800")
+                elif verb == "HELO":
+                    await reply("250 localhost")
+                elif verb == "AUTH":
+                    parts = line.split()
+                    if len(parts) >= 2 and parts[1].upper() == "LOGIN":
+                        await reply("334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await reply("334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    elif len(parts) == 2:
+                        await reply("334 ")
+                        await reader.readline()
+                    await reply("235 2.7.0 Authentication successful")
+                elif verb == "MAIL":
+                    mail_from, rcpts = line[10:].strip(), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    rcpts.append(line[8:].strip().strip("<>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    size, subject = 0, ""
+                    while True:
+                        chunk = await reader.readline()
+                        if not chunk or chunk in (b".\r\n", b".\n"):
+                            break
+                        size += len(chunk)
+                        if not subject and chunk[:8].lower() == b"subject:":
+                            subject = chunk[8:].decode("utf-8", "replace").strip()
+                    with self.lock:
+                        self.messages.append((time.monotonic(), list(rcpts), subject, size))
+                    mail_from, rcpts = None, []
+                    await reply("250 OK queued")
+                elif verb == "RSET":
+                    mail_from, rcpts = None, []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.messages), self.sessions
+
+
+# ─── S3 stand-in ────────────────────────────────────────────────────────
+
+def decode_aws_chunked(body):
+    """Strip aws-chunked framing (streaming signatures and trailing checksums)."""
+    out, pos = bytearray(), 0
+    while pos < len(body):
+        eol = body.index(b"\r\n", pos)
+        size = int(body[pos:eol].split(b";", 1)[0], 16)
+        pos = eol + 2
+        if size == 0:
+            break
+        out += body[pos:pos + size]
+        pos += size + 2
+    return bytes(out)
+
+
+class S3State:
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.objects = {}  # (bucket, key) -> (path, etag, size, mtime)
+        self.uploads = {}  # upload id -> {part number: (path, etag, size)}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.requests = 0
+        self.completed_uploads = 0
+
+    def path_for(self, name):
+        return os.path.join(self.root, name)
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by start_s3
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _target(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        parts = parsed.path.lstrip("/").split("/", 1)
+        bucket = urllib.parse.unquote(parts[0])
+        key = urllib.parse.unquote(parts[1]) if len(parts) > 1 else ""
+        return bucket, key, urllib.parse.parse_qs(parsed.query, keep_blank_values=True)
+
+    def _read_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0], 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+            body = bytes(body)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        sha = self.headers.get("x-amz-content-sha256", "")
+        if "aws-chunked" in self.headers.get("Content-Encoding", "") or sha.startswith("STREAMING-"):
+            body = decode_aws_chunked(body)
+        return body
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _xml(self, status, inner):
+        body = ('<?xml version="1.0" encoding="UTF-8"?>' + inner).encode()
+        self._send(status, body, {"Content-Type": "application/xml"})
+
+    def _error(self, status, code):
+        self._xml(status, f"<Error><Code>{code}</Code><Message>{code}</Message></Error>")
+
+    def _store(self, data):
+        path = self.state.path_for(uuid.uuid4().hex)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def do_PUT(self):
+        bucket, key, q = self._target()
+        data = self._read_body()
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        st = self.state
+        with st.lock:
+            st.requests += 1
+            st.bytes_in += len(data)
+        if "uploadId" in q and "partNumber" in q:
+            upload_id, part = q["uploadId"][0], int(q["partNumber"][0])
+            path = self._store(data)
+            with st.lock:
+                if upload_id not in st.uploads:
+                    return self._error(404, "NoSuchUpload")
+                st.uploads[upload_id][part] = (path, etag, len(data))
+            return self._send(200, headers={"ETag": etag})
+        path = self._store(data)
+        with st.lock:
+            st.objects[(bucket, key)] = (path, etag, len(data), time.time())
+        self._send(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        bucket, key, q = self._target()
+        self._read_body()
+        st = self.state
+        with st.lock:
+            st.requests += 1
+        if "uploads" in q:
+            upload_id = uuid.uuid4().hex
+            with st.lock:
+                st.uploads[upload_id] = {}
+            return self._xml(200, f'<InitiateMultipartUploadResult xmlns="{S3_NS}"><Bucket>{bucket}</Bucket>'
+                                  f"<Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        if "uploadId" in q:
+            upload_id = q["uploadId"][0]
+            with st.lock:
+                parts = st.uploads.pop(upload_id, None)
+            if parts is None:
+                return self._error(404, "NoSuchUpload")
+            path, md5s, size = self.state.path_for(uuid.uuid4().hex), b"", 0
+            with open(path, "wb") as out:
+                for n in sorted(parts):
+                    ppath, petag, psize = parts[n]
+                    with open(ppath, "rb") as f:
+                        shutil.copyfileobj(f, out)
+                    os.remove(ppath)
+                    md5s += bytes.fromhex(petag.strip('"'))
+                    size += psize
+            etag = '"%s-%d"' % (hashlib.md5(md5s).hexdigest(), len(parts))
+            with st.lock:
+                st.objects[(bucket, key)] = (path, etag, size, time.time())
+                st.completed_uploads += 1
+            return self._xml(200, f'<CompleteMultipartUploadResult xmlns="{S3_NS}"><Location>/{bucket}/{key}</Location>'
+                                  f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>{etag}</ETag>"
+                                  "</CompleteMultipartUploadResult>")
+        self._error(400, "InvalidRequest")
+
+    def do_DELETE(self):
+        bucket, key, q = self._target()
+        st = self.state
+        with st.lock:
+            st.requests += 1
+            if "uploadId" in q:
+                for path, _, _ in st.uploads.pop(q["uploadId"][0], {}).values():
+                    os.remove(path)
+            else:
+                obj = st.objects.pop((bucket, key), None)
+                if obj:
+                    os.remove(obj[0])
+        self._send(204)
+
+    def do_GET(self):
+        bucket, key, _ = self._target()
+        st = self.state
+        with st.lock:
+            st.requests += 1
+            obj = st.objects.get((bucket, key))
+        if obj is None:
+            return self._error(404, "NoSuchKey")
+        path, etag, size, mtime = obj
+        headers = {"ETag": etag, "Last-Modified": formatdate(mtime, usegmt=True)}
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers=headers)
+        if self.command == "HEAD":
+            self.send_response(200)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        with st.lock:
+            st.bytes_out += len(data)
+        self._send(200, data, headers)
+
+    do_HEAD = do_GET
+
+
+def start_s3(host, port, root):
+    state = S3State(root)
+    handler = type("BoundS3Handler", (S3Handler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+# ─── Driver ─────────────────────────────────────────────────────────────
+
+def backend_env(smtp, s3_server, cert):
+    return {
+        "SMTP_HOST": "localhost",
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_USER": "bench",
+        "SMTP_PASS": "bench",
+        "SMTP_FROM": "bench@localhost",
+        "SSL_CERT_FILE": cert,
+        "S3_ENDPOINT": "http://127.0.0.1:%d" % s3_server.server_address[1],
+        "AWS_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+    }
+
+
+def call(api, method, path, payload=None, token=None, timeout=300):
+    """Perform one API call; returns (status, seconds, response body bytes)."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(api.rstrip("/") + path, data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", "Bearer " + token)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        body, status = e.read(), e.code
+    except (urllib.error.URLError, OSError) as e:
+        body, status = str(e).encode(), 0
+    return status, time.perf_counter() - start, body
+
+
+def wait_for_backend(api, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status, _, _ = call(api, "GET", "/verify", timeout=2)
+        if status:
+            return
+        time.sleep(0.5)
+    sys.exit(f"backend at {api} did not come up within {timeout}s")
+
+
+def login(args):
+    status, _, body = call(args.api, "POST", "/login", {
+        "restaurantId": args.restaurant, "email": args.email, "password": args.password})
+    if status != 200:
+        sys.exit(f"login failed ({status}): {body[:200]!r}")
+    return json.loads(body)["token"]
+
+
+def run_flow(name, n, concurrency, fn):
+    """Run fn(i) n times on a thread pool; returns a per-flow result dict."""
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for res in pool.map(fn, range(n)):
+            results.append(res)
+    elapsed = time.perf_counter() - start
+    lat = sorted(r[1] for r in results)
+    ok = sum(1 for r in results if 200 <= r[0] < 300)
+    return {
+        "flow": name,
+        "requests": n,
+        "ok": ok,
+        "errors": n - ok,
+        "seconds": elapsed,
+        "throughput_rps": n / elapsed if elapsed else 0.0,
+        "latency_ms": summarize(lat),
+        "response_bytes": sum(len(r[2]) for r in results),
+        "started_at": start,
+    }
+
+
+def summarize(samples):
+    if not samples:
+        return {}
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+    return {
+        "min": samples[0] * 1000,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": samples[-1] * 1000,
+        "mean": statistics.fmean(samples) * 1000,
+    }
+
+
+def email_delivery(sink, before, flow_start, matcher, expected, wait):
+    """Wait for `expected` matching messages and report delivery throughput/latency."""
+    deadline = time.monotonic() + wait
+    while True:
+        msgs = [m for m in sink.snapshot()[0][before:] if matcher(m)]
+        if len(msgs) >= expected or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+    if not msgs:
+        return {"delivered": 0, "expected": expected}
+    t0 = time.monotonic() - (time.perf_counter() - flow_start)
+    arrivals = sorted(m[0] - t0 for m in msgs)
+    span = arrivals[-1] or 1e-9
+    return {
+        "delivered": len(msgs),
+        "expected": expected,
+        "throughput_msgs_per_s": len(msgs) / span,
+        "first_delivery_ms": arrivals[0] * 1000,
+        "last_delivery_ms": arrivals[-1] * 1000,
+        "bytes": sum(m[3] for m in msgs),
+    }
+
+
+def drive(args, sink, s3_state):
+    token = login(args)
+    report = {"smtp_sessions_before": sink.snapshot()[1], "flows": []}
+    run_id = uuid.uuid4().hex[:8]
+
+    if "invite" in args.flows:
+        before = len(sink.snapshot()[0])
+        res = run_flow("invite", args.requests, args.concurrency, lambda i: call(
+            args.api, "POST", f"/admin/invite/{args.restaurant}",
+            {"email": f"bench-{run_id}-{i}@example.test", "role": "chef"}, token))
+        res["email"] = email_delivery(sink, before, res["started_at"],
+                                      lambda m: any(run_id in r for r in m[1]), args.requests, args.email_wait)
+        report["flows"].append(res)
+
+    if "reset" in args.flows:
+        before = len(sink.snapshot()[0])
+        res = run_flow("password_reset", args.requests, args.concurrency, lambda i: call(
+            args.api, "POST", "/admin/password_reset/request",
+            {"restaurantId": args.restaurant, "email": args.email}))
+        res["email"] = email_delivery(sink, before, res["started_at"],
+                                      lambda m: args.email in m[1], args.requests, args.email_wait)
+        report["flows"].append(res)
+
+    if "export" in args.flows:
+        with s3_state.lock:
+            in_before, up_before = s3_state.bytes_in, s3_state.completed_uploads
+        res = run_flow("export_s3", args.exports, min(args.concurrency, args.exports), lambda i: call(
+            args.api, "POST", f"/admin/export_media/{args.restaurant}",
+            {"target": "s3", "bucket": args.bucket, "keyPrefix": f"bench/{run_id}/{i}"}, token))
+        with s3_state.lock:
+            moved = s3_state.bytes_in - in_before
+            res["s3"] = {
+                "bytes_uploaded": moved,
+                "multipart_uploads": s3_state.completed_uploads - up_before,
+                "upload_mb_per_s": moved / res["seconds"] / 1e6 if res["seconds"] else 0.0,
+                "source_bytes_served": s3_state.bytes_out,
+            }
+        report["flows"].append(res)
+
+    report["smtp_sessions_after"] = sink.snapshot()[1]
+    for f in report["flows"]:
+        f.pop("started_at", None)
+    return report
+
+
+def print_report(report):
+    for f in report["flows"]:
+        lat = f["latency_ms"]
+        print(f"\n== {f['flow']} ==")
+        print(f"  requests {f['requests']}  ok {f['ok']}  errors {f['errors']}  "
+              f"{f['throughput_rps']:.1f} req/s over {f['seconds']:.2f}s")
+        if lat:
+            print(f"  latency ms  p50 {lat['p50']:.1f}  p95 {lat['p95']:.1f}  p99 {lat['p99']:.1f}  max {lat['max']:.1f}")
+        if "email" in f:
+            e = f["email"]
+            line = f"  email delivered {e['delivered']}/{e['expected']}"
+            if e.get("delivered"):
+                line += (f"  {e['throughput_msgs_per_s']:.1f} msg/s  last at {e['last_delivery_ms']:.0f} ms"
+                         f"  {e['bytes']} bytes")
+            print(line)
+        if "s3" in f:
+            s = f["s3"]
+            print(f"  s3 uploaded {s['bytes_uploaded']} bytes ({s['upload_mb_per_s']:.2f} MB/s), "
+                  f"{s['multipart_uploads']} multipart uploads")
+    print(f"\nSMTP sessions opened: {report['smtp_sessions_after'] - report['smtp_sessions_before']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("mode", choices=["serve", "run"])
+    ap.add_argument("--smtp-port", type=int, default=2465)
+    ap.add_argument("--s3-port", type=int, default=9090)
+    ap.add_argument("--api", default="http://localhost:8080/api")
+    ap.add_argument("--restaurant", type=int, default=1)
+    ap.add_argument("--email", default="")
+    ap.add_argument("--password", default="")
+    ap.add_argument("--flows", default="invite,reset,export", help="comma separated: invite,reset,export")
+    ap.add_argument("--requests", type=int, default=50, help="requests per email flow")
+    ap.add_argument("--exports", type=int, default=4, help="export-to-S3 requests")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--bucket", default="bench-exports")
+    ap.add_argument("--email-wait", type=float, default=60, help="seconds to wait for queued emails")
+    ap.add_argument("--backend-cmd", default="", help="start the backend with the stand-in env")
+    ap.add_argument("--backend-dir", default=".")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args()
+    args.flows = set(x.strip() for x in args.flows.split(",") if x.strip())
+
+    workdir = tempfile.mkdtemp(prefix="resto-bench-")
+    cert, key = make_self_signed_cert(workdir)
+    os.makedirs(os.path.join(workdir, "s3"))
+    sink = SMTPSink("127.0.0.1", args.smtp_port, cert, key)
+    sink.start()
+    s3_server, s3_state = start_s3("127.0.0.1", args.s3_port, os.path.join(workdir, "s3"))
+    env = backend_env(sink, s3_server, cert)
+
+    print(f"✓ SMTP sink (implicit TLS) on 127.0.0.1:{sink.port}")
+    print(f"✓ S3 stand-in on http://127.0.0.1:{s3_server.server_address[1]}")
+    print("Backend environment:")
+    for k, v in env.items():
+        print(f"  export {k}={shlex.quote(v)}")
+
+    backend = None
+    try:
+        if args.mode == "serve":
+            while True:
+                time.sleep(5)
+                msgs, sessions = sink.snapshot()
+                print(f"  smtp: {len(msgs)} messages / {sessions} sessions   "
+                      f"s3: {s3_state.requests} requests, {s3_state.bytes_in} bytes in")
+
+        if not args.email or not args.password:
+            sys.exit("--email and --password of an owner account are required for run")
+        if args.backend_cmd:
+            backend = subprocess.Popen(shlex.split(args.backend_cmd), cwd=args.backend_dir,
+                                       env={**os.environ, **env})
+            wait_for_backend(args.api, 120)
+        report = drive(args, sink, s3_state)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=10)
+        s3_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
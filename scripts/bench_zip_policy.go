@@ -0,0 +1,167 @@
+package main
+
+// Usage: go run scripts/bench_zip_policy.go --images 200 --width 1600 --height 1067 --level 6
+//        go run scripts/bench_zip_policy.go --dir ./frontend/public/images
+// Compares deflating every media archive entry (the old zw.Create path) with
+// the per-entry policy used by the export: Store for compressed media,
+// Deflate at EXPORT_ZIP_LEVEL for manifest.json. Without --dir it encodes a
+// synthetic gallery of JPEGs. Reports CPU time, wall time and archive size.
+
+import (
+	"archive/zip"
+	"bytes"
+	"compress/flate"
+	"encoding/json"
+	"flag"
+	"fmt"
+	"image"
+	"image/color"
+	"image/jpeg"
+	"io"
+	"log"
+	"math/rand"
+	"os"
+	"path/filepath"
+	"strings"
+	"syscall"
+	"time"
+)
+
+type entry struct {
+	name string
+	data []byte
+}
+
+func syntheticGallery(n, width, height int) []entry {
+	rng := rand.New(rand.NewSource(1))
+	var out []entry
+	for i := 0; i < n; i++ {
+		img := image.NewRGBA(image.Rect(0, 0, width, height))
+		r0, g0, b0 := rng.Intn(256), rng.Intn(256), rng.Intn(256)
+		for y := 0; y < height; y++ {
+			for x := 0; x < width; x++ {
+				noise := rng.Intn(24)
+				img.Set(x, y, color.RGBA{
+					uint8((r0 + x/7 + noise) % 256),
+					uint8((g0 + y/5 + noise) % 256),
+					uint8((b0 + (x+y)/11 + noise) % 256),
+					255,
+				})
+			}
+		}
+		var buf bytes.Buffer
+		if err := jpeg.Encode(&buf, img, &jpeg.Options{Quality: 85}); err != nil {
+			log.Fatal(err)
+		}
+		out = append(out, entry{name: fmt.Sprintf("galleries/%03d_photo.jpg", i), data: buf.Bytes()})
+	}
+	return out
+}
+
+func loadDir(dir string) []entry {
+	var out []entry
+	err := filepath.Walk(dir, func(p string, info os.FileInfo, err error) error {
+		if err != nil || info.IsDir() {
+			return err
+		}
+		b, err := os.ReadFile(p)
+		if err != nil {
+			return err
+		}
+		rel, _ := filepath.Rel(dir, p)
+		out = append(out, entry{name: filepath.ToSlash(rel), data: b})
+		return nil
+	})
+	if err != nil {
+		log.Fatal(err)
+	}
+	return out
+}
+
+func manifest(entries []entry) []byte {
+	var m []map[string]any
+	for _, e := range entries {
+		m = append(m, map[string]any{"zip": e.name, "source": "https://cdn.example.com/" + e.name, "kind": "gallery", "bytes": len(e.data), "fetchMs": 12})
+	}
+	b, _ := json.MarshalIndent(m, "", "  ")
+	return b
+}
+
+var storedExts = map[string]bool{".jpg": true, ".jpeg": true, ".png": true, ".gif": true, ".webp": true}
+
+func cpuTime() time.Duration {
+	var ru syscall.Rusage
+	syscall.Getrusage(syscall.RUSAGE_SELF, &ru)
+	return time.Duration(ru.Utime.Nano() + ru.Stime.Nano())
+}
+
+type countingWriter struct{ n int64 }
+
+func (c *countingWriter) Write(p []byte) (int, error) { c.n += int64(len(p)); return len(p), nil }
+
+func run(entries []entry, man []byte, level int, policy bool) (cpu, wall time.Duration, size int64) {
+	cw := &countingWriter{}
+	zw := zip.NewWriter(cw)
+	zw.RegisterCompressor(zip.Deflate, func(out io.Writer) (io.WriteCloser, error) {
+		return flate.NewWriter(out, level)
+	})
+	c0, w0 := cpuTime(), time.Now()
+	add := func(name string, data []byte) {
+		fh := &zip.FileHeader{Name: name, Method: zip.Deflate}
+		if policy && storedExts[strings.ToLower(filepath.Ext(name))] {
+			fh.Method = zip.Store
+		}
+		fw, err := zw.CreateHeader(fh)
+		if err != nil {
+			log.Fatal(err)
+		}
+		fw.Write(data)
+	}
+	for _, e := range entries {
+		add(e.name, e.data)
+	}
+	add("manifest.json", man)
+	zw.Close()
+	return cpuTime() - c0, time.Since(w0), cw.n
+}
+
+func main() {
+	n := flag.Int("images", 200, "synthetic gallery size")
+	width := flag.Int("width", 1600, "synthetic image width")
+	height := flag.Int("height", 1067, "synthetic image height")
+	dir := flag.String("dir", "", "use the images in this directory instead")
+	level := flag.Int("level", 6, "deflate level")
+	iterations := flag.Int("iterations", 3, "runs per mode")
+	flag.Parse()
+
+	var entries []entry
+	if *dir != "" {
+		entries = loadDir(*dir)
+	} else {
+		fmt.Printf("encoding %d synthetic %dx%d JPEGs...\n", *n, *width, *height)
+		entries = syntheticGallery(*n, *width, *height)
+	}
+	var raw int64
+	for _, e := range entries {
+		raw += int64(len(e.data))
+	}
+	man := manifest(entries)
+	fmt.Printf("%d entries, %.1f MB of media, %d KB manifest\n\n", len(entries), float64(raw)/1e6, len(man)/1024)
+
+	fmt.Printf("%-14s %12s %12s %14s\n", "mode", "cpu", "wall", "archive bytes")
+	for _, mode := range []struct {
+		name   string
+		policy bool
+	}{{"deflate-all", false}, {"store-media", true}} {
+		var cpu, wall time.Duration
+		var size int64
+		for i := 0; i < *iterations; i++ {
+			c, w, s := run(entries, man, *level, mode.policy)
+			cpu += c
+			wall += w
+			size = s
+		}
+		it := time.Duration(*iterations)
+		fmt.Printf("%-14s %12s %12s %14d\n", mode.name, (cpu / it).Round(time.Millisecond), (wall / it).Round(time.Millisecond), size)
+	}
+}
@@ -1,21 +1,50 @@
 package main
 
-// Usage: go run scripts/cleanup_refresh_tokens.go --retention 30
-// Deletes revoked or expired refresh tokens older than retention days.
+// Usage: go run scripts/cleanup_refresh_tokens.go --retention 30 --batch 1000 --sleep 100ms
+// Deletes revoked or expired refresh tokens, expired or used password
+// resets, expired or accepted admin invitations, and sent or failed
+// outbound emails (which hold reset and invite links) older than retention
+// days. Rows go in batches of --batch with --sleep between them, so each
+// DELETE holds its locks briefly and logins are not held up; rows locked
+// by a running request are skipped until the next run. Needs the indexes
+// in db/token_cleanup_indexes_migration.sql.
 
 import (
+	"context"
 	"database/sql"
 	"flag"
 	"fmt"
 	"log"
 	"os"
+	"os/signal"
+	"syscall"
 	"time"
 
 	_ "github.com/lib/pq"
 )
 
+type rule struct {
+	name  string
+	table string
+	where string // $1 is the retention threshold
+}
+
+// Keep in sync with tokenCleanupRules in backend/token_cleanup.go.
+var rules = []rule{
+	{"refresh_tokens expired", "refresh_tokens", "expires_at IS NOT NULL AND expires_at < $1"},
+	{"refresh_tokens revoked", "refresh_tokens", "revoked = true AND created_at < $1"},
+	{"password_resets expired", "password_resets", "expires_at IS NOT NULL AND expires_at < $1"},
+	{"password_resets used", "password_resets", "used_at IS NOT NULL AND used_at < $1"},
+	{"admin_invitations expired", "admin_invitations", "accepted_at IS NULL AND expires_at IS NOT NULL AND expires_at < $1"},
+	{"admin_invitations accepted", "admin_invitations", "accepted_at IS NOT NULL AND accepted_at < $1"},
+	{"outbound_emails sent", "outbound_emails", "status = 'sent' AND sent_at < $1"},
+	{"outbound_emails failed", "outbound_emails", "status = 'failed' AND created_at < $1"},
+}
+
 func main() {
-	retention := flag.Int("retention", 30, "retention days for revoked/expired refresh tokens")
+	retention := flag.Int("retention", 30, "retention days for revoked/expired/used tokens")
+	batch := flag.Int("batch", 1000, "rows deleted per statement")
+	pause := flag.Duration("sleep", 100*time.Millisecond, "pause between batches")
 	flag.Parse()
 
 	dbURL := os.Getenv("DATABASE_URL")
@@ -27,12 +56,39 @@ func main() {
 		log.Fatalf("open db: %v", err)
 	}
 	defer db.Close()
+	db.SetMaxOpenConns(1)
+
+	ctx, stop := signal.NotifyContext(context.Background(), os.Interrupt, syscall.SIGTERM)
+	defer stop()
 
 	threshold := time.Now().AddDate(0, 0, -*retention)
-	res, err := db.Exec(`DELETE FROM refresh_tokens WHERE (revoked = true AND created_at < $1) OR (expires_at IS NOT NULL AND expires_at < $1)`, threshold)
-	if err != nil {
-		log.Fatalf("cleanup failed: %v", err)
+	var total int64
+	start := time.Now()
+	for _, r := range rules {
+		query := fmt.Sprintf("DELETE FROM %[1]s WHERE id IN (SELECT id FROM %[1]s WHERE %[2]s LIMIT $2 FOR UPDATE SKIP LOCKED)", r.table, r.where)
+		var n, batches int64
+		ruleStart := time.Now()
+		for {
+			res, err := db.ExecContext(ctx, query, threshold, *batch)
+			if err != nil {
+				log.Fatalf("%s: cleanup failed after %d row(s): %v", r.name, n, err)
+			}
+			affected, _ := res.RowsAffected()
+			n += affected
+			batches++
+			if affected < int64(*batch) {
+				break
+			}
+			select {
+			case <-ctx.Done():
+				log.Fatalf("%s: interrupted after %d row(s)", r.name, n)
+			case <-time.After(*pause):
+			}
+		}
+		elapsed := time.Since(ruleStart)
+		fmt.Printf("%-28s %8d row(s) in %3d batch(es), %s (%.0f rows/s)\n", r.name, n, batches, elapsed.Round(time.Millisecond), float64(n)/elapsed.Seconds())
+		total += n
 	}
-	n, _ := res.RowsAffected()
-	fmt.Printf("Cleaned up %d refresh token(s) older than %d days\n", n, *retention)
+	elapsed := time.Since(start)
+	fmt.Printf("Cleaned up %d row(s) older than %d days in %s (%.0f rows/s)\n", total, *retention, elapsed.Round(time.Millisecond), float64(total)/elapsed.Seconds())
 }
@@ -19,6 +19,7 @@ func main() {
 	email := flag.String("email", "", "admin email")
 	password := flag.String("password", "", "password in plain (will be hashed)")
 	role := flag.String("role", "chef", "role (chef|owner)")
+	cost := flag.Int("cost", bcrypt.DefaultCost, "bcrypt cost (match the server's BCRYPT_COST)")
 	flag.Parse()
 
 	if *restaurant == 0 || *email == "" || *password == "" {
@@ -37,7 +38,7 @@ func main() {
 	}
 	defer db.Close()
 
-	hash, err := bcrypt.GenerateFromPassword([]byte(*password), bcrypt.DefaultCost)
+	hash, err := bcrypt.GenerateFromPassword([]byte(*password), *cost)
 	if err != nil {
 		log.Fatalf("bcrypt: %v", err)
 	}